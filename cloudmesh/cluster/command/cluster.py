@@ -28,13 +28,17 @@ class JobCommand(PluginCommand):
         ::
 
           Usage:
-            cluster create [--cluster=CLUSTER] [--experiment=EXPERIMENT]
+            cluster create [--cluster=CLUSTER] [--experiment=EXPERIMENT] [--storage=STORAGE]
             cluster list [--cluster=CLUSTER]  [--experiment=EXPERIMENT]
             cluster add [--cluster=CLUSTER]  [--experiment=EXPERIMENT] --id=ID --name=NAME --user=USER
                                 [--ip=IP]
                                 [--status=STATUS]
                                 [--gpu=GPU]
                                 [--pyenv=PYENV]
+                                [--cores=CORES]
+                                [--threads=THREADS]
+                                [--memory=MEMORY]
+                                [--max_jobs_allowed=MAX_JOBS_ALLOWED]
             cluster delete [--cluster=CLUSTER]  [--experiment=EXPERIMENT] --id=ID
             cluster activate [--cluster=CLUSTER]  [--experiment=EXPERIMENT] --id=ID
             cluster deactivate [--cluster=CLUSTER]  [--experiment=EXPERIMENT] --id=ID
@@ -85,6 +89,7 @@ class JobCommand(PluginCommand):
         from cloudmesh.queue.jobqueue import SchedulerFIFOMultiHost
         from cloudmesh.queue.jobqueue import Host
         from cloudmesh.queue.jobqueue import Cluster
+        from cloudmesh.queue.store import exists
 
         map_parameters(
             arguments,
@@ -116,7 +121,11 @@ class JobCommand(PluginCommand):
             "timeout",
             "key",
             "value",
-            "cluster"
+            "cluster",
+            "storage",
+            "cores",
+            "threads",
+            "memory"
         )
 
         variables = Variables()
@@ -139,14 +148,14 @@ class JobCommand(PluginCommand):
 
             if arguments.cluster and arguments.experiment is not None:
                 file = os.path.join(arguments.experiment, cluster_file_name)
-                if os.path.exists(file):
+                if exists(file):
                     cluster = Cluster(name=arguments.cluster,experiment=arguments.experiment)
                 else:
                     Console.error(f'Cluster: {file} does not exist')
                     return
             elif arguments.cluster:
                 file = os.path.join('./experiment', cluster_file_name)
-                if os.path.exists(file):
+                if exists(file):
                     cluster = Cluster(name=arguments.cluster)
                 else:
                     Console.error(f'Cluster: {file} does not exist')
@@ -159,9 +168,10 @@ class JobCommand(PluginCommand):
 
         if arguments.create:
             if arguments.experiment:
-                cluster = Cluster(name=arguments.cluster, experiment=arguments.experiment)
+                cluster = Cluster(name=arguments.cluster, experiment=arguments.experiment,
+                                  storage=arguments.storage)
             else:
-                cluster = Cluster(name=arguments.cluster)
+                cluster = Cluster(name=arguments.cluster, storage=arguments.storage)
         elif arguments.list:
             print(cluster.info(order=['id','name','user','status','gpu','pyenv','ip','max_jobs_allowed']))
         elif arguments.add:
@@ -170,39 +180,49 @@ class JobCommand(PluginCommand):
             if arguments.user: host_args ['user'] = arguments.user
             if arguments.ip: host_args ['ip'] = arguments.ip
             if arguments['--status']: host_args ['status'] = arguments['--status']
-            if arguments.gpu: host_args ['gpu'] = int(arguments.gpu)
+            if arguments.gpu: host_args ['gpu'] = arguments.gpu
             if arguments.pyenv: host_args ['pyenv'] = arguments.pyenv
-
-            for host_id in ids:
-                host_args['id'] = host_id
-                host = Host(**host_args)
-                Console.info(f'Adding host {host.id} to cluster {cluster.name}')
-                cluster.add(host)
+            if arguments.cores: host_args ['cores'] = int(arguments.cores)
+            if arguments.threads: host_args ['threads'] = int(arguments.threads)
+            if arguments.memory: host_args ['memory'] = int(arguments.memory)
+            if arguments.max_jobs_allowed:
+                host_args ['max_jobs_allowed'] = int(arguments.max_jobs_allowed)
+
+            with cluster.batch():
+                for host_id in ids:
+                    host_args['id'] = host_id
+                    host = Host(**host_args)
+                    Console.info(f'Adding host {host.id} to cluster {cluster.name}')
+                    cluster.add(host)
         elif arguments.delete:
             Console.info(f'Deleting hosts: {ids}')
-            for host_id in ids:
-                cluster.delete(id=host_id)
+            with cluster.batch():
+                for host_id in ids:
+                    cluster.delete(id=host_id)
         elif arguments.activate:
-            for host_id in ids:
-                host_dict = cluster.get(id=host_id)
-                host = Host(**host_dict)
-                host.status = 'active'
-                cluster.set(host=host)
-                Console.info(f'Activating host {host.id} in cluster {cluster.name}')
+            with cluster.batch():
+                for host_id in ids:
+                    host_dict = cluster.get(id=host_id)
+                    host = Host(**host_dict)
+                    host.status = 'active'
+                    cluster.set(host=host)
+                    Console.info(f'Activating host {host.id} in cluster {cluster.name}')
         elif arguments.deactivate:
-            for host_id in ids:
-                host_dict = cluster.get(id=host_id)
-                host = Host(**host_dict)
-                host.status = 'inactive'
-                cluster.set(host=host)
-                Console.info(f'Activating host {host.id} in cluster {cluster.name}')
+            with cluster.batch():
+                for host_id in ids:
+                    host_dict = cluster.get(id=host_id)
+                    host = Host(**host_dict)
+                    host.status = 'inactive'
+                    cluster.set(host=host)
+                    Console.info(f'Activating host {host.id} in cluster {cluster.name}')
 
         elif arguments.set:
-            for host_id in ids:
-                host_dict = cluster.get(id=host_id)
-                host_dict[arguments.key] = arguments.value
-                host = Host(**host_dict)
-                cluster.set(host=host)
-                Console.info(f'Setting host: {host.id} key: {arguments.key} value: {arguments.value} in cluster {cluster.name}')
+            with cluster.batch():
+                for host_id in ids:
+                    host_dict = cluster.get(id=host_id)
+                    host_dict[arguments.key] = arguments.value
+                    host = Host(**host_dict)
+                    cluster.set(host=host)
+                    Console.info(f'Setting host: {host.id} key: {arguments.key} value: {arguments.value} in cluster {cluster.name}')
 
         return ""
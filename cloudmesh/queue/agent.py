@@ -0,0 +1,248 @@
+"""
+An agent that runs on a host and reports the state of the jobs.
+
+Without an agent the manager reads the log file of each job over ssh to
+find its state. The agent instead watches the job directories on the host
+and writes an event as a json line to stdout whenever the state or the exit
+code of a job changes. The manager starts one agent per host and directory
+over a single ssh session and reads the events as they are written:
+
+    agent = Agent("gregor", "red01", ["./experiment"])
+    agent.start()
+    agent.ready.wait()
+    event = agent.events.get()
+
+    {"name": "job1", "state": "end", "exit": 0}
+
+An event always contains the current state and exit code of the job. Once
+all logs have been read the first time the agent writes {"ready": true}.
+A job whose state is start or run but whose process no longer exists is
+reported with the state crash.
+
+The module is executed on the host as python3 - INTERVAL DIRECTORY... with
+its source send to stdin. It must therefore only use the standard library
+outside of the Agent class.
+"""
+import json
+import os
+import queue
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+heartbeat = 10
+
+
+class Log:
+    """
+    The state of a job as read from the new lines of its log file
+    """
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self.offset = 0
+        self.rest = ""
+        self.state = None
+        self.exit = None
+
+    def event(self) -> dict:
+        return {"name": self.name, "state": self.state, "exit": self.exit}
+
+    def read(self) -> bool:
+        """
+        reads the lines appended since the last read. If the log was
+        truncated, the job was started again and the log is read from the
+        beginning.
+
+        :return: True if the state or the exit code changed
+        """
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return False
+        before = self.event()
+        if size < self.offset:
+            self.offset = 0
+            self.rest = ""
+            self.state = None
+            self.exit = None
+        if size > self.offset:
+            with open(self.path) as f:
+                f.seek(self.offset)
+                text = self.rest + f.read()
+                self.offset = f.tell()
+            lines = text.split("\n")
+            self.rest = lines.pop()
+            for line in lines:
+                if "cloudmesh state:" in line:
+                    self.state = line.split(":", 1)[1].strip()
+                elif "cloudmesh exit:" in line:
+                    try:
+                        self.exit = int(line.split(":", 1)[1])
+                    except ValueError:
+                        pass
+        return self.event() != before
+
+    def crashed(self) -> bool:
+        """
+        checks if the process of a started job no longer exists without
+        having written its final state
+
+        :return: True if the job crashed
+        """
+        if self.state not in ["start", "run"]:
+            return False
+        try:
+            with open(f"{os.path.dirname(self.path)}/{self.name}.pid") as f:
+                pid = int(f.read().strip())
+            os.kill(pid, 0)
+            return False
+        except PermissionError:
+            return False
+        except (OSError, ValueError):
+            pass
+        # the job may have written its final state just before it exited
+        self.read()
+        if self.state in ["start", "run"]:
+            self.state = "crash"
+            return True
+        return False
+
+
+def watch(directories: list, interval: float = 0.05, out=sys.stdout):
+    """
+    watches the job directories and writes the events to out until out is
+    closed
+
+    :param directories: the experiment directories containing the jobs
+    :param interval: the seconds between two scans of the directories
+    :param out: the stream the events are written to
+    """
+    logs = {}
+
+    def write(event):
+        out.write(json.dumps(event) + "\n")
+        out.flush()
+
+    ready = False
+    beat = time.time()
+    try:
+        while True:
+            for directory in directories:
+                try:
+                    entries = list(os.scandir(directory))
+                except OSError:
+                    continue
+                for entry in entries:
+                    path = f"{directory}/{entry.name}/{entry.name}.log"
+                    if path not in logs:
+                        if not entry.is_dir():
+                            continue
+                        logs[path] = Log(entry.name, path)
+            for log in logs.values():
+                changed = log.read()
+                if log.crashed() or changed:
+                    write(log.event())
+            if not ready:
+                write({"ready": True})
+                ready = True
+            if time.time() - beat > heartbeat:
+                # detects a closed connection if no job changes its state
+                write({"alive": True})
+                beat = time.time()
+            time.sleep(interval)
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+
+
+class Agent:
+
+    def __init__(self,
+                 user: str,
+                 host: str,
+                 directories: list,
+                 events=None,
+                 interval: float = 0.05,
+                 python: str = "python3"):
+        """
+        the manager side of an agent on a host
+
+        :param user: the user name
+        :param host: the host name
+        :param directories: the experiment directories watched by the agent
+        :param events: the queue the events are put in, shared by the agents
+                       of a Queue
+        :param interval: the seconds between two scans of the directories
+        :param python: the python interpreter on the host
+        """
+        self.user = user
+        self.host = host
+        self.directories = directories
+        self.events = events if events is not None else queue.SimpleQueue()
+        self.interval = interval
+        self.python = python
+        self.process = None
+        self.ready = threading.Event()
+
+    def command(self) -> list:
+        """
+        returns the argument list that executes the agent on the host
+        """
+        from cloudmesh.common.util import is_local
+        from cloudmesh.queue import ssh
+
+        arguments = [str(self.interval)] + self.directories
+        if is_local(self.host):
+            return [sys.executable, "-"] + arguments
+        return ssh.pool.ssh(self.user, self.host) + \
+            [" ".join([self.python, "-"] +
+                      [shlex.quote(argument) for argument in arguments])]
+
+    def start(self):
+        """
+        starts the agent on the host and a thread reading its events
+        """
+        with open(__file__) as f:
+            source = f.read()
+        self.process = subprocess.Popen(self.command(),
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL,
+                                        text=True)
+        self.process.stdin.write(source)
+        self.process.stdin.close()
+        threading.Thread(target=self.read, daemon=True).start()
+
+    def read(self):
+        for line in self.process.stdout:
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if "name" in event:
+                event["user"] = self.user
+                event["host"] = self.host
+                self.events.put(event)
+            elif "ready" in event:
+                self.ready.set()
+        # waiting for the agent is no longer needed
+        self.ready.set()
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        """
+        stops the agent
+        """
+        if self.alive:
+            self.process.terminate()
+            self.process.wait()
+
+
+if __name__ == "__main__":
+    watch(sys.argv[2:], interval=float(sys.argv[1]))
@@ -0,0 +1,109 @@
+"""
+A content addressed cache of the input files of the jobs.
+
+Jobs declare the files they read with inputs. Instead of copying an input
+into the directory of every job, the file is stored once per host in the
+directory .cache of the experiment under the sha256 hash of its content.
+The job directory only contains a relative symbolic link with the name of
+the input file that points to the blob in the cache
+
+    experiment/.cache/5891b5b5...
+    experiment/job1/data.csv -> ../.cache/5891b5b5...
+
+The manager keeps the same cache in its experiment directory. A blob in it
+is a copy of the input file, so changing the input later does not change
+the blob of the jobs that already use it. The schedulers copy the blobs a
+host does not yet have together with the job directories in a single
+rsync, see Host.stage(). As the blobs are named by their content, an input
+shared by hundreds of jobs is copied to a host only once, and a changed
+input is copied again.
+"""
+import hashlib
+import os
+import tempfile
+
+directory = ".cache"
+
+# the digests of the files already hashed by path, size and modification time
+_digests = {}
+
+
+def digest(path: str) -> str:
+    """
+    returns the sha256 hash of the content of the file. The hash of a file
+    is only computed again if its size or modification time changed.
+
+    :param path: the path of the file
+    :return: str
+    """
+    path = os.path.realpath(path)
+    stat = os.stat(path)
+    key = (path, stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        _digests[key] = sha.hexdigest()
+    return _digests[key]
+
+
+def blob(digest: str) -> str:
+    """
+    returns the path of the blob relative to the experiment directory
+
+    :param digest: the hash of the content
+    :return: str
+    """
+    return f"{directory}/{digest}"
+
+
+def add(experiment: str, path: str) -> str:
+    """
+    copies the file into the cache of the experiment directory. The blob is
+    named by the hash of the copied content, so a file that is changed
+    while it is copied is stored under the hash of what was copied.
+
+    :param experiment: the experiment directory
+    :param path: the path of the file
+    :return: the hash of the content
+    """
+    value = digest(path)
+    if os.path.exists(f"{experiment}/{blob(value)}"):
+        return value
+    os.makedirs(f"{experiment}/{directory}", exist_ok=True)
+    fd, temporary = tempfile.mkstemp(dir=f"{experiment}/{directory}",
+                                     prefix=".")
+    try:
+        sha = hashlib.sha256()
+        with open(path, "rb") as source, os.fdopen(fd, "wb") as target:
+            for chunk in iter(lambda: source.read(1 << 20), b""):
+                sha.update(chunk)
+                target.write(chunk)
+        value = sha.hexdigest()
+        os.chmod(temporary, os.stat(path).st_mode & 0o777)
+        os.replace(temporary, f"{experiment}/{blob(value)}")
+    except BaseException:
+        os.remove(temporary)
+        raise
+    return value
+
+
+def link(experiment: str, name: str, path: str, digest: str) -> str:
+    """
+    links the blob into the job directory under the name of the file
+
+    :param experiment: the experiment directory
+    :param name: the name of the job
+    :param path: the path of the input file
+    :param digest: the hash of the content
+    :return: the path of the link
+    """
+    source = f"../{blob(digest)}"
+    target = f"{experiment}/{name}/{os.path.basename(path)}"
+    if os.path.islink(target) and os.readlink(target) == source:
+        return target
+    if os.path.lexists(target):
+        os.remove(target)
+    os.symlink(source, target)
+    return target
@@ -1,4 +1,6 @@
 import os
+import signal
+import sys
 from pathlib import Path
 # from pprint import pprint
 import shutil
@@ -28,11 +30,12 @@ class JobCommand(PluginCommand):
         ::
 
           Usage:
-            queue create [--queue=QUEUE] [--experiment=EXPERIMENT]
+            queue create [--queue=QUEUE] [--experiment=EXPERIMENT] [--storage=STORAGE]
             queue info [--queue=QUEUE] [--experiment=EXPERIMENT]
             queue refresh [--queue=QUEUE] [--experiment=EXPERIMENT]
             queue add [--queue=QUEUE] [--experiment=EXPERIMENT] --name=NAME --command=COMMAND
                     [--input=INPUT]
+                    [--inputs=INPUTS]
                     [--output=OUTPUT]
                     [--status=STATUS]
                     [--gpu=GPU]
@@ -41,10 +44,18 @@ class JobCommand(PluginCommand):
                     [--shell=SHELL]
                     [--log=LOG]
                     [--pyenv=PYENV]
+                    [--priority=PRIORITY]
+                    [--cpus=CPUS]
+                    [--memory=MEMORY]
+                    [--gpus=GPUS]
+                    [--depends_on=DEPENDS_ON]
             queue delete [--queue=QUEUE] [--experiment=EXPERIMENT] --name=NAME
-            queue run fifo [--queue=QUEUE] [--experiment=EXPERIMENT] --max_parallel=MAX_PARALLEL [--timeout=TIMEOUT]
-            queue run fifo_multi [--queue=QUEUE] [--experiment=EXPERIMENT] [--hosts=HOSTS] [--hostfile=HOSTFILE] [--timeout=TIMEOUT]
+            queue run fifo [--queue=QUEUE] [--experiment=EXPERIMENT] --max_parallel=MAX_PARALLEL [--timeout=TIMEOUT] [--agent] [--launch]
+            queue run priority [--queue=QUEUE] [--experiment=EXPERIMENT] --max_parallel=MAX_PARALLEL [--timeout=TIMEOUT] [--agent] [--launch]
+            queue run fifo_multi [--queue=QUEUE] [--experiment=EXPERIMENT] [--hosts=HOSTS] [--hostfile=HOSTFILE] [--timeout=TIMEOUT] [--agent] [--launch] [--policy=POLICY]
+            queue run dag [--queue=QUEUE] [--experiment=EXPERIMENT] [--hosts=HOSTS] [--hostfile=HOSTFILE] [--timeout=TIMEOUT] [--agent] [--launch] [--policy=POLICY]
             queue reset [--queue=QUEUE] [--experiment=EXPERIMENT] [--name=NAME] [--status=STATUS]
+            queue archive [--queue=QUEUE] [--experiment=EXPERIMENT] [--status=STATUS] [--window=WINDOW]
             queue --service start [--port=PORT]
             queue --service info [--port=PORT]
 
@@ -88,10 +99,14 @@ class JobCommand(PluginCommand):
 
         from cloudmesh.queue.jobqueue import Queue
         from cloudmesh.queue.jobqueue import Job
+        from cloudmesh.queue.jobqueue import JobArray
         from cloudmesh.queue.jobqueue import SchedulerFIFO
         from cloudmesh.queue.jobqueue import SchedulerFIFOMultiHost
+        from cloudmesh.queue.jobqueue import SchedulerPriority
+        from cloudmesh.queue.jobqueue import SchedulerDAG
         from cloudmesh.queue.jobqueue import Host
         from cloudmesh.queue.jobqueue import Cluster
+        from cloudmesh.queue.store import exists
         from cloudmesh.common.Shell import Shell
 
         map_parameters(
@@ -101,6 +116,7 @@ class JobCommand(PluginCommand):
             "gpu",
             "executable",
             "input",
+            "inputs",
             "ip",
             "output",
             "shell",
@@ -122,7 +138,15 @@ class JobCommand(PluginCommand):
             "max_parallel",
             "timeout",
             "port",
-            "queue"
+            "queue",
+            "storage",
+            "window",
+            "agent",
+            "launch",
+            "cpus",
+            "memory",
+            "gpus",
+            "depends_on"
         )
 
         variables = Variables()
@@ -130,7 +154,12 @@ class JobCommand(PluginCommand):
         # que_name = variables["queue"]
         # VERBOSE(arguments)
 
-        names = Parameter.expand(arguments.name)
+        # job arrays such as job[1-100000] are not expanded, see JobArray
+        array = JobArray.from_name(arguments.name)
+        if array is not None and arguments.add:
+            names = [array.key]
+        else:
+            names = Parameter.expand(arguments.name)
 
         #print(f'EXPERIMENT is {arguments.experiment}')
         #print(f'QUEUE is {arguments.QUEUE}')
@@ -146,14 +175,14 @@ class JobCommand(PluginCommand):
 
             if arguments.queue and arguments.experiment is not None:
                 file = os.path.join(arguments.experiment, queue_file_name)
-                if os.path.exists(file):
+                if exists(file):
                     queue = Queue(name=arguments.queue,experiment=arguments.experiment)
                 else:
                     Console.error(f'Queue: {file} does not exist')
                     return
             elif arguments.queue:
                 file = os.path.join('./experiment', queue_file_name)
-                if os.path.exists(file):
+                if exists(file):
                     queue = Queue(name=arguments.queue)
                 else:
                     Console.error(f'Queue: {file} does not exist')
@@ -167,23 +196,26 @@ class JobCommand(PluginCommand):
 
         if arguments.create:
             if arguments.experiment:
-                queue = Queue(name=arguments.queue,experiment=arguments.experiment)
+                queue = Queue(name=arguments.queue,experiment=arguments.experiment,
+                              storage=arguments.storage)
             else:
-                queue = Queue(name=arguments.queue)
+                queue = Queue(name=arguments.queue, storage=arguments.storage)
         elif arguments.info and not arguments['--service']:
             print(queue.info())
         elif arguments.refresh:
             Console.info(f'Refreshing Queue: {queue.name}')
             print(queue.refresh())
         elif arguments.delete:
+            if array is not None and queue.arrays and array.key in queue.arrays:
+                names = [array.key]
             Console.info(f'Deleting jobs: {names}')
-            for name in names:
-                queue.delete(name=name)
+            queue.delete_jobs(names)
         elif arguments.add:
             #TODO --command="'ls -a'" notice this requires "''" to work correctly
             job_args = {}
             if arguments.command: job_args['command'] = arguments.command
             if arguments.input: job_args['input'] = arguments.input
+            if arguments.inputs: job_args['inputs'] = Parameter.expand(arguments.inputs)
             if arguments.output: job_args['output'] = arguments.output
             if arguments['--status']: job_args['status'] = arguments['--status']
             if arguments.gpu: job_args['gpu'] = arguments.gpu
@@ -192,27 +224,46 @@ class JobCommand(PluginCommand):
             if arguments.shell: job_args['shell'] = arguments.shell
             if arguments.log: job_args['log'] = arguments.log
             if arguments.pyenv: job_args['pyenv'] = arguments.pyenv
+            if arguments['--priority']: job_args['priority'] = int(arguments['--priority'])
+            if arguments.cpus: job_args['cpus'] = int(arguments.cpus)
+            if arguments.memory: job_args['memory'] = int(arguments.memory)
+            if arguments.gpus: job_args['gpus'] = int(arguments.gpus)
+            if arguments.depends_on: job_args['depends_on'] = Parameter.expand(arguments.depends_on)
             if arguments.experiment: job_args['experiment'] = arguments.experiment
 
-            for name in names:
-                job_args['name'] = name
-                job = Job(**job_args)
-                Console.info(f'Adding job {job.name} to queue {queue.name}')
-                queue.add(job)
-        elif arguments.run and arguments.fifo:
+            if array is not None:
+                array = JobArray.from_name(arguments.name, job_args)
+                Console.info(f'Adding job array {array.key} with {len(array)} '
+                             f'jobs to queue {queue.name}')
+                queue.add_array(array)
+                return ""
+            with queue.batch():
+                for name in names:
+                    job_args['name'] = name
+                    job = Job.from_dict(job_args)
+                    Console.info(f'Adding job {job.name} to queue {queue.name}')
+                    queue.add(job)
+        elif arguments.run and (arguments.fifo or arguments.priority):
             if arguments.timeout:
                 timeout=int(arguments.timeout)
             else:
                 timeout=10
 
-            scheduler = SchedulerFIFO(name=arguments.queue, experiment=arguments.experiment,
-                                      max_parallel=int(arguments.max_parallel),timeout_min=timeout)
+            if arguments.priority:
+                Scheduler = SchedulerPriority
+            else:
+                Scheduler = SchedulerFIFO
+            scheduler = Scheduler(name=arguments.queue, experiment=arguments.experiment,
+                                  max_parallel=int(arguments.max_parallel),timeout_min=timeout,
+                                  agent=arguments.agent, launch=arguments.launch)
 
+            # exit on SIGTERM so the pending queue changes are flushed
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
             ran_jobs = scheduler.run()
             Console.info(f"Ran Jobs: {ran_jobs}")
             completed_jobs = scheduler.wait_on_running()
             Console.info(f"Completed Jobs: {completed_jobs}")
-        elif arguments.run and arguments.fifo_multi:
+        elif arguments.run and (arguments.fifo_multi or arguments.dag):
 
             if arguments['--hosts'] is None and arguments.hostfile is None:
                 Console.warning("Please provide a --hosts or --hostfile argument")
@@ -245,8 +296,16 @@ class JobCommand(PluginCommand):
                     Console.warning(f"No free hosts found in cluster {filename}")
                     return
 
-            scheduler = SchedulerFIFOMultiHost(name=arguments.queue, experiment=arguments.experiment,
-                                               hosts=hosts, timeout_min=timeout)
+            if arguments.dag:
+                Scheduler = SchedulerDAG
+            else:
+                Scheduler = SchedulerFIFOMultiHost
+            scheduler = Scheduler(name=arguments.queue, experiment=arguments.experiment,
+                                  hosts=hosts, timeout_min=timeout,
+                                  agent=arguments.agent, launch=arguments.launch,
+                                  policy=arguments.policy or "first_fit")
+            # exit on SIGTERM so the pending queue changes are flushed
+            signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(1))
             ran_jobs = scheduler.run()
             Console.info(f"Ran Jobs: {ran_jobs}")
             completed_jobs = scheduler.wait_on_running()
@@ -257,6 +316,12 @@ class JobCommand(PluginCommand):
             keys = names if arguments.name else None
             print(queue.reset(keys=keys,status=status))
 
+        elif arguments.archive:
+            statuses = arguments['--status'].split(',') if arguments['--status'] else None
+            window = arguments.window or "%Y-%m-%d"
+            archived = queue.archive(statuses=statuses, window=window)
+            Console.info(f"Archived {len(archived)} jobs of queue {queue.name}")
+
         elif arguments["--service"] and arguments.start:
             if arguments.port is None:
                 os.system("cd ~/cm/cloudmesh-queue; uvicorn cloudmesh.queue.service.server:app")
@@ -1,10 +1,22 @@
+import asyncio
+import atexit
+import heapq
 import json
 import multiprocessing
 import os
+import queue
+import re
 import shlex
+import shutil
 import sys
 import time
 import uuid
+import weakref
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from itertools import islice
 from dataclasses import dataclass
 from datetime import datetime
 from datetime import timedelta
@@ -25,13 +37,30 @@ from cloudmesh.common.util import path_expand
 from cloudmesh.common.util import readfile
 from cloudmesh.common.util import str_banner
 from cloudmesh.common.systeminfo import os_is_mac, os_is_windows, os_is_linux
-from yamldb.YamlDB import YamlDB
+from cloudmesh.queue import cache
+from cloudmesh.queue import ssh
+from cloudmesh.queue.agent import Agent
+from cloudmesh.queue.placement import Placement
+from cloudmesh.queue.store import exists
+from cloudmesh.queue.store import get_store
 
 # from cloudmesh.common.variables import Variables
 # from cloudmesh.configuration.Configuration import Configuration
 
 Console.init()
 
+# queues with pending changes in write-behind mode, flushed at exit
+_write_behind_queues = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_queues():
+    for queue in list(_write_behind_queues):
+        try:
+            queue.flush()
+        except Exception as e:
+            Console.error(f"Could not flush queue {queue.name}: {e}")
+
 
 def sysinfo():
     # this may already exist in common, if not it should be updated or integrated.
@@ -116,6 +145,23 @@ class Job:
     Note that prior to running the command job.run(), the variable job.pid has
     the value None
 
+    Jobs stored in a queue are recreated with
+
+        job = Job.from_dict(queue.get("job1"))
+
+    which does not create the job directory or write the script. The script
+    is written once the job is synced or run.
+
+    The files read by a job can be declared with inputs. They are linked
+    into the job directory from a cache on the host, so an input used by
+    many jobs is copied to a host only once, see cloudmesh.queue.cache
+
+        job = Job(name="job1", command="python train.py data.csv",
+                  inputs=["~/data/data.csv"], user="user", host="host")
+
+    Jobs with a higher priority are started first by SchedulerPriority.
+    SchedulerDAG starts a job only once the jobs named in depends_on ended.
+
     """
     name: str = "TBD"
     id: str = str(uuid.uuid4().hex)
@@ -142,6 +188,19 @@ class Job:
     user: str = None
     pyenv: str = None
     last_probe_check: str = None
+    exit_code: int = None
+    # True once the job directory was copied to the host, see Queue.stage()
+    staged: bool = False
+    inputs: list = None
+    priority: int = 0
+    # the resources the job needs, see placement.py
+    cpus: int = 0
+    memory: int = 0
+    gpus: int = 0
+    depends_on: list = None
+
+    # set by from_dict, the script is written when the job is launched
+    _lazy = False
 
     def __post_init__(self):
         #print(self.info())
@@ -163,10 +222,58 @@ class Job:
             self.directory = './' + self.experiment
 
         self.scriptname = f"{self.experiment}/{self.name}/{self.name}.{self.shell}"
+        # the offset and content of the files read so far, see tail()
+        self._tails = {}
         self.generate_command()
-        self.generate_script(shell=self.shell)
+        if not self._lazy:
+            self.generate_script(shell=self.shell)
 
-    def ps(self):
+    @classmethod
+    def from_dict(cls, data: dict):
+        """
+        Returns the job for a dict as stored in a queue. Unlike Job(**data)
+        this does not create the job directory and does not write the
+        script, so it is cheap to use for reading the state of many jobs.
+
+        :param data: the job as dict
+        :return: Job
+        """
+        job = cls.__new__(cls)
+        job._lazy = True
+        job.__init__(**data)
+        return job
+
+    def materialize(self):
+        """
+        Writes the script of a job created with from_dict. The script is
+        only written once.
+
+        :return: None
+        """
+        if self._lazy:
+            self.generate_script(shell=self.shell)
+
+    def link_inputs(self):
+        """
+        Adds the input files to the cache of the experiment directory and
+        links them into the job directory
+
+        :return: the blobs of the inputs, see cache.blob()
+        """
+        blobs = []
+        for path in self.inputs or []:
+            path = path_expand(path)
+            digest = cache.add(self.experiment, path)
+            cache.link(self.experiment, self.name, path, digest)
+            blobs.append(cache.blob(digest))
+        return blobs
+
+    def ps_command(self):
+        """
+        returns the keys and the ps command listing the process of the job
+
+        :return: list, str
+        """
         if os_is_mac():
             keys = ["pid", "user", "ppid", "tty", "%cpu", "%mem", "command"]
         elif os_is_windows():
@@ -180,23 +287,50 @@ class Job:
             raise NotImplementedError("ps command not implemented, implement me")
         else:
             command = f"ps --format {keys_str} {self.pid}"
-        if not is_local(self.host):
-            command = f"ssh {self.user}@{self.host} \"{command}\""
+        return keys, command
+
+    def ps(self):
+        keys, command = self.ps_command()
         try:
             # print (command)
-            lines = Shell.run(command).strip()
-            # print (lines)
-            lines = lines.splitlines()
-            lines = ' '.join(lines[1].split()).split(" ", len(keys) - 1)
-            i = -1
-            entry = {}
-            for key in keys:
-                i = i + 1
-                entry[key] = lines[i]
-            return entry
+            lines = ssh.pool.output(self.user, self.host, command)
+            return self.parse_ps(keys, lines)
+        except:
+            return None
+
+    async def aps(self):
+        """
+        returns the process of the job just as ps() using asyncio
+
+        :return: dict or None
+        """
+        keys, command = self.ps_command()
+        try:
+            lines = await ssh.pool.aoutput(self.user, self.host, command)
+            return self.parse_ps(keys, lines)
         except:
             return None
 
+    @staticmethod
+    def parse_ps(keys, lines):
+        """
+        returns the process in the output of the ps command as dict
+
+        :param keys: the keys of the ps command
+        :param lines: the output of the ps command
+        :return: dict
+        """
+        lines = lines.strip()
+        # print (lines)
+        lines = lines.splitlines()
+        lines = ' '.join(lines[1].split()).split(" ", len(keys) - 1)
+        i = -1
+        entry = {}
+        for key in keys:
+            i = i + 1
+            entry[key] = lines[i]
+        return entry
+
     def check_host_running(self):
         host = Host(name=self.host,user=self.user)
         probe_status, probe_time = host.probe()
@@ -234,17 +368,10 @@ class Job:
         elif self.state == 'start' and not self.check_running():
             time.sleep(5) # TODO make this more deterministic
             if self.state == 'start':
-                if is_local(self.host):
-                    command = \
-                        f"cd {self.directory}/{self.name}; " + \
-                        f"{self.logging(msg='crash')};"
-                else:
-                    command = f"ssh {self.user}@{self.host} " + \
-                              f"'" + \
-                              f"cd {self.directory}/{self.name}; " + \
-                              f"{self.logging(msg='crash')};" + \
-                              f"'"
-                os.system(command)
+                command = \
+                    f"cd {self.directory}/{self.name}; " + \
+                    f"{self.logging(msg='crash')};"
+                ssh.pool.run(self.user, self.host, command)
                 return True
         elif self.status == 'start':
             return False
@@ -258,12 +385,10 @@ class Job:
         r = os.system(command)
         # remove remote dir
         if not is_local(self.host):
-            command = f"ssh {self.user}@{self.host} " + \
-                      f"'" + \
-                      f"cd {self.directory}; " + \
-                      f"rm -rf ./{self.name} ;" + \
-                      f"'"
-            r = os.system(command)
+            command = \
+                f"cd {self.directory}; " + \
+                f"rm -rf ./{self.name} ;"
+            r = ssh.pool.run(self.user, self.host, command).returncode
             if r != 0:
                 return f'Could not delete {self.name} dir on {self.user}@{self.host}\n'
         return ''
@@ -353,20 +478,14 @@ class Job:
 
     def generate_command(self):
         """
-        Generates a command to run it remotely
+        Generates the command that is executed on the host to run the job
 
         :return: None
         """
         self.nohup_command = self.nohup(name=self.name, shell=self.shell)
-        if is_local(self.host):
-            self.remote_command = \
-                f"cd {self.directory}/{self.name}; " + \
-                f"{self.nohup_command}"
-        else:
-            self.remote_command = \
-                f"ssh {self.user}@{self.host} " + \
-                f"\"cd {self.directory}/{self.name} ; " + \
-                f"{self.nohup_command}\""
+        self.remote_command = \
+            f"cd {self.directory}/{self.name}; " + \
+            f"{self.nohup_command}"
 
     def generate_script(self, shell="/usr/bin/bash"):
         """
@@ -375,7 +494,8 @@ class Job:
         :param shell: name of the shell
         :return: None
         """
-        os.system(f"mkdir -p {self.experiment}/{self.name}")
+        self._lazy = False
+        os.makedirs(f"{self.experiment}/{self.name}", exist_ok=True)
         with open(self.scriptname, "w") as f:
             start_line = self.logging("start", append=False)
             end_line = self.logging("end")
@@ -393,6 +513,7 @@ class Job:
                 f"{start_line}",
                 f'echo -ne "# date: " >> {self.log}; date >> {self.log}' + pyenv_cmd + gpu_cmd,
                 f"{self.command} >> {self.output}",
+                f'echo "# cloudmesh exit: $?" >> {self.log}',
                 f'echo -ne "# date: " >> {self.log}; date >> {self.log}',
                 f"{end_line}",
                 "#"])
@@ -407,17 +528,41 @@ class Job:
     @property
     def state(self):
         """
-        returns the state of the remote job from the log file
+        returns the state of the remote job from the log file. Only the
+        lines appended since the last call are read.
+        :return:
+        """
+        self.tail(self.log)
+        return self.status
+
+    async def astate(self):
+        """
+        returns the state of the remote job from the log file using asyncio
         :return:
         """
-        lines = self.get_process_file(self.log)
+        await self.atail(self.log)
+        return self.status
+
+    def update_state(self, lines):
+        """
+        sets the status and the exit code to the last ones in the lines of
+        the log file. They are kept if the lines contain none.
 
+        :param lines: the content or the new lines of the log file
+        :return: the status
+        """
         if lines is not None:
             lines = lines.splitlines()
 
             result = Shell.find_lines_with(lines=lines, what="cloudmesh state:")
             if len(result) != 0:
                 self.status = result[-1].split(":", 1)[1].strip()
+            result = Shell.find_lines_with(lines=lines, what="cloudmesh exit:")
+            if len(result) != 0:
+                try:
+                    self.exit_code = int(result[-1].split(":", 1)[1])
+                except ValueError:
+                    pass
 
         return self.status
 
@@ -433,7 +578,28 @@ class Job:
             lines = self.get_process_file(f"{self.name}.pid")
         except:
             return None
+        return self.update_pid(lines)
 
+    async def arpid(self):
+        """
+        returns the remote pid from the job using asyncio
+        :return:
+        """
+        if self.pid is not None:
+            return self.pid
+        try:
+            lines = await self.aget_process_file(f"{self.name}.pid")
+        except:
+            return None
+        return self.update_pid(lines)
+
+    def update_pid(self, lines):
+        """
+        sets the pid to the content of the pid file
+
+        :param lines: the content of the pid file
+        :return: the pid
+        """
         if lines is not None:
             self.pid = lines.strip()
         else:
@@ -448,7 +614,8 @@ class Job:
 
     def get_process_file(self, name):
         """
-        retrieves the contents of the named file in the experiment/job directory
+        retrieves the contents of the named file in the experiment/job directory.
+        A pid file is read again until the script has written the pid to it.
 
         :param name: name of the file
         :return: content as string
@@ -459,31 +626,265 @@ class Job:
                 if is_local(self.host):
                     lines = readfile(f"{self.directory}/{self.name}/{name}")
                 else:
-                    lines = Shell.run(f"ssh {self.user}@{self.host} \"cat {self.directory}/{self.name}/{name}\"")
+                    lines = ssh.pool.output(
+                        self.user, self.host,
+                        f"cat {self.directory}/{self.name}/{name}")
                     #BUG if host is unreachable
-                found = True
+                found = not self.incomplete(name, lines)
             except:
                 if 'log' in name:
                     # file does not exist until command run
                     return ''
-                pass
+            if not found:
+                time.sleep(0.1)
         return lines
 
+    @staticmethod
+    def incomplete(name, lines) -> bool:
+        """
+        returns True if the named file was read after the script created it
+        but before it wrote the pid to it
+
+        :param name: name of the file
+        :param lines: the content of the file
+        :return: bool
+        """
+        return name.endswith(".pid") and not lines.strip()
+
+    async def aget_process_file(self, name):
+        """
+        retrieves the contents of the named file in the experiment/job
+        directory using asyncio. Just as get_process_file() it retries
+        until the file can be read, but lets other tasks run meanwhile.
+
+        :param name: name of the file
+        :return: content as string
+        """
+        while True:
+            try:
+                if is_local(self.host):
+                    lines = readfile(f"{self.directory}/{self.name}/{name}")
+                else:
+                    lines = await ssh.pool.aoutput(
+                        self.user, self.host,
+                        f"cat {self.directory}/{self.name}/{name}")
+                if not self.incomplete(name, lines):
+                    return lines
+                await asyncio.sleep(0.1)
+            except Exception:
+                if 'log' in name:
+                    # file does not exist until command run
+                    return ''
+                await asyncio.sleep(0.1)
+
+    def tail_command(self, name):
+        """
+        returns the command printing the offset from which the named file
+        is read and the offset after its last complete line followed by
+        the bytes appended since the last read. The file is read from the
+        beginning if it was truncated.
+
+        :param name: name of the file
+        :return: str
+        """
+        offset = self._tails.get(name, (0, ""))[0]
+        path = shlex.quote(f"{self.directory}/{self.name}/{name}")
+        return f'f={path}; [ -f "$f" ] || exit 1; ' \
+               f'size=$(($(wc -c < "$f"))); offset={offset}; ' \
+               f'[ "$size" -lt "$offset" ] && offset=0; ' \
+               f'chunk() {{ tail -c +$((offset + 1)) "$f" | ' \
+               f'head -c $((size - offset)); }}; end=$size; ' \
+               f'if [ -n "$(chunk | tail -c 1)" ]; then ' \
+               f'end=$((size - $(chunk | tail -n 1 | wc -c))); fi; ' \
+               f'echo "$offset $end"; chunk'
+
+    def tail(self, name):
+        """
+        retrieves the lines appended to the named file in the
+        experiment/job directory since the last call
+
+        :param name: name of the file
+        :return: the new lines as string, '' if the file does not exist
+        """
+        if is_local(self.host):
+            offset = self._tails.get(name, (0, ""))[0]
+            try:
+                with open(f"{self.directory}/{self.name}/{name}", "rb") as f:
+                    if os.fstat(f.fileno()).st_size < offset:
+                        offset = 0
+                    f.seek(offset)
+                    data = f.read()
+            except OSError:
+                return ''
+            end = offset + data.rfind(b"\n") + 1
+            return self.update_tail(name, offset, end,
+                                    data.decode(errors="replace"))
+        r = ssh.pool.run(self.user, self.host, self.tail_command(name))
+        if r.returncode != 0:
+            return ''
+        return self.update_tail(name, *self.parse_tail(r.stdout))
+
+    async def atail(self, name):
+        """
+        retrieves the lines appended to the named file since the last call
+        using asyncio, see tail()
+
+        :param name: name of the file
+        :return: the new lines as string, '' if the file does not exist
+        """
+        if is_local(self.host):
+            return self.tail(name)
+        r = await ssh.pool.arun(self.user, self.host, self.tail_command(name))
+        if r.returncode != 0:
+            return ''
+        return self.update_tail(name, *self.parse_tail(r.stdout))
+
+    @staticmethod
+    def parse_tail(output):
+        """
+        returns the offsets and the data printed by tail_command()
+
+        :param output: the output of tail_command()
+        :return: offset, end and data
+        """
+        offsets, _, data = output.partition("\n")
+        offset, end = [int(value) for value in offsets.split()]
+        return offset, end, data
+
+    def update_tail(self, name, offset, end, data):
+        """
+        appends the complete lines of the data read from the offset to the
+        content of the named file read so far. An incomplete last line is
+        kept apart and read again by the next call. The status is updated
+        from the new lines of the log file.
+
+        :param name: name of the file
+        :param offset: the offset from which the data was read
+        :param end: the offset in bytes after the last complete line
+        :param data: the data
+        :return: the new lines
+        """
+        previous, content, partial = self._tails.get(name, (0, "", ""))
+        if offset < previous:
+            # the file was truncated as the job was started again
+            content = ""
+        lines = data.rfind("\n") + 1
+        data, partial = data[:lines], data[lines:]
+        self._tails[name] = (end, content + data, partial)
+        if name == self.log:
+            self.update_state(data)
+        return data
+
+    def tailed(self, name):
+        """
+        returns the content of the named file read so far including an
+        incomplete last line
+
+        :param name: name of the file
+        :return: str
+        """
+        offset, content, partial = self._tails.get(name, (0, "", ""))
+        return content + partial
+
     def get_log(self):
         """
         Retrieves the log file form the host machine where the command is executed.
+        Only the lines appended since the last call are transferred.
 
         @return: str
         """
-        return self.get_process_file(self.log)
+        self.tail(self.log)
+        return self.tailed(self.log)
 
     def get_output(self):
         """
         Retrieves the output file form the host machine where the command is executed.
+        Only the lines appended since the last call are transferred.
 
         @return: str
         """
-        return self.get_process_file(self.output)
+        self.tail(self.output)
+        return self.tailed(self.output)
+
+    def stream(self, name, chunk_size=65536, compress=False):
+        """
+        yields the content of the named file in the experiment/job directory
+        in chunks of at most chunk_size bytes without reading it as a whole.
+        If compress is True the content is compressed with gzip on the
+        host, so the chunks are those of the gzip file.
+
+        :param name: name of the file
+        :param chunk_size: the maximum number of bytes of a chunk
+        :param compress: compress the content with gzip
+        :return: generator of bytes
+        """
+        path = f"{self.directory}/{self.name}/{name}"
+        if is_local(self.host):
+            compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) \
+                if compress else None
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    if compressor is None:
+                        yield chunk
+                    else:
+                        chunk = compressor.compress(chunk)
+                        if chunk:
+                            yield chunk
+            if compressor is not None:
+                yield compressor.flush()
+            return
+        command = f"gzip -c {shlex.quote(path)}" if compress \
+            else f"cat {shlex.quote(path)}"
+        yield from ssh.pool.stream(self.user, self.host, command,
+                                   chunk_size=chunk_size)
+
+    def iter_output(self, chunk_size=65536, compress=False):
+        """
+        yields the output file of the job in chunks of at most chunk_size
+        bytes, so outputs of any size can be processed with constant memory
+
+            for chunk in job.iter_output():
+                ...
+
+        :param chunk_size: the maximum number of bytes of a chunk
+        :param compress: compress the output with gzip while it is
+                         transferred from the host
+        :return: generator of bytes
+        """
+        chunks = self.stream(self.output, chunk_size=chunk_size,
+                             compress=compress)
+        if not compress:
+            yield from chunks
+            return
+        decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        for chunk in chunks:
+            while chunk:
+                data = decompressor.decompress(chunk, chunk_size)
+                if data:
+                    yield data
+                chunk = decompressor.unconsumed_tail
+        data = decompressor.flush()
+        if data:
+            yield data
+
+    def download_output(self, path, chunk_size=65536, compress=False):
+        """
+        writes the output file of the job to the path while it is streamed
+        from the host, see iter_output()
+
+        :param path: the path of the written file
+        :param chunk_size: the maximum number of bytes of a chunk
+        :param compress: compress the output with gzip while it is
+                         transferred from the host
+        :return: the number of bytes written
+        """
+        size = 0
+        with open(path_expand(path), "wb") as f:
+            for chunk in self.iter_output(chunk_size=chunk_size,
+                                          compress=compress):
+                f.write(chunk)
+                size += len(chunk)
+        return size
 
     def get_log_nohup(self):
         """
@@ -507,8 +908,8 @@ class Job:
 
     def warn_if_job_dir_present(self):
         if not is_local(self.host):
-            command = f"ssh {self.user}@{self.host} ls {self.experiment}"
-            r = Shell.run(command)
+            command = f"ls {self.experiment}"
+            r = ssh.pool.output(self.user, self.host, command)
             if self.name in r:
                 Console.warning(f"Job directory {self.experiment}/{self.name} already present on host.\n"
                                 f"Use `cms reset` prior to re-running jobs to ensure dir is deleted.")
@@ -529,23 +930,118 @@ class Job:
 
         @return: None
         """
+        self.materialize()
+        blobs = self.link_inputs()
         self.warn_if_job_dir_present()
 
         if not is_local(host):
-            command = f"rsync -r {self.experiment}/{job_name} {user}@{host}:{self.experiment}"
-            os.system(command)
+            if blobs:
+                Host.stage(user, host, self.experiment, [], blobs=blobs)
+            command = f"rsync -rl --copy-unsafe-links -e '{ssh.pool.rsh(user, host)}' " \
+                      f"{self.experiment}/{job_name} {user}@{host}:{self.experiment}"
+            with ssh.pool.session(user, host):
+                os.system(command)
 
     def run(self):
         """
         run the script on the remote host
         """
         banner(f"Run: {self.name}")
+        self.materialize()
         # print("Command:", self.remote_command)
-        r = os.system(self.remote_command)
+        self._tails = {}
+        r = ssh.pool.run(self.user, self.host, self.remote_command)
         self.pid = self.rpid
         self.status='run'
         return self.pid
 
+    async def arun(self):
+        """
+        run the script on the remote host using asyncio
+        """
+        banner(f"Run: {self.name}")
+        self.materialize()
+        self._tails = {}
+        await ssh.pool.arun(self.user, self.host, self.remote_command)
+        self.pid = await self.arpid()
+        self.status = 'run'
+        return self.pid
+
+    def launch_command(self):
+        """
+        returns the command that writes the script read from stdin to the
+        job directory, starts it detached and prints its pid and the name
+        of the host
+
+        :return: str
+        """
+        directory = f"{self.directory}/{self.name}"
+        script = f"{self.name}.{self.shell}"
+        return \
+            f"[ -e {directory}/{self.name}.pid ] && echo '# cloudmesh present'; " + \
+            f"mkdir -p {directory} && cd {directory} && cat > {script} && " + \
+            f"{{ nohup {self.shell} {script} >> {self.name}-nohup.log 2>&1 " + \
+            f"< /dev/null & echo \"# cloudmesh pid: $!\"; }} && hostname"
+
+    def launch(self):
+        """
+        runs the job with a single remote command. Unlike run() the script
+        does not need to be copied to the host before and the pid is not
+        read afterwards, as the command receives the script on stdin and
+        prints the pid of the started job. The host is probed by the same
+        command.
+
+        :return: the pid or None if the job could not be started
+        """
+        banner(f"Launch: {self.name}")
+        self.materialize()
+        self._tails = {}
+        with open(self.scriptname) as f:
+            script = f.read()
+        r = ssh.pool.run(self.user, self.host, self.launch_command(),
+                         input=script)
+        return self.update_launch(r)
+
+    async def alaunch(self):
+        """
+        runs the job with a single remote command using asyncio, see
+        launch()
+
+        :return: the pid or None if the job could not be started
+        """
+        banner(f"Launch: {self.name}")
+        self.materialize()
+        self._tails = {}
+        with open(self.scriptname) as f:
+            script = f.read()
+        r = await ssh.pool.arun(self.user, self.host, self.launch_command(),
+                                input=script)
+        return self.update_launch(r)
+
+    def update_launch(self, r):
+        """
+        sets the pid, the status and the probe time from the output of the
+        launch command
+
+        :param r: the completed launch command
+        :return: the pid or None if the job could not be started
+        """
+        lines = r.stdout.splitlines()
+        if "# cloudmesh present" in lines:
+            Console.warning(f"Job directory {self.experiment}/{self.name} already present on host.\n"
+                            f"Use `cms reset` prior to re-running jobs to ensure dir is deleted.")
+        pids = [line.split(":", 1)[1].strip() for line in lines
+                if line.startswith("# cloudmesh pid:")]
+        if r.returncode != 0 or not pids:
+            self.pid = None
+            return None
+        host = Host(name=self.host, user=self.user)
+        probe_status, self.last_probe_check = \
+            host.update_probe(datetime.now(), lines[-1])
+        self.update_pid(pids[-1])
+        self.status = 'run'
+        return self.pid
+
     def to_yaml(self):
         result = [f'{self.name}:']
         for argument in ["name", "id", "experiment", "directory", "input", "output",
@@ -574,6 +1070,34 @@ class Job:
         if self.pid is None:
             # job has not been started nothing to kill
             return None
+        r = ssh.pool.run(self.user, self.host, self.kill_command()).returncode
+        Console.info(f"Job kill return code was: {r}")
+        self.status = "kill"
+        return r
+
+    async def akill(self):
+        """
+        kills the job just as kill() using asyncio
+        """
+        banner(f"Kill: {self.name}")
+        if await self.aps() is None:
+            Console.info(f'Job {self.name} could not be killed, not running ps {self.pid} on {self.host}')
+            return
+        if self.pid is None:
+            # job has not been started nothing to kill
+            return None
+        r = (await ssh.pool.arun(self.user, self.host,
+                                 self.kill_command())).returncode
+        Console.info(f"Job kill return code was: {r}")
+        self.status = "kill"
+        return r
+
+    def kill_command(self):
+        """
+        returns the command killing the job and its children on the host
+
+        :return: str
+        """
         if is_local(self.host):
             command = \
                 f"cd {self.directory}/{self.name}; " + \
@@ -583,183 +1107,1398 @@ class Job:
 
         else:
             command = \
-                f"ssh {self.user}@{self.host} " + \
-                f"'" + \
                 f"cd {self.directory}/{self.name}; " + \
                 f'kill -9 "-$(ps -o pgid= {self.pid} | xargs)";' + \
-                f"{self.logging(msg='kill')};" + \
-                f"'"
+                f"{self.logging(msg='kill')};"
+        return command
 
-        #print("Command:", command)
-        r = os.system(command)
-        Console.info(f"Job kill return code was: {r}")
-        self.status = "kill"
-        return r
 
+@dataclass
+class JobArray:
+    """
+    A job array describes many jobs that only differ in their index with a
+    single template. The job with the index i is named f"{name}{i}{suffix}".
+    The array is stored in a queue as one record and the schedulers expand
+    it one index at a time when they look for the next job:
 
-class Queue:
+        array = JobArray.from_name("job[1-100000]",
+                                   {"command": "uname", "host": "red",
+                                    "user": "pi"})
+        queue.add_array(array)
 
-    def __init__(self,
-                 name: str = "TBD",
-                 experiment: str = None,
-                 filename: str = None,
-                 jobs: List = None):
+    Fields of single indices can be overwritten with
 
-        self.name = name
-        self.experiment = experiment or "./experiment"
-        self.experiment = path_expand(self.experiment)
-        self.filename = filename or f"{self.experiment}/{self.name}-queue.yaml"
-        if not os.path.exists(self.experiment):
-            os.makedirs(self.experiment)
-        self.jobs = YamlDB(filename=self.filename)
-        if jobs:
-            self.add_jobs(jobs)
+        array.overrides["7"] = {"host": "blue"}
+
+    The keys of the overrides are strings so they survive all storages.
+    """
+    name: str = "TBD"
+    start: int = 1
+    end: int = 1
+    next: int = None
+    width: int = 0
+    suffix: str = ""
+    template: dict = None
+    overrides: dict = None
+    status: str = "undefined"
+
+    def __post_init__(self):
+        self.template = dict(self.template or {})
+        self.overrides = dict(self.overrides or {})
+        if self.next is None:
+            self.next = self.start
+        self.status = self.template.get("status", "undefined")
+        if self.template.get("host") and self.template.get("user") and \
+                self.status == "undefined":
+            self.status = "ready"
+
+    @classmethod
+    def from_name(cls, name: str, template: dict = None):
+        """
+        Returns the job array for an expandable name of the form
+        prefix[start-end]suffix, e.g. job[1-100]. Leading zeros in start
+        are kept in the names of the jobs. For all other names None is
+        returned, they have to be expanded with Parameter.expand.
+
+        :param name: the expandable name
+        :param template: the fields of the jobs
+        :return: JobArray or None
+        """
+        found = re.fullmatch(r"([^\[\],]*)\[(\d+)-(\d+)\]([^\[\],]*)", name or "")
+        if found is None:
+            return None
+        prefix, start, end, suffix = found.groups()
+        width = len(start) if start.startswith("0") else 0
+        return cls(name=prefix, start=int(start), end=int(end), width=width,
+                   suffix=suffix, template=template)
 
     def __len__(self):
-        return len(self.jobs.data)
+        return max(0, self.end - self.start + 1)
 
-    def delete(self, name: str):
+    @property
+    def key(self):
         """
-        Deletes the job with the given name
-
-        :param name: name of the job
-        :return: Job
+        The name of the array as stored in the queue, e.g. job[1-100]
         """
-        try:
-            # check if job is running
-            # if it is running kill job (not yet implemented in Job class to do)
-            # finally delete from queue
-            job = Job(**self.jobs[name])
-            if job.state == 'start':
-                job.kill()
-            job.remove_dir()
-            self.jobs.delete(name)
-            self.save()
-            return job
-        except:
-            Console.warning(f"Could not delete job:{name}")
+        return f"{self.name}[{self.start:0{self.width}d}-{self.end}]{self.suffix}"
 
-    def keys(self):
-        return self.jobs.keys()
+    @property
+    def remaining(self):
+        """
+        The number of indices that are not yet expanded
+        """
+        return max(0, self.end - self.next + 1)
 
-    def items(self):
-        return self.jobs.__dict__["data"].items()
+    def job_name(self, index: int) -> str:
+        return f"{self.name}{index:0{self.width}d}{self.suffix}"
 
-    def values(self):
-        return self.jobs.__dict__["data"].values()
+    def job(self, index: int) -> Job:
+        """
+        Returns the job with the given index. Like Job.from_dict it does
+        not write the script.
 
-    def __getitem__(self, item):
-        if type(item) == int:
-            print(self.jobs.keys())
-            key = list(self.jobs.keys())[item]
-        else:
-            key = str(item)
-        data = self.get(key)
-        return dict(data)
-        #job = Job(**data)
-        #return job
+        :param index: the index
+        :return: Job
+        """
+        data = dict(self.template)
+        data.update(self.overrides.get(str(index), {}))
+        data["name"] = self.job_name(index)
+        return Job.from_dict(data)
 
-    def get(self, name: str) -> dict:
+    def pop(self) -> Job:
         """
-        Returns the job with the given name
+        Returns the job with the next index and advances the array
 
-        :param name: name of the job
-        :return: dict of job
+        :return: Job or None if all indices are expanded
         """
-        return self.jobs[name]
+        if self.remaining == 0:
+            return None
+        job = self.job(self.next)
+        self.next += 1
+        return job
 
-    def set(self, job: Job):
+    def to_dict(self):
         """
-        Overwrites the contents of the job. If the job
-        does not exist, it will be updated.
+        Returns a dict of the job array
 
-        :param job: the job
+        :return: dict
         """
-        self.jobs[job.name] = job.to_dict()
-        self.save()
+        return _to_dict(self)
 
-    def search(self, query):
-        return self.jobs.search(query)
 
-    def load(self, filename=None):
-        filename = filename or self.filename
-        self.jobs = YamlDB(filename=filename)
+class StatusIndex:
+    """
+    Keeps the names of the jobs of a queue grouped by their status. The
+    names of each status are kept in the order in which the jobs reached
+    that status, so the next ready job is found in O(1):
+
+        index = StatusIndex(queue.items())
+        index.first("ready")
+        index.names("run")
+        index.set("job1", "end")
+    """
 
-    def add_jobs(self, jobs):
-        for job in jobs:
-            self.jobs[job.name] = job.to_dict()
-            self.save()
+    running = ["start", "run"]
+    terminal = ["end", "kill", "crash", "fail_start", "fail_parent"]
 
-    def add(self, job: Job):
-        self.jobs[job.name] = job.to_dict()
-        self.save()
+    def __init__(self, jobs=None):
+        self.status = {}
+        self.order = {}
+        # numbers are not reused after a delete, so later jobs sort last
+        self.sequence = count()
+        self.groups = {}
+        for name, job in (jobs or []):
+            self.set(name, job.get("status"))
 
-    def save(self):
-        #if len(self.jobs.data) > 0:
-        self.jobs.save(self.filename)
+    def __len__(self):
+        return len(self.status)
+
+    def __contains__(self, name):
+        return name in self.status
+
+    def set(self, name: str, status: str):
+        """
+        Records the status of the job
+
+        :param name: name of the job
+        :param status: the status of the job
+        :return: None
+        """
+        old = self.status.get(name)
+        if name in self.status and old == status:
+            return
+        if name in self.status:
+            del self.groups[old][name]
+        else:
+            self.order[name] = next(self.sequence)
+        self.status[name] = status
+        self.groups.setdefault(status, {})[name] = None
+
+    def delete(self, name: str):
+        """
+        Removes the job from the index
+
+        :param name: name of the job
+        :return: None
+        """
+        if name in self.status:
+            del self.groups[self.status.pop(name)][name]
+            del self.order[name]
+
+    def names(self, *statuses) -> list:
+        """
+        Returns the names of the jobs with one of the given statuses
+
+        :param statuses: the statuses
+        :return: list of names
+        """
+        result = []
+        for status in statuses:
+            result.extend(self.groups.get(status, {}))
+        return result
+
+    def count(self, *statuses) -> int:
+        return sum(len(self.groups.get(status, {})) for status in statuses)
+
+    def firsts(self, count: int, *statuses) -> list:
+        """
+        Returns the names of the next count jobs with one of the given
+        statuses, ordered as first() would return them
+
+        :param count: the number of names
+        :param statuses: the statuses
+        :return: list of names
+        """
+        names = []
+        for status in statuses:
+            names.extend(islice(self.groups.get(status, {}), count))
+        if len(statuses) > 1:
+            names.sort(key=self.order.get)
+        return names[:count]
+
+    def first(self, *statuses):
+        """
+        Returns the name of the next job with one of the given statuses. If
+        several statuses are given, the job that was added first to the
+        queue among the first job of each status is returned.
+
+        :param statuses: the statuses
+        :return: name of the job or None
+        """
+        found = None
+        for status in statuses:
+            group = self.groups.get(status)
+            if group:
+                name = next(iter(group))
+                if found is None or self.order[name] < self.order[found]:
+                    found = name
+        return found
+
+
+class JobTable:
+    """
+    A compact in-memory index of the jobs of a queue. Instead of a dict per
+    job the table keeps one array of integer codes per column. Each code
+    refers to an interned value in the vocabulary of the column, so the
+    many jobs that share a status, host, user or command share one string:
+
+        table = JobTable(queue.items())
+        table.get("job1", "status")
+        table.select(status="ready", host="red")
+        table.rows(["name", "status", "host"])
+
+    Only fields whose values repeat across jobs are columns of the table.
+    Fields that are unique per job, such as output and log, are read from
+    the records of the store. The records themselves stay in the store, as
+    the yaml and journal stores rewrite them from memory.
+
+    The table also maintains the StatusIndex of the queue.
+    """
+
+    __slots__ = ["names", "positions", "columns", "values", "codes",
+                 "deleted", "index"]
+
+    fields = ["status", "command", "host", "user", "gpu", "experiment"]
+
+    def __init__(self, jobs=None):
+        self.names = []
+        self.positions = {}
+        self.columns = {field: array("l") for field in self.fields}
+        self.values = {field: [] for field in self.fields}
+        self.codes = {field: {} for field in self.fields}
+        self.deleted = 0
+        self.index = StatusIndex()
+        for name, job in (jobs or []):
+            self.set(name, job)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __contains__(self, name):
+        return name in self.positions
+
+    def _code(self, field: str, value) -> int:
+        codes = self.codes[field]
+        if value not in codes:
+            if isinstance(value, str):
+                value = sys.intern(value)
+            codes[value] = len(self.values[field])
+            self.values[field].append(value)
+        return codes[value]
+
+    def set(self, name: str, job: dict):
+        """
+        Adds or updates the row of the job
+
+        :param name: name of the job
+        :param job: the job as dict
+        :return: None
+        """
+        position = self.positions.get(name)
+        if position is None:
+            self.positions[name] = len(self.names)
+            self.names.append(sys.intern(name))
+            for field in self.fields:
+                self.columns[field].append(self._code(field, job.get(field)))
+        else:
+            for field in self.fields:
+                self.columns[field][position] = self._code(field, job.get(field))
+        self.index.set(name, job.get("status"))
+
+    def delete(self, name: str):
+        """
+        Removes the row of the job. The space of deleted rows is reclaimed
+        once half of the rows are deleted.
+
+        :param name: name of the job
+        :return: None
+        """
+        position = self.positions.pop(name, None)
+        if position is None:
+            return
+        self.names[position] = None
+        self.index.delete(name)
+        self.deleted += 1
+        if self.deleted > len(self.names) // 2:
+            self.compact()
+
+    def compact(self):
+        """
+        Removes the deleted rows from the arrays and the values that are
+        no longer used from the vocabularies
+
+        :return: None
+        """
+        keep = [position for position, name in enumerate(self.names)
+                if name is not None]
+        self.names = [self.names[position] for position in keep]
+        self.positions = {name: position
+                          for position, name in enumerate(self.names)}
+        for field in self.fields:
+            column = self.columns[field]
+            values = self.values[field]
+            self.values[field] = []
+            self.codes[field] = {}
+            self.columns[field] = array("l", (
+                self._code(field, values[column[position]])
+                for position in keep))
+        self.deleted = 0
+
+    def get(self, name: str, field: str):
+        """
+        Returns the value of a field of the job
+
+        :param name: name of the job
+        :param field: the field
+        :return: the value
+        """
+        position = self.positions[name]
+        return self.values[field][self.columns[field][position]]
+
+    def select(self, **fields) -> list:
+        """
+        Returns the names of the jobs whose fields have the given values.
+        The values are compared by their codes.
+
+        :param fields: the field values to match
+        :return: list of names
+        """
+        wanted = []
+        for field, value in fields.items():
+            if value not in self.codes[field]:
+                return []
+            wanted.append((self.columns[field], self.codes[field][value]))
+        return [name for position, name in enumerate(self.names)
+                if name is not None and
+                all(column[position] == code for column, code in wanted)]
+
+    def distinct(self, *fields) -> list:
+        """
+        Returns the distinct combinations of the values of the fields in
+        the order in which they appear
+
+        :param fields: the fields
+        :return: list of tuples
+        """
+        columns = [self.columns[field] for field in fields]
+        found = {}
+        for position, name in enumerate(self.names):
+            if name is not None:
+                found[tuple(column[position] for column in columns)] = None
+        return [tuple(self.values[field][code]
+                      for field, code in zip(fields, codes))
+                for codes in found]
+
+    def rows(self, order: list = None, records=None):
+        """
+        Returns an iterator of (name, values) with the values of the given
+        fields of each job as tuple. Fields that are not columns of the
+        table are read from records, so the record of a job is only looked
+        up if such a field is requested.
+
+        :param order: the fields, defaults to name and all table fields
+        :param records: the records of the jobs, e.g. the store of the queue
+        :return: iterator
+        """
+        order = order or ["name"] + self.fields
+        other = [field for field in order
+                 if field != "name" and field not in self.columns]
+        if other and records is None:
+            raise ValueError(f"the fields {other} are not in the job table")
+        for position, name in enumerate(self.names):
+            if name is None:
+                continue
+            record = (records.get(name) or {}) if other else None
+            yield name, tuple(
+                name if field == "name" else
+                record.get(field) if field not in self.columns else
+                self.values[field][self.columns[field][position]]
+                for field in order)
+
+
+class Queue:
+
+    def __init__(self,
+                 name: str = "TBD",
+                 experiment: str = None,
+                 filename: str = None,
+                 jobs: List = None,
+                 storage: str = None,
+                 write_behind: float = None):
+        """
+        Creates or loads a queue
+
+        :param name: name of the queue
+        :param experiment: the experiment directory
+        :param filename: the file of the queue
+        :param jobs: list of jobs to be added
+        :param storage: the storage engine, "yaml", "journal" or "sqlite".
+                        If not specified it is detected from the existing
+                        files
+        :param write_behind: if given, changed jobs are persisted at most
+                             every write_behind seconds. Changes of the
+                             status to a running or terminal state and
+                             the exit of the program flush them right away
+        """
+        self.name = name
+        self.experiment = experiment or "./experiment"
+        self.experiment = path_expand(self.experiment)
+        self.filename = filename or f"{self.experiment}/{self.name}-queue.yaml"
+        if not os.path.exists(self.experiment):
+            os.makedirs(self.experiment)
+        self.write_behind = write_behind
+        self.jobs = get_store(self.filename, storage=storage,
+                              write_behind=write_behind)
+        self.storage = self.jobs.kind
+        if write_behind is not None:
+            _write_behind_queues.add(self)
+        self.table = JobTable(self.jobs.items())
+        self.index = self.table.index
+        self.arrays_filename = \
+            f"{os.path.splitext(self.filename)[0]}-arrays.yaml"
+        self.arrays = None
+        if exists(self.arrays_filename):
+            self.arrays = get_store(self.arrays_filename)
+        self.archive_directory = f"{os.path.splitext(self.filename)[0]}-archive"
+        self.archive_index = None
+        self.segments = {}
+        self.agents = None
+        self.events = None
+        self.received = {}
+        self.offsets = {}
+        self.polls = {}
+        self.poll_interval = 0.1
+        self.max_poll_interval = 5.0
+        if jobs:
+            self.add_jobs(jobs)
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def delete(self, name: str):
+        """
+        Deletes the job with the given name
+
+        :param name: name of the job
+        :return: Job
+        """
+        if self.arrays is not None and name in self.arrays:
+            return self.delete_array(name)
+        jobs = self.delete_jobs([name])
+        return jobs[0] if jobs else None
+
+    def delete_jobs(self, names: list) -> list:
+        """
+        Deletes the jobs and job arrays with the given names. Running jobs
+        are killed and the job directories are removed with a single
+        command per host, see cleanup().
+
+        :param names: the names of the jobs
+        :return: list of the deleted Job
+        """
+        jobs = []
+        for name in names:
+            if self.arrays is not None and name in self.arrays:
+                self.delete_array(name)
+            elif name in self.jobs:
+                jobs.append(Job.from_dict(self.jobs[name]))
+            else:
+                Console.warning(f"Could not delete job:{name}")
+        result = self.cleanup(jobs)
+        if result:
+            Console.warning(result)
+        with self.batch():
+            for job in jobs:
+                self.jobs.delete(job.name)
+                self.table.delete(job.name)
+        return jobs
+
+    def keys(self):
+        return self.jobs.keys()
+
+    def items(self):
+        return self.jobs.items()
+
+    def values(self):
+        return self.jobs.values()
+
+    def __getitem__(self, item):
+        if type(item) == int:
+            print(self.jobs.keys())
+            key = list(self.jobs.keys())[item]
+        else:
+            key = str(item)
+        data = self.get(key)
+        return dict(data)
+        #job = Job(**data)
+        #return job
+
+    def get(self, name: str) -> dict:
+        """
+        Returns the job with the given name. Jobs that are not in the queue
+        are looked up in the archive, see archive().
+
+        :param name: name of the job
+        :return: dict of job
+        """
+        try:
+            return self.jobs[name]
+        except KeyError:
+            record = self.get_archived(name)
+            if record is None:
+                raise
+            return record
+
+    def segment(self, name: str):
+        """
+        Returns the store of the archive segment with the given name. The
+        segments are opened when they are first used.
+
+        :param name: the name of the segment, e.g. 2022-03-01
+        :return: the store of the segment
+        """
+        if name not in self.segments:
+            self.segments[name] = get_store(
+                f"{self.archive_directory}/{name}.yaml", storage="yaml")
+        return self.segments[name]
+
+    def get_archived(self, name: str):
+        """
+        Returns the archived job with the given name. The archive index
+        tells in which segment the job is, so only that segment is read.
+
+        :param name: name of the job
+        :return: dict of job or None
+        """
+        index = f"{self.archive_directory}/index.yaml"
+        if self.archive_index is None:
+            if not exists(index):
+                return None
+            self.archive_index = get_store(index)
+        else:
+            self.archive_index.reload()
+        entry = self.archive_index.get(name)
+        if entry is None:
+            return None
+        segment = self.segment(entry["segment"])
+        segment.reload()
+        return segment.get(name)
+
+    def archive(self, statuses: list = None, window: str = "%Y-%m-%d"):
+        """
+        Moves the jobs with a terminal status from the queue into the
+        archive segment of the current time window and compacts the queue.
+        The segments are written to the directory <queue>-archive next to
+        the queue file and are read only when an archived job is requested
+        with get().
+
+        :param statuses: the statuses to archive, defaults to end, kill,
+                         crash, fail_start and fail_parent
+        :param window: a strftime format that names the segment, e.g.
+                       "%Y-%m" for one segment per month
+        :return: list of the names of the archived jobs
+        """
+        names = self.index.names(*(statuses or StatusIndex.terminal))
+        if not names:
+            return []
+        name = datetime.now().strftime(window)
+        self.segment(name).update({key: self.get(key) for key in names})
+        if self.archive_index is None:
+            self.archive_index = get_store(
+                f"{self.archive_directory}/index.yaml", storage=self.storage)
+        self.archive_index.update({key: {"segment": name} for key in names})
+        with self.batch():
+            for key in names:
+                self.jobs.delete(key)
+                self.table.delete(key)
+        self.compact()
+        return names
+
+    def get_job(self, name: str) -> Job:
+        """
+        Returns the job with the given name as Job without writing its
+        script, see Job.from_dict
+
+        :param name: name of the job
+        :return: Job
+        """
+        return Job.from_dict(self.get(name))
+
+    def set(self, job: Job):
+        """
+        Overwrites the contents of the job. If the job
+        does not exist, it will be updated.
+
+        :param job: the job
+        """
+        old = self.index.status.get(job.name)
+        record = job.to_dict()
+        self.jobs.set(job.name, record)
+        self.table.set(job.name, record)
+        if self.write_behind is not None and old != job.status and \
+                job.status in StatusIndex.running + StatusIndex.terminal:
+            self.flush()
+
+    def search(self, query):
+        return self.jobs.search(query)
+
+    def find(self, **fields) -> dict:
+        """
+        Returns the jobs whose fields have the given values, e.g.
+
+            queue.find(status="ready")
+            queue.find(host="red", user="pi")
+
+        :param fields: the field values to match
+        :return: dict of jobs
+        """
+        return self.jobs.find(**fields)
+
+    def load(self, filename=None):
+        filename = filename or self.filename
+        self.flush()
+        self.jobs = get_store(filename, storage=self.storage,
+                              write_behind=self.write_behind)
+        self.table = JobTable(self.jobs.items())
+        self.index = self.table.index
+        if exists(self.arrays_filename):
+            self.arrays = get_store(self.arrays_filename)
+
+    def reload(self) -> list:
+        """
+        Reads the jobs that other processes, such as the REST server or a
+        scheduler, have changed since the queue was loaded or last reloaded.
+        The queue file is not read again if its generation is unchanged.
+
+        :return: list of the names of the changed jobs
+        """
+        changes = self.jobs.reload()
+        for name, record in changes.items():
+            if record is None:
+                self.table.delete(name)
+            else:
+                self.table.set(name, record)
+        if self.arrays is not None:
+            self.arrays.reload()
+        elif exists(self.arrays_filename):
+            self.arrays = get_store(self.arrays_filename)
+        return list(changes)
+
+    def add_jobs(self, jobs):
+        records = {job.name: job.to_dict() for job in jobs}
+        self.jobs.update(records)
+        for name, record in records.items():
+            self.table.set(name, record)
+
+    def add(self, job: Job):
+        record = job.to_dict()
+        self.jobs.add(job.name, record)
+        self.table.set(job.name, record)
+
+    def add_array(self, array: JobArray):
+        """
+        Adds a job array as a single record. The jobs of the array are
+        created by the schedulers with expand_array, so adding an array
+        takes the same time regardless of its size.
+
+        :param array: the job array
+        """
+        if self.arrays is None:
+            self.arrays = get_store(self.arrays_filename, storage=self.storage)
+        self.arrays.add(array.key, array.to_dict())
+
+    def get_array(self, key: str) -> JobArray:
+        """
+        Returns the job array with the given key, e.g. job[1-100]
+
+        :param key: the key of the array
+        :return: JobArray
+        """
+        return JobArray(**self.arrays[key])
+
+    def delete_array(self, key: str):
+        """
+        Deletes the job array and the jobs already expanded from it
+
+        :param key: the key of the array
+        :return: JobArray
+        """
+        array = self.get_array(key)
+        self.delete_jobs([array.job_name(index)
+                          for index in range(array.start, array.next)
+                          if array.job_name(index) in self.index])
+        self.arrays.delete(key)
+        return array
+
+    def expand_array(self, *statuses):
+        """
+        Adds the job with the next index of the first job array whose jobs
+        have one of the given statuses to the queue. Arrays are deleted
+        once all of their indices are expanded.
+
+        :param statuses: the statuses, all if none are given
+        :return: dict of the added job or None
+        """
+        if not self.arrays:
+            return None
+        for key, record in self.arrays.items():
+            array = JobArray(**record)
+            if statuses and array.status not in statuses:
+                continue
+            job = array.pop()
+            if job is None:
+                continue
+            self.add(job)
+            if array.remaining == 0:
+                self.arrays.delete(key)
+            else:
+                self.arrays.set(key, array.to_dict())
+            return self.get(job.name)
+        return None
+
+    def upcoming(self, count: int, *statuses) -> list:
+        """
+        Returns the next count jobs with one of the statuses in the order in
+        which a scheduler starts them. Job arrays are expanded if there are
+        fewer such jobs.
+
+        :param count: the number of jobs
+        :param statuses: the statuses
+        :return: list of Job
+        """
+        names = self.index.firsts(count, *statuses)
+        while len(names) < count:
+            job = self.expand_array(*statuses)
+            if job is None:
+                break
+            names.append(job["name"])
+        return [Job.from_dict(self.get(name)) for name in names]
+
+    def stage(self, jobs: list):
+        """
+        Writes the scripts of the jobs, links their inputs and copies their
+        directories and the inputs the hosts lack with a single rsync per
+        host, see Host.stage(). The jobs of the queue are marked as staged,
+        so their directories are removed by a reset from any process.
+
+        :param jobs: the jobs
+        :return: None
+        """
+        hosts = {}
+        for job in jobs:
+            job.materialize()
+            blobs = job.link_inputs()
+            if is_local(job.host):
+                job.warn_if_job_dir_present()
+            else:
+                names, needed = hosts.setdefault(
+                    (job.user, job.host, job.experiment), ([], {}))
+                names.append(job.name)
+                needed.update(dict.fromkeys(blobs))
+        for (user, host, experiment), (names, needed) in hosts.items():
+            Host.stage(user, host, experiment, names, blobs=list(needed))
+        with self.batch():
+            for job in jobs:
+                job.staged = True
+                if job.name in self.index:
+                    self.set(job)
+
+    def save(self):
+        self.flush()
+        self.jobs.save(self.filename)
+
+    def remove(self):
+        """
+        Deletes the files of the queue including its job arrays and its
+        archive. The job directories are not removed.
+        """
+        self.jobs.remove()
+        if self.arrays is not None:
+            self.arrays.remove()
+        shutil.rmtree(self.archive_directory, ignore_errors=True)
+
+    @property
+    def dirty(self) -> list:
+        """
+        The names of the jobs whose changes are not yet persisted
+        """
+        return list(self.jobs.pending)
+
+    def flush(self):
+        """
+        Persists all pending changes of the queue. Without write_behind
+        all changes are persisted right away or at the end of a batch.
+        """
+        self.jobs.flush()
+
+    def flush_due(self):
+        """
+        Persists the pending changes if write_behind seconds have passed
+        since the last flush. The schedulers call it while they wait, so
+        changes are not held back until the next mutation.
+        """
+        if self.jobs.pending and self.jobs.due():
+            self.jobs.flush()
+
+    def compact(self):
+        """
+        Writes a snapshot of the queue and truncates the journal if the
+        queue uses the journal storage.
+        """
+        self.jobs.compact()
+
+    def batch(self):
+        """
+        Returns a context in which all changes to the queue are persisted
+        once at the end instead of on each call:
+
+            with queue.batch():
+                for job in jobs:
+                    queue.add(job)
+
+        :return: context manager
+        """
+        return self.jobs.batch()
+
+    @staticmethod
+    def poll(user: str, host: str, jobs: list, offsets: dict = None) -> dict:
+        """
+        Reads the last state and exit code of the jobs from their log files
+        with a single command on the host. Only the bytes appended to a log
+        since the offset up to which it was read before are read. Jobs
+        whose log file does not yet exist are not included in the result.
+
+        :param user: the user name
+        :param host: the host name
+        :param jobs: the jobs executed on the host
+        :param offsets: dict of job name and the pid of the job and the
+                        offset up to which its log was read
+        :return: dict of job name and dict with state, exit and offset
+        """
+        logs = Queue.logs(jobs)
+        r = ssh.pool.run(user, host, Queue.poll_command,
+                         input=Queue.poll_input(jobs, offsets))
+        return Queue.parse_states(logs, r.stdout)
+
+    @staticmethod
+    async def apoll(user: str, host: str, jobs: list,
+                    offsets: dict = None) -> dict:
+        """
+        Reads the last state and exit code of the jobs from their log files
+        with a single command on the host, see poll()
+
+        :param user: the user name
+        :param host: the host name
+        :param jobs: the jobs executed on the host
+        :param offsets: dict of job name and the pid of the job and the
+                        offset up to which its log was read
+        :return: dict of job name and dict with state, exit and offset
+        """
+        logs = Queue.logs(jobs)
+        r = await ssh.pool.arun(user, host, Queue.poll_command,
+                                input=Queue.poll_input(jobs, offsets))
+        return Queue.parse_states(logs, r.stdout)
+
+    # reads OFFSET LOG lines and prints the offset after the last complete
+    # line of each log followed by the states and exit codes appended after
+    # the offset. An incomplete last line is read again by the next poll.
+    # A log smaller than the offset was truncated and is read from the
+    # beginning.
+    poll_command = \
+        'chunk() { tail -c +$((offset + 1)) "$log" | ' \
+        'head -c $((size - offset)); }; ' \
+        'while read -r offset log; do ' \
+        '[ -f "$log" ] || continue; ' \
+        'size=$(($(wc -c < "$log"))); ' \
+        '[ "$size" -lt "$offset" ] && offset=0; ' \
+        'if [ -n "$(chunk | tail -c 1)" ]; then ' \
+        'size=$((size - $(chunk | tail -n 1 | wc -c))); fi; ' \
+        'echo "$log:# cloudmesh offset: $size"; ' \
+        'chunk | grep -E "cloudmesh (state|exit):" | ' \
+        'while IFS= read -r line; do echo "$log:$line"; done; ' \
+        'done'
+
+    @staticmethod
+    def poll_input(jobs: list, offsets: dict = None) -> str:
+        """
+        Returns the input of poll_command. The offset of a job that was
+        started again with another pid is 0.
+
+        :param jobs: the jobs
+        :param offsets: dict of job name and the pid of the job and the
+                        offset up to which its log was read
+        :return: str
+        """
+        lines = []
+        for job in jobs:
+            pid, offset = (offsets or {}).get(job.name, (None, 0))
+            if pid != job.pid:
+                offset = 0
+            lines.append(f"{offset} {job.directory}/{job.name}/{job.log}\n")
+        return "".join(lines)
+
+    @staticmethod
+    def logs(jobs: list) -> dict:
+        """
+        Returns the log files of the jobs
+
+        :param jobs: the jobs
+        :return: dict of log file and job name
+        """
+        return {f"{job.directory}/{job.name}/{job.log}": job.name
+                for job in jobs}
+
+    @staticmethod
+    def parse_states(logs: dict, output: str) -> dict:
+        """
+        Returns the offset and the last state and exit code of each log in
+        the output of poll_command
+
+        :param logs: dict of log file and job name, see logs()
+        :param output: the output of poll_command
+        :return: dict of job name and dict with state, exit and offset
+        """
+        states = {}
+        for line in output.splitlines():
+            log, _, text = line.partition(":")
+            if log not in logs:
+                continue
+            state = states.setdefault(logs[log], {})
+            value = text.split(":", 1)[-1].strip()
+            try:
+                if "cloudmesh state:" in text:
+                    state["state"] = value
+                elif "cloudmesh exit:" in text:
+                    state["exit"] = int(value)
+                elif "cloudmesh offset:" in text:
+                    state["offset"] = int(value)
+            except ValueError:
+                pass
+        return states
+
+    def watch(self, interval: float = 0.05, python: str = "python3"):
+        """
+        Receives the states of the jobs from agents instead of reading the
+        log files of the jobs. An agent is started over ssh on each host
+        and directory when the state of a job on it is needed the first
+        time. If an agent fails, the log files are read again.
+
+        :param interval: the seconds between two scans of the job
+                         directories by an agent
+        :param python: the python interpreter on the hosts
+        """
+        if self.agents is None:
+            self.agents = {}
+            self.events = queue.SimpleQueue()
+        self.agent_interval = interval
+        self.agent_python = python
+
+    def unwatch(self):
+        """
+        Stops the agents and reads the log files of the jobs again
+        """
+        for agent in (self.agents or {}).values():
+            agent.stop()
+        self.agents = None
+        self.events = None
+        self.received = {}
+
+    def agent(self, user: str, host: str, directory: str) -> Agent:
+        """
+        Returns the running agent for the directory on the host and starts
+        it if needed
+
+        :param user: the user name
+        :param host: the host name
+        :param directory: the experiment directory on the host
+        :return: Agent
+        """
+        key = (user, host, directory)
+        agent = self.agents.get(key)
+        if agent is None or not agent.alive:
+            agent = Agent(user, host, [directory], events=self.events,
+                          interval=self.agent_interval,
+                          python=self.agent_python)
+            agent.start()
+            agent.ready.wait(timeout=60)
+            self.agents[key] = agent
+        return agent
+
+    def watched(self, job: Job) -> bool:
+        """
+        Returns True if the state of the job is reported by a running agent
+
+        :param job: the job
+        :return: bool
+        """
+        if self.agents is None:
+            return False
+        agent = self.agents.get((job.user, job.host, job.directory))
+        return agent is not None and agent.alive
+
+    def receive(self, timeout: float = None) -> bool:
+        """
+        Collects the events of the agents. If timeout is given, it waits
+        up to timeout seconds for the first event.
+
+        :param timeout: the seconds to wait for an event
+        :return: True if an event was received
+        """
+        try:
+            event = self.events.get(timeout=timeout) \
+                if timeout else self.events.get_nowait()
+        except queue.Empty:
+            return False
+        while event is not None:
+            self.received[(event["user"], event["host"], event["name"])] = \
+                event
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                event = None
+        return True
+
+    def wait(self, timeout: float):
+        """
+        Waits until an agent reports a change or timeout seconds have
+        passed. Without agents it sleeps timeout seconds.
+
+        :param timeout: the seconds to wait
+        """
+        self.flush_due()
+        if self.agents:
+            self.receive(timeout=timeout)
+        else:
+            time.sleep(timeout)
+
+    def states(self, user: str, host: str, jobs: list) -> dict:
+        """
+        Returns the state and exit code of the jobs on a host as reported
+        by the agents or, without agents, as read from the log files
+
+        :param user: the user name
+        :param host: the host name
+        :param jobs: the jobs executed on the host
+        :return: dict of job name and dict with state and exit
+        """
+        if self.agents is not None:
+            agents = [self.agent(user, host, directory)
+                      for directory in {job.directory for job in jobs}]
+            if all(agent.alive for agent in agents):
+                self.receive()
+                return {job.name: self.received[(user, host, job.name)]
+                        for job in jobs
+                        if (user, host, job.name) in self.received}
+        return self.poll(user, host, jobs, self.offsets)
 
     def refresh(self, keys=None):
+        """
+        Updates the status of the jobs from the state in their log files.
+        Jobs in a terminal state are not read. Only the bytes appended to a
+        log since the last refresh are read. The states of all jobs on a
+        host are read with a single remote command or received from the
+        agent on the host, see watch(). The changed jobs are persisted
+        together.
+
+        :param keys: the names of the jobs, by default all jobs
+        :return: str describing the changes
+        """
+        hosts = self.group(keys)
+        states = {(user, host): self.states(user, host, jobs)
+                  for (user, host), jobs in hosts.items()}
+        return self.update(hosts, states)
+
+    async def arefresh(self, keys=None):
+        """
+        Updates the status of the jobs just as refresh() but reads the
+        states of all hosts concurrently with asyncio
+
+        :param keys: the names of the jobs, by default all jobs
+        :return: str describing the changes
+        """
+        hosts = self.group(keys)
+        if self.agents is not None:
+            return self.update(hosts, {(user, host): self.states(user, host, jobs)
+                                       for (user, host), jobs in hosts.items()})
+        polled = await asyncio.gather(*[self.apoll(user, host, jobs,
+                                                   self.offsets)
+                                        for (user, host), jobs in hosts.items()])
+        return self.update(hosts, dict(zip(hosts, polled)))
+
+    def due(self, keys: list) -> list:
+        """
+        Returns the jobs whose state is to be read now. A job is due
+        poll_interval seconds after it started or changed its state. Each
+        time its state did not change its interval is doubled up to
+        max_poll_interval seconds. With agents all jobs are due, as their
+        states are received and not read from the hosts.
+
+        :param keys: the names of the jobs
+        :return: list of names
+        """
+        if self.agents:
+            return list(keys)
+        now = time.monotonic()
+        return [key for key in keys if self.polls.get(key, (0, 0))[0] <= now]
+
+    def backoff(self, name: str, changed: bool = True):
+        """
+        Sets the time the state of the job is read next, see due()
+
+        :param name: the name of the job
+        :param changed: True if the state of the job changed
+        """
+        if changed or name not in self.polls:
+            interval = self.poll_interval
+        else:
+            interval = min(2 * self.polls[name][1], self.max_poll_interval)
+        self.polls[name] = (time.monotonic() + interval, interval)
+
+    def next_due(self, keys: list) -> float:
+        """
+        Returns the seconds until the first of the jobs is due
+
+        :param keys: the names of the jobs
+        :return: float
+        """
+        if self.agents:
+            return self.max_poll_interval
+        if not keys:
+            return 0
+        now = time.monotonic()
+        return max(min(self.polls.get(key, (0, 0))[0] for key in keys) - now,
+                   0)
+
+    def wait_on(self, keys: list):
+        """
+        Waits until one of the jobs is due or an agent reports a change
+
+        :param keys: the names of the jobs
+        """
+        timeout = self.next_due(keys)
+        if timeout > 0:
+            self.wait(timeout)
+
+    def refresh_due(self, keys: list) -> list:
+        """
+        Refreshes the jobs that are due and adapts the time they are read
+        next, see due()
+
+        :param keys: the names of the jobs
+        :return: list of the refreshed jobs whose state did not change
+        """
+        self.flush_due()
+        keys = [key for key in self.due(keys) if key in self.index]
+        if not keys:
+            return []
+        before = {key: self.get(key)['status'] for key in keys}
+        self.refresh(keys=keys)
+        unchanged = []
+        for key in keys:
+            changed = self.get(key)['status'] != before[key]
+            self.backoff(key, changed=changed)
+            if not changed:
+                unchanged.append(key)
+        return unchanged
+
+    def group(self, keys=None) -> dict:
+        """
+        Returns the jobs that are not in a terminal state grouped by the
+        user and host executing them
+
+        :param keys: the names of the jobs, by default all jobs
+        :return: dict of (user, host) and list of Job
+        """
         if keys is None:
             keys = self.keys()
         else:
-            for key in keys:
-                if key not in self.keys():
-                    keys.remove(key)
-        updates = False
-        result = ''
+            keys = [key for key in keys if key in self.index]
+        hosts = {}
         for key in keys:
-            job = Job(**self.get(key))
-            old_state = job.status
-            new_state = job.state
-            if old_state != new_state:
-                updates = True
-                self.set(job)
-                result += f'{job.name} \t old_status:{old_state} \t new_state:{new_state}\n'
+            job = Job.from_dict(self.get(key))
+            if job.host is None or job.status in StatusIndex.terminal:
+                continue
+            hosts.setdefault((job.user, job.host), []).append(job)
+        return hosts
+
+    def update(self, hosts: dict, states: dict):
+        """
+        Persists the states of the jobs together
+
+        :param hosts: the jobs grouped by user and host, see group()
+        :param states: dict of (user, host) and the result of states()
+        :return: str describing the changes
+        """
+        changed = []
+        result = ''
+        for key, jobs in hosts.items():
+            for job in jobs:
+                state = states[key].get(job.name, {})
+                if "offset" in state:
+                    self.offsets[job.name] = (job.pid, state["offset"])
+                old_state = job.status
+                new_state = state.get("state") or old_state
+                exit_code = state.get("exit", job.exit_code)
+                if old_state != new_state or exit_code != job.exit_code:
+                    job.status = new_state
+                    job.exit_code = exit_code
+                    changed.append(job)
+                    result += f'{job.name} \t old_status:{old_state} \t new_state:{new_state}\n'
+        with self.batch():
+            for job in changed:
+                record = job.to_dict()
+                self.jobs.set(job.name, record)
+                self.table.set(job.name, record)
+        if changed and self.write_behind is not None:
+            self.flush()
+        updates = len(changed) > 0
         if updates:
-            self.save()
             return result
         else:
             return 'No job status changes.'
 
+    def cleanup(self, jobs: list, remove: bool = True) -> str:
+        """
+        Kills the jobs that are running and removes the job directories.
+        The jobs on a host are cleaned up with a single command and all
+        hosts are cleaned up concurrently. Jobs that were never started are
+        only removed locally. Coroutines, e.g. async endpoints of the
+        service, should await acleanup() instead. If called from a running
+        event loop, the cleanup runs in a worker thread.
+
+        :param jobs: the jobs
+        :param remove: if False the running jobs are only killed
+        :return: str describing the failures
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.acleanup(jobs, remove=remove))
+        # asyncio.run can not be nested in the running loop
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run,
+                                   self.acleanup(jobs, remove=remove)).result()
+
+    async def acleanup(self, jobs: list, remove: bool = True) -> str:
+        """
+        Kills the jobs that are running and removes the job directories
+        using asyncio, see cleanup()
+
+        :param jobs: the jobs
+        :param remove: if False the running jobs are only killed
+        :return: str describing the failures
+        """
+        hosts = {}
+        for job in jobs:
+            launched = job.status not in ['undefined', 'ready'] or job.staged
+            if job.host is None or not launched:
+                continue
+            running = job.status in ['start', 'run'] and job.pid is not None
+            if running or (remove and not is_local(job.host)):
+                hosts.setdefault((job.user, job.host), []).append(job)
+        results = await asyncio.gather(
+            *[self.aclean(user, host, host_jobs, remove)
+              for (user, host), host_jobs in hosts.items()])
+        if remove:
+            for job in jobs:
+                shutil.rmtree(f"{job.directory}/{job.name}",
+                              ignore_errors=True)
+        return "".join(results)
+
+    @staticmethod
+    async def aclean(user: str, host: str, jobs: list,
+                     remove: bool = True) -> str:
+        """
+        Kills the running jobs on the host and removes their directories
+        with a single command. The status of the killed jobs is set to
+        kill.
+
+        :param user: the user name
+        :param host: the host name
+        :param jobs: the jobs on the host
+        :param remove: if False the running jobs are only killed
+        :return: str describing the failures
+        """
+        r = await ssh.pool.arun(user, host, "sh",
+                                input=Queue.clean_command(jobs, remove))
+        lines = r.stdout.splitlines()
+        result = ''
+        for job in jobs:
+            if f"# cloudmesh kill: {job.name}" in lines:
+                job.status = "kill"
+            if f"# cloudmesh failed: {job.name}" in lines:
+                result += f'Could not delete {job.name} dir on {user}@{host}\n'
+        if r.returncode == 255:
+            result += f'Could not clean up jobs on {user}@{host}: {r.stdout}\n'
+        return result
+
+    @staticmethod
+    def clean_command(jobs: list, remove: bool = True) -> str:
+        """
+        Returns the script killing the running jobs and removing their
+        directories on a host. A job is only killed if its process exists.
+
+        :param jobs: the jobs on the host
+        :param remove: if False the running jobs are only killed
+        :return: str
+        """
+        lines = []
+        for job in jobs:
+            if job.status in ['start', 'run'] and job.pid is not None:
+                lines.append(f"if kill -0 {job.pid} 2>/dev/null; then "
+                             f"({job.kill_command()}) && "
+                             f"echo '# cloudmesh kill: {job.name}'; fi")
+            if remove and not is_local(job.host):
+                lines.append(f"rm -rf {job.directory}/{job.name} || "
+                             f"echo '# cloudmesh failed: {job.name}'")
+        return "\n".join(lines) + "\n"
+
     def reset(self, keys=None, status=None):
         if keys is None:
             keys = self.keys()
         else:
-            for key in keys:
-                if key not in self.keys():
-                    keys.remove(key)
+            keys = [key for key in keys if key in self.index]
         updates = False
         result = ''
-        for key in keys:
-            job = Job(**self.get(key))
-            old_state = job.status
-            if (status is None and job.status != 'end') or job.status == status:
-                if job.status == 'start' or job.status == 'run':
-                    job.kill()
-                job.remove_dir()
+        jobs = [Job.from_dict(self.get(key)) for key in keys]
+        jobs = [job for job in jobs
+                if (status is None and job.status != 'end') or job.status == status]
+        # kills the running jobs and removes the directories of all jobs
+        # with one command per host
+        old_states = {job.name: job.status for job in jobs}
+        failures = self.cleanup(jobs)
+        if failures:
+            Console.warning(failures)
+        with self.batch():
+            for job in jobs:
+                old_state = old_states[job.name]
                 if job.user and job.host:
                     new_state = 'ready'
                 else:
                     new_state = 'undefined'
                 job.status = new_state
                 job.pid=None
+                staged = job.staged
+                job.staged = False
                 if old_state != new_state:
                     updates = True
                     self.set(job)
                     result += f'{job.name} \t old_status:{old_state} \t new_state:{new_state}\n'
+                elif staged:
+                    # the directory on the host was removed
+                    self.set(job)
         if updates:
-            self.save()
             return result
         else:
             return 'No job status changes.'
 
     def get_hosts(self):
         hosts = []
-        for key in self.keys():
-            job = Job(**self.get(key))
-            user = job.user
-            host = job.host
-            if user is not None and host is not None and (user,host) not in hosts:
+        for user, host in self.table.distinct('user', 'host'):
+            if user is not None and host is not None:
                 hosts.append((user,host))
         result = []
         for user,host in hosts:
@@ -779,14 +2518,21 @@ class Queue:
         else:
             result = ""
 
-        data = self.to_dict()
         if job is None:
             if order is None and kind in ["jobs"]:
                 order = ["name", "status", "command","host","user", "gpu", "output", "log", "experiment"]
+                data = self.to_dict(fields=order)
+                for key, record in (self.arrays or {}).items():
+                    array = JobArray(**record)
+                    row = dict(array.template, name=array.key,
+                               status=array.status,
+                               experiment=array.template.get("experiment"))
+                    data[kind][key] = {field: row.get(field) for field in order}
                 result = result + str(Printer.write(data[kind], order=order, output=output))
             elif order is None and kind in ["queue", "config"]:
                 order = ["name", "experiment", "filename"]
                 kind = "config"
+                data = self.to_dict(fields=[])
                 data = {
                     data[kind]["name"]: data[kind]
                 }
@@ -796,7 +2542,16 @@ class Queue:
             result = result + str(Printer.attribute(job, output=output))
         return result
 
-    def to_dict(self):
+    def to_dict(self, fields: list = None):
+        """
+        Returns the queue as dict
+
+        :param fields: if given, only these fields of the jobs are included.
+                       The fields of the job table are read from it and
+                       only the others from the stored records, see
+                       JobTable.fields
+        :return: dict
+        """
         result = {
             "config": {
                 "name": self.name,
@@ -805,8 +2560,15 @@ class Queue:
             },
             "jobs": {}
         }
-        for job in self.jobs:
-            result["jobs"][job] = self.jobs[job]
+        if fields is None:
+            for name, job in self.jobs.items():
+                result["jobs"][name] = job
+        elif fields:
+            result["jobs"] = {
+                name: dict(zip(fields, values))
+                for name, values in self.table.rows(fields, records=self.jobs)}
+        if self.arrays:
+            result["arrays"] = dict(self.arrays.items())
         return result
 
     def to_json(self, indent=2):
@@ -828,81 +2590,112 @@ class SchedulerFIFO(Queue):
                  filename: str = None,
                  jobs: List = None,
                  max_parallel: int = 1,
-                 timeout_min: int = 10):
+                 timeout_min: int = 10,
+                 write_behind: float = 10,
+                 agent: bool = False,
+                 launch: bool = False,
+                 poll_interval: float = 0.1,
+                 max_poll_interval: float = 5.0):
         Queue.__init__(self,
                        name=name,
                        experiment=experiment,
                        filename=filename,
-                       jobs=jobs)
+                       jobs=jobs,
+                       write_behind=write_behind)
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
         self.running = 0
-        self.scheduler_N = len(self.jobs.data)
-        self.scheduler_current_job = 0
+        self.scheduler_N = len(self.jobs)
         self.max_parallel = max_parallel
         self.running_jobs = []
         self.completed_jobs = []
         self.ran_jobs = []
         self.timeout_min = timeout_min
+        self.launch = launch
+        if agent:
+            self.watch()
 
     def __next__(self):
-        found_job = False
-        self.refresh(keys=self.running_jobs)
-        while (not found_job) and (self.scheduler_current_job < len(self.jobs.data)):
-            key = list(self.jobs.keys())[self.scheduler_current_job]
-            result = self.jobs.data[key]
-            if result['status'] == 'ready':
-                found_job = True
-            self.scheduler_current_job += 1
-            #all jobs must be defined prior to calling
-        if not found_job:
-            return None
-        else:
-            return result
+        self.reload()
+        # all jobs must be defined prior to calling
+        name = self.index.first('ready')
+        if name is None:
+            return self.expand_array('ready')
+        return self.get(name)
 
     def check_if_jobs_finished(self):
-        self.refresh()
-        for job in self.running_jobs:
+        # the states are read by wait_for_change
+        finished = False
+        for job in list(self.running_jobs):
             try:
                 if self.get(job)['status'] == 'end':
                     self.running_jobs.remove(job)
                     self.completed_jobs.append(job)
                     self.running -= 1
-                    return True
+                    finished = True
             except:
                 # job deleted or renamed in queue
                 self.running_jobs.remove(job)
                 self.running -= 1
-                return True
-        return False
-
-    def check_for_crashes(self):
-        for job in self.running_jobs:
-            job = Job(**self.get(job))
-            crashed = job.check_crashed(timeout_min=self.timeout_min)
-            self.set(job)
-            if crashed:
-                Console.warning(f'Job {job.name} status:CRASH')
-                job.status = 'crash'
+                finished = True
+        return finished
+
+    def check_for_crashes(self, keys=None):
+        with self.batch():
+            for job in list(keys or self.running_jobs):
+                job = Job.from_dict(self.get(job))
+                if self.watched(job):
+                    # the agent reports crashed jobs to refresh
+                    crashed = job.status == 'crash'
+                else:
+                    crashed = job.check_crashed(timeout_min=self.timeout_min)
                 self.set(job)
-                self.running_jobs.remove(job.name)
-                self.running -= 1
+                if crashed:
+                    Console.warning(f'Job {job.name} status:CRASH')
+                    job.status = 'crash'
+                    self.set(job)
+                    self.running_jobs.remove(job.name)
+                    self.running -= 1
+
+    def wait_for_change(self):
+        """
+        Waits until a running job is due to be read or an agent reports
+        a change, see Queue.due(), and reads the states of the due jobs.
+        The due jobs whose state did not change are checked for crashes.
+
+        :return: True if a running job finished or crashed
+        """
+        self.wait_on(self.running_jobs)
+        running = len(self.running_jobs)
+        unchanged = self.refresh_due(self.running_jobs)
+        self.check_if_jobs_finished()
+        unchanged = [job for job in unchanged if job in self.running_jobs]
+        if unchanged:
+            self.check_for_crashes(unchanged)
+        return len(self.running_jobs) < running
 
     def run(self):
         next_job = self.__next__()
         while next_job is not None:
-            job = Job(**next_job)
-            while self.running == self.max_parallel:
+            job = Job.from_dict(next_job)
+            if self.running == self.max_parallel:
                 Console.info(f"Waiting. At max_parallel jobs={self.max_parallel}.")
-                time.sleep(1)
-                finished = self.check_if_jobs_finished()
-                if not finished:
-                    self.check_for_crashes()
+            while self.running == self.max_parallel:
+                self.wait_for_change()
             Console.info(f'Running job: {job.name} on {job.user}@{job.host}')
-            host = Host(name=job.host, user=job.user)
-            probe_status, probe_time = host.probe()
-            job.last_probe_check = probe_time
-            #host.sync(user=host.user,host=host.name,experiment=job.experiment)
-            job.sync(user=job.user,host=job.host,job_name=job.name)
-            pid = job.run()
+            if self.launch and not job.inputs:
+                # probes the host and starts the job with one command
+                pid = job.launch()
+            else:
+                host = Host(name=job.host, user=job.user)
+                probe_status, probe_time = host.probe()
+                job.last_probe_check = probe_time
+                if not job.staged:
+                    # copies the jobs that can be started now with one rsync
+                    self.stage(self.upcoming(self.max_parallel - self.running,
+                                             'ready'))
+                    job.staged = True
+                pid = job.run()
             if pid is None:
                 # pid was a shell error or none
                 Console.warning(f'Job {job.name} failed to start.')
@@ -913,20 +2706,157 @@ class SchedulerFIFO(Queue):
             self.running += 1
             self.running_jobs.append(job.name)
             self.ran_jobs.append(job.name)
+            self.backoff(job.name)
             Console.info(f"Running Jobs: {self.running_jobs}")
             self.set(job)
             next_job = self.__next__()
+        self.flush()
         return self.ran_jobs
 
     def wait_on_running(self):
-        time.sleep(1)
         while len(self.running_jobs) > 0:
-            finished = self.check_if_jobs_finished()
-            if not finished:
-                self.check_for_crashes()
+            self.wait_for_change()
+        self.flush()
+        self.unwatch()
         return self.completed_jobs
 
 
+class SchedulerPriority(SchedulerFIFO):
+    """
+    Runs the jobs of a queue like SchedulerFIFO, but the ready job with the
+    highest priority is started first. Jobs with the same priority are
+    started in the order in which they became ready. The ready jobs are
+    kept in a heap of (-priority, sequence, name), so adding a job and
+    taking the next one is O(log n) also for a large backlog:
+
+        scheduler = SchedulerPriority(name="a", max_parallel=4)
+        scheduler.add(Job(name="urgent", command="uname", priority=10,
+                          user="user", host="host"))
+        scheduler.run()
+
+    Jobs that stop being ready, e.g. because they were started or deleted,
+    or whose priority changed, are left in the heap and skipped once they
+    reach its top. Job arrays are expanded when no other job is ready.
+    """
+
+    def __init__(self,
+                 name: str = "TBD",
+                 experiment: str = None,
+                 filename: str = None,
+                 jobs: List = None,
+                 max_parallel: int = 1,
+                 timeout_min: int = 10,
+                 write_behind: float = 10,
+                 agent: bool = False,
+                 launch: bool = False,
+                 poll_interval: float = 0.1,
+                 max_poll_interval: float = 5.0):
+        self.heap = []
+        self.heaped = {}
+        self.sequence = count()
+        SchedulerFIFO.__init__(self,
+                               name=name,
+                               experiment=experiment,
+                               filename=filename,
+                               jobs=jobs,
+                               max_parallel=max_parallel,
+                               timeout_min=timeout_min,
+                               write_behind=write_behind,
+                               agent=agent,
+                               launch=launch,
+                               poll_interval=poll_interval,
+                               max_poll_interval=max_poll_interval)
+        for name in self.index.names('ready'):
+            self.push(name)
+
+    def push(self, name: str, priority: int = None):
+        """
+        Adds the job to the heap of ready jobs
+
+        :param name: the name of the job
+        :param priority: the priority of the job, read from the queue if
+                         not given
+        """
+        if priority is None:
+            priority = self.get(name).get('priority')
+        priority = int(priority or 0)
+        if self.heaped.get(name) == priority:
+            return
+        self.heaped[name] = priority
+        heapq.heappush(self.heap, (-priority, next(self.sequence), name))
+
+    def first(self):
+        """
+        Returns the name of the ready job with the highest priority and
+        drops the outdated entries from the top of the heap
+
+        :return: name of the job or None
+        """
+        while self.heap:
+            priority, sequence, name = self.heap[0]
+            current = self.heaped.get(name) == -priority
+            if current and self.index.status.get(name) == 'ready':
+                return name
+            heapq.heappop(self.heap)
+            if current:
+                del self.heaped[name]
+        return None
+
+    def add(self, job: Job):
+        SchedulerFIFO.add(self, job)
+        if job.status == 'ready':
+            self.push(job.name, job.priority)
+
+    def add_jobs(self, jobs):
+        SchedulerFIFO.add_jobs(self, jobs)
+        for job in jobs:
+            if job.status == 'ready':
+                self.push(job.name, job.priority)
+
+    def set(self, job: Job):
+        SchedulerFIFO.set(self, job)
+        if job.status == 'ready':
+            self.push(job.name, job.priority)
+
+    def reload(self) -> list:
+        changes = SchedulerFIFO.reload(self)
+        for name in changes:
+            if self.index.status.get(name) == 'ready':
+                self.push(name)
+        return changes
+
+    def __next__(self):
+        self.reload()
+        name = self.first()
+        if name is None:
+            return self.expand_array('ready')
+        return self.get(name)
+
+    def upcoming(self, count: int, *statuses) -> list:
+        """
+        Returns the next count ready jobs in the order of their priority,
+        see Queue.upcoming()
+
+        :param count: the number of jobs
+        :param statuses: the statuses, only ready jobs are in the heap
+        :return: list of Job
+        """
+        if statuses != ('ready',):
+            return SchedulerFIFO.upcoming(self, count, *statuses)
+        taken = []
+        while len(taken) < count and self.first() is not None:
+            taken.append(heapq.heappop(self.heap))
+        for entry in taken:
+            heapq.heappush(self.heap, entry)
+        names = [name for priority, sequence, name in taken]
+        while len(names) < count:
+            job = self.expand_array(*statuses)
+            if job is None:
+                break
+            names.append(job["name"])
+        return [Job.from_dict(self.get(name)) for name in names]
+
+
 class SchedulerTestFIFO(Queue):
 
     def __init__(self,
@@ -942,21 +2872,21 @@ class SchedulerTestFIFO(Queue):
                        jobs=jobs)
         self.running = 0
         # when a job starts we need to increment running only if running <= max_parallel
-        self.scheduler_N = len(self.jobs.data)
+        self.scheduler_N = len(self.jobs)
         self.scheduler_current_job = 0
 
     def __iter__(self):
         # get an update from all hosts in the queue
         # get from all host the current status (a function to be added to queue)
         # def refresh: called _
-        return self.jobs.__dict__["data"].items()
+        return self.jobs.items()
 
     def __next__(self):
         # def refresh: called
         # needs to filter out unqualified jobs, jobs such as inative host, finished job, killed job,
         # status: undefined(no host assigned to job), defined (with host associated), running, killed, end
         key = self.jobs.keys()[self.scheduler_current_job]
-        result = self.jobs.data[key]
+        result = self.jobs[key]
         self.scheduler_current_job += 1
         return result
 
@@ -969,141 +2899,463 @@ class SchedulerFIFOMultiHost(Queue):
                  filename: str = None,
                  jobs: List = None,
                  hosts: list = [],
-                 timeout_min: int = 10):
+                 timeout_min: int = 10,
+                 write_behind: float = 10,
+                 agent: bool = False,
+                 launch: bool = False,
+                 poll_interval: float = 0.1,
+                 max_poll_interval: float = 5.0,
+                 policy: str = "first_fit"):
         Queue.__init__(self,
                        name=name,
                        experiment=experiment,
                        filename=filename,
-                       jobs=jobs)
-        self.scheduler_N = len(self.jobs.data)
-        self.scheduler_current_job = 0
+                       jobs=jobs,
+                       write_behind=write_behind)
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.scheduler_N = len(self.jobs)
         self.hosts = hosts
         self.running_jobs = []
         self.job_hosts = {}
         self.completed_jobs = []
         self.ran_jobs = []
+        self.launch = launch
         if self.hosts == [] or self.hosts is None:
             raise ValueError('No hosts provided to scheduler.')
+        # the free cpus, memory and gpus of the hosts, see placement.py
+        self.placement = Placement(self.hosts, policy=policy)
+        if agent:
+            self.watch()
 
     def __next__(self):
-        found_job = False
-        self.refresh(keys=self.running_jobs)
-        while (not found_job) and (self.scheduler_current_job < len(self.jobs.data)):
-            key = list(self.jobs.keys())[self.scheduler_current_job]
-            result = self.jobs.data[key]
-            if result['status'] == 'undefined' or result['status'] == 'ready':
-                found_job = True
-            self.scheduler_current_job += 1
-        if not found_job:
-            return None
-        else:
-            return result
+        self.reload()
+        name = self.index.first('undefined', 'ready')
+        if name is None:
+            return self.expand_array('undefined', 'ready')
+        return self.get(name)
 
     def get_host(self, name):
         for host in self.hosts:
             if host.name == name:
                 return host
 
-    def check_for_crashes(self):
-        for job in self.running_jobs:
-            job = Job(**self.get(job))
-            crashed = job.check_crashed()
-            self.set(job)
-            if crashed:
-                Console.warning(f'Job {job.name} status:CRASH')
-                job.status = 'crash'
+    def check_for_crashes(self, keys=None):
+        with self.batch():
+            for job in list(keys or self.running_jobs):
+                job = Job.from_dict(self.get(job))
+                if self.watched(job):
+                    # the agent reports crashed jobs to refresh
+                    crashed = job.status == 'crash'
+                else:
+                    crashed = job.check_crashed()
                 self.set(job)
-                self.running_jobs.remove(job.name)
-                host = self.get_host(self.get(job.name)['host'])
-                host.job_counter -= 1
+                if crashed:
+                    Console.warning(f'Job {job.name} status:CRASH')
+                    job.status = 'crash'
+                    self.set(job)
+                    self.running_jobs.remove(job.name)
+                    self.placement.release(job.name)
 
     def check_if_jobs_finished(self):
-        self.refresh(self.running_jobs)
+        # the states are read by wait_for_change
         some_finished = False
-        for job in self.running_jobs:
+        for job in list(self.running_jobs):
             try:
                 if self.get(job)['status'] == 'end' or \
                 self.get(job)['status'] == 'kill':
                     self.running_jobs.remove(job)
                     self.completed_jobs.append(job)
-                    host = self.get_host(self.get(job)['host'])
-                    host.job_counter -= 1
+                    self.placement.release(job)
                     some_finished = True
-                    return some_finished
             except:
                 # job deleted or renamed in queue
                 self.running_jobs.remove(job)
-                host = self.job_hosts[job]
-                host.job_counter -= 1
+                self.placement.release(job)
                 some_finished = True
-                return some_finished
         return some_finished
 
-    def assign_host(self, job):
-        # finds next available host for job
+    def wait_for_change(self):
+        """
+        Waits until a running job is due to be read or an agent reports
+        a change, see Queue.due(), and reads the states of the due jobs.
+        The due jobs whose state did not change are checked for crashes.
+
+        :return: True if a running job finished or crashed
+        """
+        self.wait_on(self.running_jobs)
+        running = len(self.running_jobs)
+        with self.batch():
+            unchanged = self.refresh_due(self.running_jobs)
+            self.check_if_jobs_finished()
+        unchanged = [job for job in unchanged if job in self.running_jobs]
+        if unchanged:
+            self.check_for_crashes(unchanged)
+        return len(self.running_jobs) < running
+
+    def assign_host(self, job, probe=True):
+        # finds next host with the free resources for the job, see Placement
+        # without probe the host is probed when the job is launched
+        if not self.placement.possible(job):
+            Console.warning(f'Job {job.name} needs more cpus, memory or gpus'
+                            f' than any host has.')
+            return None
         found_host = False
         assigned_host = None
         while not found_host:
-            for host in self.hosts:
-                if host.job_counter < host.max_jobs_allowed:
+            for host in self.placement.candidates(job):
+                if probe:
                     probe_status, probe_time = host.probe()
-                    if probe_status:
-                        job.host = host.name
-                        job.user = host.user
-                        job.gpu = host.gpu
-                        if job.pyenv is None or job.pyenv == '':
-                            job.pyenv=host.pyenv
-                        job.status = 'ready'
-                        job.last_probe_check = probe_time
-                        job.generate_script()
-                        job.generate_command()
-                        #Host.sync(user=job.user,host=job.host,experiment=job.experiment)
-                        job.sync(user=job.user, host=job.host, job_name=job.name)
-                        self.set(job)
-                        assigned_host = host
-                        return assigned_host
+                else:
+                    probe_status, probe_time = True, host.probe_time
+                if probe_status:
+                    gpus = self.placement.allocate(job, host)
+                    job.host = host.name
+                    job.user = host.user
+                    held = self.placement.held(host)
+                    if job.gpus:
+                        # the devices no other job of the host holds
+                        job.gpu = ",".join(gpus)
+                    elif held:
+                        # hides the devices the other jobs of the host hold
+                        Console.warning(f'Job {job.name} declares no gpus and'
+                                        f' GPUs {",".join(held)} of {host.name}'
+                                        f' are held by other jobs. The job'
+                                        f' sees no GPU.')
+                        job.gpu = ""
                     else:
-                        Console.warning(f'Host {host.name} not responding to probe check.'
-                                        f' Not assigning jobs to {host.name}')
-            Console.info(f"Waiting. All hosts running max jobs.")
-            time.sleep(1)
-            some_finished = self.check_if_jobs_finished()
-            if not some_finished:
-                # only check for crashes if queue still full to reduce wait times
-                self.check_for_crashes()
+                        job.gpu = host.gpu
+                    if job.pyenv is None or job.pyenv == '':
+                        job.pyenv=host.pyenv
+                    job.status = 'ready'
+                    job.last_probe_check = probe_time
+                    job.generate_script()
+                    job.generate_command()
+                    self.set(job)
+                    assigned_host = host
+                    return assigned_host
+                else:
+                    Console.warning(f'Host {host.name} not responding to probe check.'
+                                    f' Not assigning jobs to {host.name}')
+            Console.info(f"Waiting. No host has the free resources for {job.name}.")
+            if self.running_jobs:
+                # wakes up only when a slot may have been freed
+                while not self.wait_for_change():
+                    pass
+            else:
+                # no host responded to the probe
+                self.wait(self.max_poll_interval)
         return assigned_host
 
+    def free_slots(self) -> int:
+        """
+        Returns the number of jobs the hosts can start
+        """
+        return sum(max(host.max_jobs_allowed - host.job_counter, 0)
+                   for host in self.hosts)
+
     def run(self):
         next_job = self.__next__()
         while next_job is not None:
-            job = Job(**next_job)
-            host = self.assign_host(job)
-            host.job_counter += 1
-            Console.info(f'Starting job: {job.name} on host:{job.user}@{job.host}')
-            pid = job.run()
-            if pid is None:
-                # pid was a shell error or None
-                Console.warning(f'Job {job.name} failed to start.')
-                job.status='fail_start'
+            # assigns all jobs that can be started now and copies them
+            # with one rsync per host
+            # the largest jobs are placed first
+            assigned = []
+            for job in self.placement.order(
+                    self.upcoming(max(self.free_slots(), 1),
+                                  'undefined', 'ready')):
+                if assigned and self.placement.possible(job) and \
+                        not self.placement.candidates(job):
+                    # waits for resources once the placed jobs are started
+                    continue
+                host = self.assign_host(job, probe=not self.launch)
+                if host is None:
+                    job.status = 'fail_start'
+                    self.set(job)
+                    continue
+                assigned.append((job, host))
+            self.stage([job for job, host in assigned
+                        if not self.launch or job.inputs])
+            for job, host in assigned:
+                Console.info(f'Starting job: {job.name} on host:{job.user}@{job.host}')
+                if self.launch and not job.inputs:
+                    # probes the host and starts the job with one command
+                    pid = job.launch()
+                else:
+                    pid = job.run()
+                if pid is None:
+                    # pid was a shell error or None
+                    Console.warning(f'Job {job.name} failed to start.')
+                    job.status='fail_start'
+                    self.set(job)
+                    self.placement.release(job.name)
+                    continue
                 self.set(job)
-                next_job = self.__next__()
-                continue
-            self.set(job)
-            self.running_jobs.append(job.name)
-            self.job_hosts[job.name] = host
-            self.ran_jobs.append(job.name)
-            Console.info(f"Running Jobs: {self.running_jobs}")
+                self.running_jobs.append(job.name)
+                self.job_hosts[job.name] = host
+                self.ran_jobs.append(job.name)
+                self.backoff(job.name)
+                Console.info(f"Running Jobs: {self.running_jobs}")
             next_job = self.__next__()
+        self.flush()
         return self.ran_jobs
 
     def wait_on_running(self):
-        time.sleep(1)
         while len(self.running_jobs) > 0:
-            finished = self.check_if_jobs_finished()
-            if not finished:
-                self.check_for_crashes()
+            self.wait_for_change()
+        self.flush()
+        self.unwatch()
         return self.completed_jobs
 
+class SchedulerDAG(SchedulerFIFOMultiHost):
+    """
+    Runs the jobs of a queue on the hosts like SchedulerFIFOMultiHost, but a
+    job that depends on other jobs is only started once all of them reached
+    the state end. Jobs whose parents ended are started in the order in
+    which they became ready, so independent branches run in parallel:
+
+        prepare = Job(name="prepare", command="python prepare.py")
+        train = Job(name="train", command="python train.py",
+                    depends_on=["prepare"])
+        evaluate = Job(name="evaluate", command="python evaluate.py",
+                       depends_on=["train"])
+
+    For every job the scheduler counts the parents that did not yet end and
+    keeps the children of each parent, so a job that ends only updates the
+    counters of its own children. If a parent crashes, is killed, fails to
+    start, is marked fail_parent itself or ends with an exit code other than
+    0, all jobs depending on it are marked fail_parent.
+    Jobs whose parents never run, e.g. because they depend on each other or
+    on a job that is not in the queue, are marked fail_parent once no job
+    is running anymore.
+    """
+
+    def __init__(self,
+                 name: str = "TBD",
+                 experiment: str = None,
+                 filename: str = None,
+                 jobs: List = None,
+                 hosts: list = [],
+                 timeout_min: int = 10,
+                 write_behind: float = 10,
+                 agent: bool = False,
+                 launch: bool = False,
+                 poll_interval: float = 0.1,
+                 max_poll_interval: float = 5.0,
+                 policy: str = "first_fit"):
+        # the children of each parent and the number of parents of each
+        # job that did not yet end
+        self.children = {}
+        self.waiting = {}
+        # the jobs whose parents ended, in the order they became ready
+        self.released = {}
+        SchedulerFIFOMultiHost.__init__(self,
+                                        name=name,
+                                        experiment=experiment,
+                                        filename=filename,
+                                        jobs=jobs,
+                                        hosts=hosts,
+                                        timeout_min=timeout_min,
+                                        write_behind=write_behind,
+                                        agent=agent,
+                                        launch=launch,
+                                        poll_interval=poll_interval,
+                                        max_poll_interval=max_poll_interval,
+                                        policy=policy)
+        with self.batch():
+            for name in self.index.names('undefined', 'ready'):
+                self.register(name, self.get(name).get('depends_on'))
+        # parents still running from an earlier run are refreshed with the
+        # jobs started by this scheduler
+        for parent in self.children:
+            if self.index.status.get(parent) in StatusIndex.running and \
+                    parent not in self.running_jobs:
+                self.running_jobs.append(parent)
+
+    def register(self, name: str, depends_on: list = None):
+        """
+        Adds the job to the graph. It is released if all its parents ended.
+
+        :param name: the name of the job
+        :param depends_on: the names of the parents of the job
+        """
+        if name in self.waiting or name in self.released:
+            return
+        waiting = 0
+        for parent in depends_on or []:
+            status = self.index.status.get(parent)
+            if status in StatusIndex.terminal:
+                reason = self.failure(parent, status)
+                if reason is None:
+                    continue
+                self.fail(name, reason)
+                return
+            self.children.setdefault(parent, []).append(name)
+            waiting += 1
+        if waiting:
+            self.waiting[name] = waiting
+        else:
+            self.released[name] = None
+
+    def failure(self, name: str, status: str):
+        """
+        Returns why the children of a finished job can not run or None if
+        the job ended and its command exited with 0
+
+        :param name: the name of the job
+        :param status: the terminal status of the job
+        :return: str or None
+        """
+        if status != 'end':
+            return f'job {name} did not end'
+        exit_code = (self.get(name) or {}).get('exit_code')
+        if exit_code not in [None, 0]:
+            return f'job {name} exited with {exit_code}'
+        return None
+
+    def finished(self, name: str, status: str):
+        """
+        Releases the children of a job that ended or fails them if the job
+        did not end or its command failed
+
+        :param name: the name of the job
+        :param status: the terminal status of the job
+        """
+        children = self.children.pop(name, [])
+        reason = self.failure(name, status)
+        if reason is not None:
+            for child in children:
+                self.fail(child, reason)
+            return
+        for child in children:
+            if child in self.waiting:
+                self.waiting[child] -= 1
+                if self.waiting[child] == 0:
+                    del self.waiting[child]
+                    self.released[child] = None
+
+    def fail(self, name: str, reason: str):
+        """
+        Marks the job and all jobs depending on it fail_parent
+
+        :param name: the name of the job
+        :param reason: why the job can not run
+        """
+        failed = [(name, reason)]
+        while failed:
+            name, reason = failed.pop()
+            if name not in self.index or \
+                    self.index.status.get(name) in StatusIndex.terminal:
+                continue
+            Console.warning(f'Job {name} status:FAIL_PARENT, {reason}')
+            self.waiting.pop(name, None)
+            self.released.pop(name, None)
+            job = Job.from_dict(self.get(name))
+            job.status = 'fail_parent'
+            SchedulerFIFOMultiHost.set(self, job)
+            failed.extend((child, f'job {name} did not end')
+                          for child in self.children.pop(name, []))
+
+    def add(self, job: Job):
+        SchedulerFIFOMultiHost.add(self, job)
+        if job.status in ['undefined', 'ready']:
+            self.register(job.name, job.depends_on)
+
+    def add_jobs(self, jobs):
+        SchedulerFIFOMultiHost.add_jobs(self, jobs)
+        for job in jobs:
+            if job.status in ['undefined', 'ready']:
+                self.register(job.name, job.depends_on)
+
+    def set(self, job: Job):
+        SchedulerFIFOMultiHost.set(self, job)
+        if job.status not in ['undefined', 'ready']:
+            # started or failed
+            self.released.pop(job.name, None)
+        if job.status in StatusIndex.terminal:
+            self.finished(job.name, job.status)
+
+    def reload(self) -> list:
+        changes = SchedulerFIFOMultiHost.reload(self)
+        for name in changes:
+            status = self.index.status.get(name)
+            if status in StatusIndex.terminal:
+                self.finished(name, status)
+            elif status in ['undefined', 'ready']:
+                self.register(name, self.get(name).get('depends_on'))
+        return changes
+
+    def check_if_jobs_finished(self):
+        running = list(self.running_jobs)
+        some_finished = SchedulerFIFOMultiHost.check_if_jobs_finished(self)
+        for name in running:
+            if name not in self.running_jobs:
+                self.finished(name, self.index.status.get(name))
+        return some_finished
+
+    def releases(self, count: int) -> list:
+        """
+        Returns the next count released jobs that are not yet started
+
+        :param count: the number of jobs
+        :return: list of names
+        """
+        # drops the jobs at the head that were started or deleted
+        while self.released:
+            name = next(iter(self.released))
+            if self.index.status.get(name) in ['undefined', 'ready']:
+                break
+            del self.released[name]
+        names = []
+        for name in self.released:
+            if len(names) == count:
+                break
+            if self.index.status.get(name) in ['undefined', 'ready']:
+                names.append(name)
+        return names
+
+    def __next__(self):
+        self.reload()
+        names = self.releases(1)
+        while not names:
+            # jobs of arrays are released when they are added
+            if self.expand_array('undefined', 'ready') is None:
+                return None
+            names = self.releases(1)
+        return self.get(names[0])
+
+    def upcoming(self, count: int, *statuses) -> list:
+        """
+        Returns the next count released jobs, see Queue.upcoming()
+
+        :param count: the number of jobs
+        :param statuses: the statuses, only jobs that are not yet started
+                         are released
+        :return: list of Job
+        """
+        names = self.releases(count)
+        while len(names) < count:
+            if self.expand_array(*statuses) is None:
+                break
+            names = self.releases(count)
+        return [Job.from_dict(self.get(name)) for name in names]
+
+    def run(self):
+        SchedulerFIFOMultiHost.run(self)
+        while self.waiting:
+            if not self.running_jobs:
+                # no job is left that could release them
+                with self.batch():
+                    for name in list(self.waiting):
+                        self.fail(name, 'its parents never run')
+                break
+            # waits until a parent finished
+            if self.wait_for_change():
+                SchedulerFIFOMultiHost.run(self)
+        self.flush()
+        return self.ran_jobs
+
+
 @dataclass
 class Host:
     user: str = sysinfo()[0]
@@ -1115,6 +3367,7 @@ class Host:
     max_jobs_allowed: int = 1
     cores: int = 1
     threads: int = 1
+    memory: int = 0
     gpu: str = ""
     pyenv: str = ""
     probe_status: bool = False
@@ -1140,16 +3393,82 @@ class Host:
         :return: probestatsu, datetime
         """
         now = datetime.now()
-        result = commonHost.check(hosts=f'{self.name}',username=self.user)
-        self.probe_status = result[0]['success']
-        hostname = result[0]['stdout']
-        if self.name != hostname and self.name != 'localhost':
+        try:
+            hostname = ssh.pool.output(self.user, self.name, "hostname")
+        except Exception:
+            hostname = None
+        return self.update_probe(now, hostname)
+
+    async def aprobe(self):
+        """
+        Executes a command on the host using asyncio and updates the
+        probe_status
+        :return: probestatsu, datetime
+        """
+        now = datetime.now()
+        try:
+            hostname = await ssh.pool.aoutput(self.user, self.name, "hostname")
+        except Exception:
+            hostname = None
+        return self.update_probe(now, hostname)
+
+    def update_probe(self, now, hostname):
+        """
+        Updates the probe_status with the hostname returned by the host
+
+        :param now: the time of the probe
+        :param hostname: the hostname or None if the host did not respond
+        :return: probestatsu, datetime
+        """
+        self.probe_status = hostname is not None
+        if hostname is not None:
+            hostname = hostname.strip()
+        if self.probe_status and self.name != hostname and self.name != 'localhost':
             Console.warning(f'Host probe returned different hostname:"{hostname}"'
                             f' than self.name: {self.name}.')
             self.probe_status = False
         self.probe_time = now.strftime("%d/%m/%Y %H:%M:%S")
         return self.probe_status, self.probe_time
 
+    @staticmethod
+    def stage(user, host, experiment, names, blobs=None):
+        """
+        Copies the directories of the named jobs in the experiment and the
+        blobs of their inputs to the host with a single rsync. Directories
+        and blobs the host already has are not copied again.
+
+        :param user: Name of user
+        :param host: Name of the host
+        :param experiment: the experiment directory
+        :param names: the names of the jobs
+        :param blobs: the blobs of the inputs of the jobs, see Job.link_inputs()
+        :return: the copied blobs and names of the copied jobs
+        """
+        command = f"mkdir -p {experiment}/{cache.directory} && ls {experiment}"
+        if blobs:
+            command += f" && ls {experiment}/{cache.directory}" \
+                       f" | sed 's|^|{cache.directory}/|'"
+        r = ssh.pool.run(user, host, command)
+        present = set(r.stdout.split())
+        missing = [blob for blob in blobs or [] if blob not in present]
+        for name in names:
+            if name in present:
+                Console.warning(f"Job directory {experiment}/{name} already present on host.\n"
+                                f"Use `cms reset` prior to re-running jobs to ensure dir is deleted.")
+            else:
+                missing.append(name)
+        if missing:
+            # the links to the inputs are copied as links, blobs that older
+            # versions stored as links to the input files are copied as files
+            r = ssh.pool.rsync(user, host,
+                               ["-rl", "--copy-unsafe-links", "--files-from=-",
+                                f"{experiment}/",
+                                f"{user}@{host}:{experiment}/"],
+                               input="\n".join(missing))
+            if r.returncode != 0:
+                Console.error(f"Could not copy jobs to {user}@{host}: {r.stdout}")
+        return missing
+
     @staticmethod
     def sync(user, host, experiment):
         """
@@ -1164,9 +3483,11 @@ class Host:
         if not is_local(host):
             if "/" not in experiment:
                 experiment = f"./{experiment}"
-            command = f"rsync -r {experiment}/* {user}@{host}:{experiment}"
+            command = f"rsync -r -e '{ssh.pool.rsh(user, host)}' " \
+                      f"{experiment}/* {user}@{host}:{experiment}"
             try:
-                r = os.system(command)
+                with ssh.pool.session(user, host):
+                    r = os.system(command)
             except:
                 r = 1
         else:
@@ -1193,6 +3514,7 @@ class Host:
                           "max_jobs_allowed",
                           "cores",
                           "threads",
+                          "memory",
                           "gpu"]
 
         if banner is not None:
@@ -1211,13 +3533,15 @@ class Cluster:
                  name: str = "TBD",
                  experiment: str = None,
                  filename: str = None,
-                 hosts: List = None):
+                 hosts: List = None,
+                 storage: str = None):
         self.name = name
         self.experiment = experiment or "./experiment"
         self.filename = filename or f"{self.experiment}/{self.name}-cluster.yaml"
         if not os.path.exists(self.experiment):
             os.makedirs(self.experiment)
-        self.hosts = YamlDB(filename=self.filename)
+        self.hosts = get_store(self.filename, storage=storage)
+        self.storage = self.hosts.kind
         if hosts:
             self.add_hosts(hosts)
 
@@ -1231,16 +3555,16 @@ class Cluster:
         return data
 
     def __len__(self):
-        return len(self.hosts.data)
+        return len(self.hosts)
 
     def keys(self):
         return self.hosts.keys()
 
     def items(self):
-        return self.hosts.__dict__["data"].items()
+        return self.hosts.items()
 
     def values(self):
-        return self.hosts.__dict__["data"].values()
+        return self.hosts.values()
 
     def delete(self, id: str):
         """
@@ -1250,7 +3574,6 @@ class Cluster:
         """
         try:
             self.hosts.delete(id)
-            self.save()
         except:
             Console.error(f'Could not delete host {id}')
 
@@ -1278,27 +3601,33 @@ class Cluster:
 
         :param host: the host
         """
-        self.hosts[host.id] = host.to_dict()
+        self.hosts.set(host.id, host.to_dict())
 
     def search(self, query):
         return self.hosts.search(query)
 
     def load(self, filename=None):
         filename = filename or self.filename
-        self.hosts = YamlDB(filename=filename)
+        self.hosts = get_store(filename, storage=self.storage)
 
     def add_hosts(self, hosts):
-        for host in hosts:
-            self.hosts[host.id] = host.to_dict()
-            self.save()
+        self.hosts.update({host.id: host.to_dict() for host in hosts})
 
     def add(self, host: Host):
-        self.hosts[host.id] = host.to_dict()
-        self.save()
+        self.hosts.add(host.id, host.to_dict())
 
     def save(self):
         self.hosts.save(self.filename)
 
+    def batch(self):
+        """
+        Returns a context in which all changes to the cluster are persisted
+        once at the end instead of on each call.
+
+        :return: context manager
+        """
+        return self.hosts.batch()
+
     def info(self,
              kind="hosts",
              banner=None,
@@ -1339,8 +3668,8 @@ class Cluster:
             },
             "hosts": {}
         }
-        for host in self.hosts:
-            result["hosts"][host] = self.hosts[host]
+        for id, host in self.hosts.items():
+            result["hosts"][id] = host
         return result
 
     def to_json(self, indent=2):
@@ -1364,10 +3693,12 @@ class Cluster:
         :param name: Name of the host to activate or deactivate
         :param status: If True the host is active
         """
+        host = dict(self.hosts[id])
         if status:
-            self.hosts.data[id]["status"] = "active"
+            host["status"] = "active"
         else:
-            self.hosts.data[id]["status"] = "inactive"
+            host["status"] = "inactive"
+        self.hosts.set(id, host)
 
     def add_policy(self, policy):
         """
@@ -0,0 +1,246 @@
+"""
+Places jobs on hosts by the resources they need.
+
+A job declares the number of cpus, the memory in MB and the number of gpus
+it needs. A host offers cores * threads cpus, its memory in MB and one gpu
+for each device in its gpu field, e.g. "0,1". The placement keeps the free
+resources of each host and starts a job only on a host that still has
+enough of all of them and runs fewer than max_jobs_allowed jobs, so a big
+host runs many small jobs without being defined several times:
+
+    placement = Placement(hosts, policy="best_fit")
+    for job in placement.order(jobs):
+        host = placement.candidates(job)[0]
+        placement.allocate(job, host)
+    ...
+    placement.release(job.name)
+
+Each GPU of a host is tracked by its device id. A job that needs n gpus is
+given n devices of the host no other running job holds, which become its
+CUDA_VISIBLE_DEVICES, so a host with gpu "0,1,2,3" runs four jobs with one
+GPU each. The devices are returned when the job is released. A job that
+needs no gpus sees all GPUs of the host as before, unless other jobs hold
+devices of it, see held(). Then it gets an empty CUDA_VISIBLE_DEVICES, so
+it can not use the devices of these jobs.
+
+The jobs are placed in the order of decreasing size, where the size of a
+job is the largest share of a resource it needs of the largest host. With
+first_fit a job goes to the first host in which it fits, with best_fit to
+the host that is left with the fewest free resources. A resource a job
+does not declare (0) is not counted, and a host with memory 0 does not
+limit the memory of its jobs.
+"""
+
+resources = ["cpus", "memory", "gpus"]
+
+policies = ["first_fit", "best_fit"]
+
+
+def devices(host) -> list:
+    """
+    returns the ids of the GPU devices of the host, e.g. ["0", "1"] for
+    the gpu "0,1"
+
+    :param host: the host
+    :return: list of str
+    """
+    gpu = "" if host.gpu is None else str(host.gpu)
+    return [device.strip() for device in gpu.split(",") if device.strip()]
+
+
+def capacity(host) -> dict:
+    """
+    returns the resources the host offers. The memory is None if the host
+    does not declare it.
+
+    :param host: the host
+    :return: dict of resource and amount
+    """
+    return {"cpus": int(host.cores or 1) * int(host.threads or 1),
+            "memory": int(host.memory or 0) or None,
+            "gpus": len(devices(host))}
+
+
+def demand(job) -> dict:
+    """
+    returns the resources the job needs
+
+    :param job: the job
+    :return: dict of resource and amount
+    """
+    return {resource: int(getattr(job, resource, 0) or 0)
+            for resource in resources}
+
+
+class Placement:
+
+    def __init__(self, hosts: list, policy: str = "first_fit"):
+        """
+        Keeps the free resources of the hosts
+
+        :param hosts: the hosts
+        :param policy: first_fit or best_fit
+        """
+        if policy not in policies:
+            raise ValueError(f"Unknown placement policy {policy}. "
+                             f"Use one of {policies}")
+        self.hosts = hosts
+        self.policy = policy
+        self.capacity = [capacity(host) for host in hosts]
+        self.free = [dict(offered) for offered in self.capacity]
+        # the ids of the GPU devices of each host no job holds
+        self.devices = [devices(host) for host in hosts]
+        self.largest = {resource: max([offered[resource] or 0
+                                       for offered in self.capacity] or [0])
+                        for resource in resources}
+        # the host index, the resources and the devices of each placed job
+        self.allocations = {}
+
+    def size(self, job) -> float:
+        """
+        returns the largest share of a resource of the largest host the job
+        needs
+
+        :param job: the job
+        :return: float
+        """
+        needed = demand(job)
+        return max([needed[resource] / self.largest[resource]
+                    for resource in resources
+                    if needed[resource] and self.largest[resource]] or [0])
+
+    def order(self, jobs: list) -> list:
+        """
+        returns the jobs in the order of decreasing size. Jobs of the same
+        size keep their order.
+
+        :param jobs: the jobs
+        :return: list of jobs
+        """
+        return sorted(jobs, key=self.size, reverse=True)
+
+    def _index(self, host) -> int:
+        # hosts with the same fields may be different slots of one machine
+        return next(index for index, found in enumerate(self.hosts)
+                    if found is host)
+
+    @staticmethod
+    def _fits(needed: dict, free: dict) -> bool:
+        return all(free[resource] is None or needed[resource] <= free[resource]
+                   for resource in resources)
+
+    def fits(self, job, host) -> bool:
+        """
+        returns True if the host has the free resources and a free slot
+        for the job
+
+        :param job: the job
+        :param host: the host
+        :return: bool
+        """
+        return self._fits_on(demand(job), self._index(host))
+
+    def _fits_on(self, needed: dict, index: int) -> bool:
+        host = self.hosts[index]
+        return host.job_counter < int(host.max_jobs_allowed) and \
+            self._fits(needed, self.free[index])
+
+    def possible(self, job) -> bool:
+        """
+        returns True if the job fits on one of the hosts once it is idle
+
+        :param job: the job
+        :return: bool
+        """
+        needed = demand(job)
+        return any(self._fits(needed, offered) for offered in self.capacity)
+
+    def left(self, job, index: int) -> float:
+        """
+        returns the share of the resources of the host that is free after
+        the job is placed on it
+
+        :param job: the job
+        :param index: the index of the host
+        :return: float
+        """
+        needed = demand(job)
+        return sum((self.free[index][resource] - needed[resource]) /
+                   self.capacity[index][resource]
+                   for resource in resources
+                   if self.capacity[index][resource])
+
+    def candidates(self, job) -> list:
+        """
+        returns the hosts on which the job fits now, the best first
+
+        :param job: the job
+        :return: list of hosts
+        """
+        needed = demand(job)
+        found = [index for index in range(len(self.hosts))
+                 if self._fits_on(needed, index)]
+        if self.policy == "best_fit":
+            found.sort(key=lambda index: self.left(job, index))
+        return [self.hosts[index] for index in found]
+
+    def allocate(self, job, host) -> list:
+        """
+        takes the resources of the job from the host. The job is given the
+        first of the free GPU devices of the host.
+
+        :param job: the job
+        :param host: the host
+        :return: the ids of the GPU devices of the job
+        """
+        index = self._index(host)
+        needed = demand(job)
+        for resource in resources:
+            if self.free[index][resource] is not None:
+                self.free[index][resource] -= needed[resource]
+        taken = self.devices[index][:needed["gpus"]]
+        del self.devices[index][:needed["gpus"]]
+        host.job_counter += 1
+        self.allocations[job.name] = (index, needed, taken)
+        return taken
+
+    def release(self, name: str):
+        """
+        returns the resources of the job to its host
+
+        :param name: the name of the job
+        :return: the host or None if the job was not placed
+        """
+        if name not in self.allocations:
+            return None
+        index, needed, taken = self.allocations.pop(name)
+        for resource in resources:
+            if self.free[index][resource] is not None:
+                self.free[index][resource] += needed[resource]
+        host = self.hosts[index]
+        free = set(self.devices[index]) | set(taken)
+        self.devices[index] = [device for device in devices(host)
+                               if device in free]
+        host.job_counter -= 1
+        return host
+
+    def gpus(self, name: str) -> list:
+        """
+        returns the ids of the GPU devices held by the job
+
+        :param name: the name of the job
+        :return: list of str
+        """
+        if name not in self.allocations:
+            return []
+        return list(self.allocations[name][2])
+
+    def held(self, host) -> list:
+        """
+        returns the ids of the GPU devices of the host held by jobs
+
+        :param host: the host
+        :return: list of str
+        """
+        free = self.devices[self._index(host)]
+        return [device for device in devices(host) if device not in free]
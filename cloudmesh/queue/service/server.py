@@ -1,18 +1,22 @@
 import subprocess
 import secrets
 import os
+import threading
 
 from getpass import getpass
 from fastapi import FastAPI
 from fastapi.responses import PlainTextResponse
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
 from fastapi import Depends, HTTPException, status
 
 from cloudmesh.queue.jobqueue import Queue
 from cloudmesh.queue.jobqueue import Cluster
 from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import JobArray
 from cloudmesh.queue.jobqueue import Host
 from cloudmesh.queue.jobqueue import SchedulerFIFO
+from cloudmesh.queue.store import exists
 from cloudmesh.common.variables import Variables
 from cloudmesh.common.Shell import Shell
 from cloudmesh.common.parameter import Parameter
@@ -76,6 +80,15 @@ password = getpass(prompt='Please enter the password for HTTP Basic Auth: ')
 
 running_queues = []
 
+# queues read by earlier requests of the same worker thread. They are only
+# read again if another process has changed them, see Queue.reload
+cache = threading.local()
+
+def __cached_queues():
+    if not hasattr(cache, "queues"):
+        cache.queues = {}
+    return cache.queues
+
 def get_current_username(credentials: HTTPBasicCredentials = Depends(security)):
     correct_username = secrets.compare_digest(credentials.username, user)
     correct_password = secrets.compare_digest(credentials.password, password)
@@ -95,11 +108,15 @@ def __get_queue(queue: str, experiment: str = None):
     if experiment is None:
         experiment = "experiment"
     file = os.path.join(experiment, queue_file_name)
-    if os.path.exists(file):
-        queue = Queue(name=queue, experiment=experiment)
-    else:
+    queues = __cached_queues()
+    if not exists(file):
+        queues.pop(file, None)
         raise HTTPException(status_code=404, detail="Queue not found")
-    return queue
+    if file in queues:
+        queues[file].reload()
+    else:
+        queues[file] = Queue(name=queue, experiment=experiment)
+    return queues[file]
 
 def __get_cluster(cluster: str, experiment: str = None):
     if '-cluster.yaml' not in cluster:
@@ -109,7 +126,7 @@ def __get_cluster(cluster: str, experiment: str = None):
     if experiment is None:
         experiment = "experiment"
     file = os.path.join(experiment, cluster_file_name)
-    if os.path.exists(file):
+    if exists(file):
         cluster = Cluster(name=cluster, experiment=experiment)
     else:
         raise HTTPException(status_code=404, detail="Cluster not found")
@@ -123,7 +140,8 @@ async def root(credentials: HTTPBasicCredentials = Depends(security)):
     return {"message": "Cloudmesh Queue Server"}
 
 @app.post("/queue/",tags=["queue"])
-def queue_create(name: str,experiment:str='experiment',credentials: HTTPBasicCredentials = Depends(security)):
+def queue_create(name: str,experiment:str='experiment',storage: str=None,
+                 credentials: HTTPBasicCredentials = Depends(security)):
     """
     Creates a queue with the given name and experiment.
 
@@ -132,8 +150,15 @@ def queue_create(name: str,experiment:str='experiment',credentials: HTTPBasicCre
 
     - **name**: the queue must have a name.
     - **experiment**: a user defined sub-directory to store the queue.
+    - **storage**: the storage engine of the queue, `yaml` (default), `journal`
+    or `sqlite`. With `journal` each change is appended to `"name"-queue.yaml.journal`
+    and the yaml file is rewritten only periodically. With `sqlite` the queue is
+    stored in the database `"name"-queue.db`.
     """
-    queue = Queue(name=name,experiment=experiment)
+    try:
+        queue = Queue(name=name,experiment=experiment,storage=storage)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return queue
 
 @app.get("/queue/",tags=["queue"])
@@ -145,7 +170,7 @@ def list_queues(experiment:str='experiment',credentials: HTTPBasicCredentials =
     """
     if experiment is None:
         experiment = "experiment"
-    r = Shell.run(f'ls ./{experiment} | grep queue.yaml')
+    r = Shell.run(f'ls ./{experiment} | grep -E "queue.(yaml|db)$"')
     if 'No such file' in r:
         raise HTTPException(status_code=404, detail=f"Directory {experiment} does not exist")
     r = r.splitlines()
@@ -216,13 +241,16 @@ def queue_delete(queue: str,experiment: str="experiment",credentials: HTTPBasicC
     Deletes the queue in the provided experiment directory.
 
     **WARNING THIS DELETES ALL JOB DIRS IN THE QUEUE**
+
+    Running jobs are killed. The jobs on a host are cleaned up with a single command
+    and all hosts are cleaned up concurrently.
     """
     queue = __get_queue(queue=queue,experiment=experiment)
-    result = ''
-    for key in queue.keys():
-        job = Job(**queue.get(key))
-        result += job.remove_dir()
-    os.system(f'rm {queue.filename}')
+    result = queue.cleanup([queue.get_job(key) for key in queue.keys()])
+    queue.remove()
+    queues = __cached_queues()
+    for file in [file for file, cached in queues.items() if cached is queue]:
+        del queues[file]
     if result == '':
         return "Delete Successful"
     return result
@@ -230,7 +258,8 @@ def queue_delete(queue: str,experiment: str="experiment",credentials: HTTPBasicC
 @app.get("/queue/{queue}/job/{job}",tags=["queue"])
 def queue_get_job(queue: str, job: str,experiment:str = "experiment", credentials: HTTPBasicCredentials = Depends(security)):
     """
-    Returns a json representation of the requested job.
+    Returns a json representation of the requested job. Archived jobs are
+    included.
     """
     queue = __get_queue(queue=queue,experiment=experiment)
     try:
@@ -239,8 +268,49 @@ def queue_get_job(queue: str, job: str,experiment:str = "experiment", credential
         raise HTTPException(status_code=404, detail=f"Job: {job} does not exist in queue.")
     return job
 
+@app.get("/queue/{queue}/job/{job}/output",tags=["queue"])
+def queue_get_job_output(queue: str, job: str, experiment:str = "experiment", compress: bool = False,
+                         chunk_size: int = 65536, credentials: HTTPBasicCredentials = Depends(security)):
+    """
+    Streams the output file of the job from the host executing it. The output is
+    never held in memory as a whole, so outputs of any size can be downloaded.
+
+    - **compress**: if true the output is compressed with gzip on the host and send
+    with `Content-Encoding: gzip`, so clients decompress it transparently.
+    - **chunk_size**: the maximum number of bytes read at once.
+    """
+    queue = __get_queue(queue=queue,experiment=experiment)
+    try:
+        job = Job.from_dict(queue.get(job))
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Job: {job} does not exist in queue.")
+    if compress:
+        return StreamingResponse(job.stream(job.output, chunk_size=chunk_size, compress=True),
+                                 media_type="application/octet-stream",
+                                 headers={"Content-Encoding": "gzip"})
+    return StreamingResponse(job.iter_output(chunk_size=chunk_size),
+                             media_type="application/octet-stream")
+
+@app.get("/queue/{queue}/jobs",tags=["queue"])
+def queue_find_jobs(queue: str, experiment:str = "experiment", status: str=None, host: str=None,
+                    user: str=None, credentials: HTTPBasicCredentials = Depends(security)):
+    """
+    Returns a json representation of the jobs that match all of the given fields.
+
+    - **status**: e.g. `ready` returns all jobs that are ready to run.
+    - **host** and **user**: return the jobs assigned to the host or user.
+
+    Queues stored with `sqlite` answer this request with an index lookup.
+    """
+    queue = __get_queue(queue=queue,experiment=experiment)
+    fields = {}
+    if status: fields['status'] = status
+    if host: fields['host'] = host
+    if user: fields['user'] = user
+    return queue.find(**fields)
+
 @app.put("/queue/{queue}/refresh", response_class=PlainTextResponse,tags=["queue"])
-def queue_refresh(queue: str,experiment:str = "experiment", credentials: HTTPBasicCredentials = Depends(security)):
+async def queue_refresh(queue: str,experiment:str = "experiment", credentials: HTTPBasicCredentials = Depends(security)):
     """
     This refreshes the status of a queue. It is useful for determining the state of a running
     queue. It can be used to recover the latest job status from a queue manager or worker host failure.
@@ -248,22 +318,28 @@ def queue_refresh(queue: str,experiment:str = "experiment", credentials: HTTPBas
     If any jobs are in the state "run" or "start" then the host
     running the job will be queried to get the latest job information.
     
+    The hosts are queried concurrently without blocking other requests.
+
     This info view of the updated queue is returned.
     """
     queue = __get_queue(queue=queue,experiment=experiment)
-    queue.refresh()
+    await queue.arefresh()
     return queue.info()
 
 @app.post("/queue/{queue}",response_class=PlainTextResponse,tags=["queue"])
 def queue_add_job(queue: str, name: str, command: str,experiment:str = "experiment", input: str=None,output: str=None, \
                   status: str=None, gpu: str=None, user: str=None, host: str=None, \
-                  shell: str=None, log: str=None, pyenv: str =None,
+                  shell: str=None, log: str=None, pyenv: str =None, inputs: str=None,
+                  priority: int=None, cpus: int=None, memory: int=None, gpus: int=None,
+                  depends_on: str=None,
                   credentials: HTTPBasicCredentials = Depends(security)):
     """
     Adds a job to the provided queue.
 
     - **name**: takes a single or expandable name. For example job[1-10] will create
-    10 jobs with the same parameters, and names job1 to job10.
+    10 jobs with the same parameters, and names job1 to job10. A name of the form
+    prefix[start-end] is stored as a single job array whose jobs are created by the
+    scheduler one at a time.
     - **command**: the command that will be run by the job, e.g. `python test.py`
     - **input**: the location of input used by the command.
     - **output**: the location of output created by executing the command.
@@ -280,10 +356,21 @@ def queue_add_job(queue: str, name: str, command: str,experiment:str = "experime
     - **log**: is the location of the log output
     - **pyenv**: is the argument to the source command and will be executed before
     running the job to activate a python environment.
+    - **inputs**: an expandable list of input files, e.g. `data/a.csv,data/b.csv`.
+    The files are copied once to a cache on each host and linked into the job
+    directories.
+    - **priority**: jobs with a higher priority are started first by the priority
+    scheduler. The default is 0.
+    - **cpus**, **memory** and **gpus**: the number of cpus, the memory in MB and the
+    number of GPUs the job needs. The fifo_multi scheduler only starts the job on a
+    host with enough free resources and sets its CUDA_VISIBLE_DEVICES to GPUs of the
+    host no other running job holds. A job without gpus sees all GPUs of the host,
+    unless other jobs hold some of them. Then it sees no GPU.
+    - **depends_on**: an expandable list of the names of the jobs that must end before
+    the dag scheduler starts this job, e.g. `prepare,train[1-3]`.
 
     """
     queue = __get_queue(queue=queue,experiment=experiment)
-    names = Parameter.expand(name)
     job_args = {}
     if command: job_args['command'] = command
     if input: job_args['input'] = input
@@ -295,12 +382,24 @@ def queue_add_job(queue: str, name: str, command: str,experiment:str = "experime
     if shell: job_args['shell'] = shell
     if log: job_args['log'] = log
     if pyenv: job_args['pyenv'] = pyenv
+    if inputs: job_args['inputs'] = Parameter.expand(inputs)
+    if priority is not None: job_args['priority'] = priority
+    if cpus: job_args['cpus'] = cpus
+    if memory: job_args['memory'] = memory
+    if gpus: job_args['gpus'] = gpus
+    if depends_on: job_args['depends_on'] = Parameter.expand(depends_on)
     if experiment: job_args['experiment'] = experiment
 
-    for name in names:
-        job_args['name'] = name
-        job = Job(**job_args)
-        queue.add(job)
+    array = JobArray.from_name(name, job_args)
+    if array is not None:
+        queue.add_array(array)
+        return queue.info()
+    names = Parameter.expand(name)
+    with queue.batch():
+        for name in names:
+            job_args['name'] = name
+            job = Job.from_dict(job_args)
+            queue.add(job)
     return queue.info()
 
 @app.delete("/queue/{queue}/job/{job}",response_class=PlainTextResponse,tags=["queue"])
@@ -309,13 +408,17 @@ def queue_delete_job(queue: str, name: str, experiment:str = "experiment", crede
     Deletes the expandable list of jobs provided by the **name** argument, e.g. `name=job[1-10]`.
     """
     queue = __get_queue(queue=queue,experiment=experiment)
-    names = Parameter.expand(name)
-    for name in names:
-        queue.delete(name=name)
+    array = JobArray.from_name(name)
+    if array is not None and queue.arrays and array.key in queue.arrays:
+        names = [array.key]
+    else:
+        names = Parameter.expand(name)
+    queue.delete_jobs(names)
     return queue.info()
 
 @app.put("/queue/{queue}/run_fifo",tags=["queue"])
 def queue_run_fifo(queue: str, max_parallel: int, experiment: str = "experiment", timeout:int=10,
+                   agent: bool = False, launch: bool = False,
                    credentials: HTTPBasicCredentials = Depends(security)):
     """
     Runs the queue with a simple fifo scheduler.
@@ -323,6 +426,8 @@ def queue_run_fifo(queue: str, max_parallel: int, experiment: str = "experiment"
     - **max_parallel**: is the maximum number of parallel jobs that will be executed by the scheduler.
     - **timeout**: is the time that will consider a host as dead and mark the job as crashed.
     The default is 10 minutes.
+    - **agent**: receive the job states from an agent on each host instead of reading the job logs.
+    - **launch**: start each job with a single ssh command that receives the job script.
 
     **Prerequisites**: All jobs intended to be run must be assigned a `user` and a `host`.
     Those jobs not assigned a `user` and `host` will be skipped.
@@ -331,22 +436,54 @@ def queue_run_fifo(queue: str, max_parallel: int, experiment: str = "experiment"
     [here](https://github.com/cloudmesh/cloudmesh-queue/blob/main/README.md#failure-considerations)
     for failure recovery instructions.
     """
-    #queue run fifo QUEUE [--experiment=EXPERIMENT] --max_parallel=MAX_PARALLEL [--timeout=TIMEOUT]
+    #queue run fifo QUEUE [--experiment=EXPERIMENT] --max_parallel=MAX_PARALLEL [--timeout=TIMEOUT] [--agent] [--launch]
     queue_obj = __get_queue(queue=queue, experiment=experiment)
+    options = (' --agent' if agent else '') + (' --launch' if launch else '')
     if experiment is not None:
         p = subprocess.Popen([f'cms queue run fifo --queue={queue} --experiment={experiment}'
-                              f' --max_parallel={max_parallel} --timeout={timeout}'],
+                              f' --max_parallel={max_parallel} --timeout={timeout}{options}'],
                              shell=True)
         cluster = 'None'
         running_queues.append((queue, experiment, cluster, str(p.pid)))
     else:
-        p = subprocess.Popen([f'cms queue run fifo --queue={queue} --max_parallel={max_parallel} --timeout={timeout}'], shell=True)
+        p = subprocess.Popen([f'cms queue run fifo --queue={queue} --max_parallel={max_parallel} --timeout={timeout}{options}'], shell=True)
         cluster = 'None'
         running_queues.append((queue, experiment, cluster, str(p.pid)))
     return {'result': f'started fifo scheduler: pid {p.pid}'}
 
+@app.put("/queue/{queue}/run_priority",tags=["queue"])
+def queue_run_priority(queue: str, max_parallel: int, experiment: str = "experiment", timeout:int=10,
+                       agent: bool = False, launch: bool = False,
+                       credentials: HTTPBasicCredentials = Depends(security)):
+    """
+    Runs the queue with a scheduler that starts the ready job with the highest priority
+    first. Jobs with the same priority are started in the order they were added.
+
+    - **max_parallel**: is the maximum number of parallel jobs that will be executed by the scheduler.
+    - **timeout**: is the time that will consider a host as dead and mark the job as crashed.
+    The default is 10 minutes.
+    - **agent**: receive the job states from an agent on each host instead of reading the job logs.
+    - **launch**: start each job with a single ssh command that receives the job script.
+
+    **Prerequisites**: All jobs intended to be run must be assigned a `user` and a `host`.
+    Those jobs not assigned a `user` and `host` will be skipped.
+    """
+    #queue run priority QUEUE [--experiment=EXPERIMENT] --max_parallel=MAX_PARALLEL [--timeout=TIMEOUT] [--agent] [--launch]
+    queue_obj = __get_queue(queue=queue, experiment=experiment)
+    options = (' --agent' if agent else '') + (' --launch' if launch else '')
+    if experiment is not None:
+        p = subprocess.Popen([f'cms queue run priority --queue={queue} --experiment={experiment}'
+                              f' --max_parallel={max_parallel} --timeout={timeout}{options}'],
+                             shell=True)
+    else:
+        p = subprocess.Popen([f'cms queue run priority --queue={queue} --max_parallel={max_parallel} --timeout={timeout}{options}'], shell=True)
+    cluster = 'None'
+    running_queues.append((queue, experiment, cluster, str(p.pid)))
+    return {'result': f'started priority scheduler: pid {p.pid}'}
+
 @app.put("/queue/{queue}/run_fifo_multi",tags=["queue"])
 def queue_run_fifo_multi(queue: str, cluster: str, experiment: str = "experiment", timeout:int=10,
+                         agent: bool = False, launch: bool = False, policy: str = "first_fit",
                          credentials: HTTPBasicCredentials = Depends(security)):
     """
         Runs the queue with a fifo scheduler that assigns jobs to hosts provided in a cluster definition.
@@ -355,6 +492,10 @@ def queue_run_fifo_multi(queue: str, cluster: str, experiment: str = "experiment
         This cluster definition must be in the same **experiment** directory as the queue.
         - **timeout**: is the time that will consider a host as dead and mark the job as crashed.
         The default is 10 minutes.
+        - **agent**: receive the job states from an agent on each host instead of reading the job logs.
+        - **launch**: start each job with a single ssh command that receives the job script.
+        - **policy**: `first_fit` places a job on the first host with enough free cpus,
+        memory and gpus, `best_fit` on the host that is left with the fewest free resources.
 
         All jobs in the queue with a state "undefined" or "ready" will be executed.
 
@@ -362,18 +503,59 @@ def queue_run_fifo_multi(queue: str, cluster: str, experiment: str = "experiment
         [here](https://github.com/cloudmesh/cloudmesh-queue/blob/main/README.md#failure-considerations-1)
         for failure recovery instructions.
         """
-    # queue run fifo_multi QUEUE [--experiment=EXPERIMENT] [--hosts=HOSTS] [--hostfile=HOSTFILE] [--timeout=TIMEOUT]
+    # queue run fifo_multi QUEUE [--experiment=EXPERIMENT] [--hosts=HOSTS] [--hostfile=HOSTFILE] [--timeout=TIMEOUT] [--agent] [--launch] [--policy=POLICY]
     queue_obj = __get_queue(queue=queue, experiment=experiment)
     cluster_obj = __get_cluster(cluster=cluster, experiment=experiment)
+    options = (' --agent' if agent else '') + (' --launch' if launch else '') + \
+        f' --policy={policy}'
     if experiment is not None:
         p = subprocess.Popen([f'cms queue run fifo_multi --queue={queue} --experiment={experiment} '
-                              f'--hostfile={cluster} --timeout={timeout}'], shell=True)
+                              f'--hostfile={cluster} --timeout={timeout}{options}'], shell=True)
         running_queues.append((queue,experiment, cluster, str(p.pid)))
     else:
-        p = subprocess.Popen([f'cms queue run fifo_multi --queue={queue} --hostfile={cluster} --timeout={timeout}'], shell=True)
+        p = subprocess.Popen([f'cms queue run fifo_multi --queue={queue} --hostfile={cluster} --timeout={timeout}{options}'], shell=True)
         running_queues.append((queue,experiment, cluster, str(p.pid)))
     return {'result': f'started fifo_multi scheduler: pid {p.pid}'}
 
+@app.put("/queue/{queue}/run_dag",tags=["queue"])
+def queue_run_dag(queue: str, cluster: str, experiment: str = "experiment", timeout:int=10,
+                  agent: bool = False, launch: bool = False, policy: str = "first_fit",
+                  credentials: HTTPBasicCredentials = Depends(security)):
+    """
+        Runs the queue with a dag scheduler that starts a job once all jobs it depends on
+        have ended and assigns it to a host provided in a cluster definition.
+
+        - **cluster**: jobs will be assigned to active hosts contained in this cluster.
+        This cluster definition must be in the same **experiment** directory as the queue.
+        - **timeout**: is the time that will consider a host as dead and mark the job as crashed.
+        The default is 10 minutes.
+        - **agent**: receive the job states from an agent on each host instead of reading the job logs.
+        - **launch**: start each job with a single ssh command that receives the job script.
+        - **policy**: `first_fit` places a job on the first host with enough free cpus,
+        memory and gpus, `best_fit` on the host that is left with the fewest free resources.
+
+        All jobs in the queue with a state "undefined" or "ready" will be executed. Independent
+        jobs run in parallel on the hosts. If a job does not end or exits with an exit code
+        other than 0, all jobs that depend on it get the state "fail_parent".
+
+        **Failure Recovery**: See
+        [here](https://github.com/cloudmesh/cloudmesh-queue/blob/main/README.md#failure-considerations-1)
+        for failure recovery instructions.
+        """
+    # queue run dag QUEUE [--experiment=EXPERIMENT] [--hosts=HOSTS] [--hostfile=HOSTFILE] [--timeout=TIMEOUT] [--agent] [--launch] [--policy=POLICY]
+    queue_obj = __get_queue(queue=queue, experiment=experiment)
+    cluster_obj = __get_cluster(cluster=cluster, experiment=experiment)
+    options = (' --agent' if agent else '') + (' --launch' if launch else '') + \
+        f' --policy={policy}'
+    if experiment is not None:
+        p = subprocess.Popen([f'cms queue run dag --queue={queue} --experiment={experiment} '
+                              f'--hostfile={cluster} --timeout={timeout}{options}'], shell=True)
+        running_queues.append((queue,experiment, cluster, str(p.pid)))
+    else:
+        p = subprocess.Popen([f'cms queue run dag --queue={queue} --hostfile={cluster} --timeout={timeout}{options}'], shell=True)
+        running_queues.append((queue,experiment, cluster, str(p.pid)))
+    return {'result': f'started dag scheduler: pid {p.pid}'}
+
 @app.put("/queue/{queue}/stop",response_class=PlainTextResponse,tags=["queue"])
 def queue_stop(queue: str, experiment: str = "experiment"):
     """
@@ -395,15 +577,31 @@ def queue_stop(queue: str, experiment: str = "experiment"):
             raise HTTPException(status_code=404, detail=f"Queue {queue} ps could not be found")
         queue = __get_queue(queue=queue, experiment=experiment)
         queue.refresh()
-        keys = queue.keys()
-        for key in keys:
-            job = Job(**queue.get(key))
-            if job.status == 'run' or job.status == "start":
-                job.kill()
+        # kills the running jobs with one command per host
+        queue.cleanup([queue.get_job(key) for key in queue.keys()], remove=False)
         running_queues.remove((q, exp,cluster, pid))
         queue.refresh()
         return queue.info()
 
+@app.put("/queue/{queue}/archive",response_class=PlainTextResponse,tags=["queue"])
+def queue_archive(queue: str, experiment: str = "experiment", status: str = None,
+                  window: str = "%Y-%m-%d",
+                  credentials: HTTPBasicCredentials = Depends(security)):
+    """
+    Moves the finished jobs of the queue into an archive and returns the info of
+    the remaining queue. Archived jobs can still be retrieved with
+    `/queue/{queue}/job/{job}`.
+
+    - **status**: a comma separated list of the states to archive. The default is
+    `end,kill,crash,fail_start,fail_parent`.
+    - **window**: a strftime format that names the archive segment the jobs are
+    written to. The default `%Y-%m-%d` creates one segment per day.
+    """
+    queue = __get_queue(queue=queue, experiment=experiment)
+    statuses = status.split(',') if status else None
+    queue.archive(statuses=statuses, window=window)
+    return queue.info()
+
 @app.put("/queue/{queue}/reset",response_class=PlainTextResponse,tags=["queue"])
 def queue_reset(queue: str,experiment:str = "experiment", name: str=None, status:str=None,
                 credentials: HTTPBasicCredentials = Depends(security)):
@@ -457,7 +655,7 @@ def cluster_list(experiment:str = None, credentials: HTTPBasicCredentials = Depe
         """
     if experiment is None:
         experiment = 'experiment'
-    r = Shell.run(f'ls ./{experiment} | grep cluster.yaml')
+    r = Shell.run(f'ls ./{experiment} | grep -E "cluster.(yaml|db)$"')
     if 'No such file' in r:
         raise HTTPException(status_code=404, detail=f"Directory {experiment} does not exist")
     r = r.splitlines()
@@ -465,7 +663,8 @@ def cluster_list(experiment:str = None, credentials: HTTPBasicCredentials = Depe
 
 @app.post("/cluster/{cluster}", response_class=PlainTextResponse,tags=["cluster"])
 def cluster_add_host(cluster: str, id: str, name: str,user: str,experiment:str = "experiment", ip: str=None, \
-                  status: str=None, gpu: int=None, pyenv: str=None,
+                  status: str=None, gpu: str=None, pyenv: str=None, cores: int=None,
+                     threads: int=None, memory: int=None, max_jobs_allowed: int=None,
                      credentials: HTTPBasicCredentials = Depends(security)):
     """
     Add a host to the cluster.
@@ -481,8 +680,11 @@ def cluster_add_host(cluster: str, id: str, name: str,user: str,experiment:str =
       - **pyenv**: is the argument to the source command and will be executed before
     running the job to activate a python environment.
 
-    All hosts allow 1 maximum job when a scheduler is assigning jobs. To run multiple
-    jobs on the same machine, define multiple hosts for that machine.
+      - **cores**, **threads** and **memory**: the cores, the threads per core and the
+    memory in MB of the host. Jobs that declare the cpus, memory or gpus they need are
+    only started on a host with enough free resources.
+      - **max_jobs_allowed**: the maximum number of jobs running on the host at the same
+    time. The default is 1.
 
     """
     cluster = __get_cluster(cluster=cluster,experiment=experiment)
@@ -494,12 +696,17 @@ def cluster_add_host(cluster: str, id: str, name: str,user: str,experiment:str =
     if status: host_args['status'] = status
     if gpu: host_args['gpu'] = gpu
     if pyenv: host_args['pyenv'] = pyenv
-
-    for host_id in ids:
-        host_args['id'] = host_id
-        host = Host(**host_args)
-        Console.info(f'Adding host {host.id} to cluster {cluster.name}')
-        cluster.add(host)
+    if cores: host_args['cores'] = cores
+    if threads: host_args['threads'] = threads
+    if memory: host_args['memory'] = memory
+    if max_jobs_allowed: host_args['max_jobs_allowed'] = max_jobs_allowed
+
+    with cluster.batch():
+        for host_id in ids:
+            host_args['id'] = host_id
+            host = Host(**host_args)
+            Console.info(f'Adding host {host.id} to cluster {cluster.name}')
+            cluster.add(host)
     return cluster.info()
 
 @app.get("/cluster/{cluster}",tags=["cluster"])
@@ -529,7 +736,7 @@ def cluster_delete(cluster: str,experiment: str="experiment",credentials: HTTPBa
         Deletes the cluster in the provided experiment directory.
         """
     cluster = __get_cluster(cluster=cluster,experiment=experiment)
-    os.system(f'rm {cluster.filename}')
+    cluster.hosts.remove()
     return True
 
 @app.get("/cluster/{cluster}/id/{id}",tags=["cluster"])
@@ -553,8 +760,9 @@ def cluster_delete_host(cluster: str, id: str, experiment:str = "experiment",
         """
     cluster = __get_cluster(cluster=cluster,experiment=experiment)
     ids = Parameter.expand(id)
-    for host_id in ids:
-        cluster.delete(id=host_id)
+    with cluster.batch():
+        for host_id in ids:
+            cluster.delete(id=host_id)
     return cluster.info()
 
 @app.put("/cluster/{cluster}/id/{id}/activate", response_class=PlainTextResponse,tags=["cluster"])
@@ -565,15 +773,16 @@ def cluster_activate_host(cluster: str, id: str,experiment:str = "experiment",
     """
     cluster = __get_cluster(cluster=cluster,experiment=experiment)
     ids = Parameter.expand(id)
-    for host_id in ids:
-        try:
-            host_dict = cluster.get(id=host_id)
-        except KeyError:
-            raise HTTPException(status_code=404, detail=f"Host id: {host_id} does not exist in cluster {cluster.name}.")
-        host = Host(**host_dict)
-        host.status = 'active'
-        cluster.set(host=host)
-        Console.info(f'Activating host {host.id} in cluster {cluster.name}')
+    with cluster.batch():
+        for host_id in ids:
+            try:
+                host_dict = cluster.get(id=host_id)
+            except KeyError:
+                raise HTTPException(status_code=404, detail=f"Host id: {host_id} does not exist in cluster {cluster.name}.")
+            host = Host(**host_dict)
+            host.status = 'active'
+            cluster.set(host=host)
+            Console.info(f'Activating host {host.id} in cluster {cluster.name}')
     return cluster.info()
 
 @app.put("/cluster/{cluster}/id/{id}/deactivate", response_class=PlainTextResponse,tags=["cluster"])
@@ -584,15 +793,16 @@ def cluster_deactivate_host(cluster: str, id: str, experiment:str = "experiment"
     """
     cluster = __get_cluster(cluster=cluster,experiment=experiment)
     ids = Parameter.expand(id)
-    for host_id in ids:
-        try:
-            host_dict = cluster.get(id=host_id)
-        except KeyError:
-            raise HTTPException(status_code=404, detail=f"Host id: {host_id} does not exist in cluster {cluster.name}.")
-        host = Host(**host_dict)
-        host.status = 'inactive'
-        cluster.set(host=host)
-        Console.info(f'Deactivating host {host.id} in cluster {cluster.name}')
+    with cluster.batch():
+        for host_id in ids:
+            try:
+                host_dict = cluster.get(id=host_id)
+            except KeyError:
+                raise HTTPException(status_code=404, detail=f"Host id: {host_id} does not exist in cluster {cluster.name}.")
+            host = Host(**host_dict)
+            host.status = 'inactive'
+            cluster.set(host=host)
+            Console.info(f'Deactivating host {host.id} in cluster {cluster.name}')
     return cluster.info()
 
 @app.put("/cluster/{cluster}/id/{id}/set", response_class=PlainTextResponse,tags=["cluster"])
@@ -603,13 +813,14 @@ def cluster_set_host(cluster: str, id: str, key: str, value: str, experiment:str
     """
     cluster = __get_cluster(cluster=cluster,experiment=experiment)
     ids = Parameter.expand(id)
-    for host_id in ids:
-        try:
-            host_dict = cluster.get(id=host_id)
-        except KeyError:
-            raise HTTPException(status_code=404, detail=f"Host id: {host_id} does not exist in cluster {cluster.name}.")
-        host_dict[key] = value
-        host = Host(**host_dict)
-        cluster.set(host=host)
-        Console.info(f'Setting host: {host.id} key: {key} value: {value} in cluster {cluster.name}')
+    with cluster.batch():
+        for host_id in ids:
+            try:
+                host_dict = cluster.get(id=host_id)
+            except KeyError:
+                raise HTTPException(status_code=404, detail=f"Host id: {host_id} does not exist in cluster {cluster.name}.")
+            host_dict[key] = value
+            host = Host(**host_dict)
+            cluster.set(host=host)
+            Console.info(f'Setting host: {host.id} key: {key} value: {value} in cluster {cluster.name}')
     return cluster.info()
\ No newline at end of file
@@ -0,0 +1,423 @@
+"""
+A pool of multiplexed ssh connections to the hosts that execute jobs.
+
+Every remote command of a Job or a Host is executed through the pool. The
+first command to a host starts an ssh master connection with ControlMaster,
+all following commands reuse it as a session, so only the first command
+pays for the tcp and authentication handshake
+
+    from cloudmesh.queue import ssh
+
+    r = ssh.pool.run("gregor", "red01", "hostname")
+    r.returncode
+    r.stdout
+    ssh.pool.output("gregor", "red01", "cat job1/job1.log")
+
+Commands for a host that is local are executed with sh without ssh, so a
+caller does not need to distinguish between local and remote hosts.
+
+At most max_sessions commands are executed at the same time on a host, all
+further commands wait until a session is free. Threads and coroutines share
+this limit. sshd limits the sessions of a master connection with MaxSessions
+which defaults to 10. A master connection that was not used for idle seconds
+is closed by ssh through ControlPersist and by evict(). As ControlPersist
+keeps the master running after the process exits, consecutive cms commands
+reuse the connection.
+
+The commands are executed by the transport of the pool which is called with
+the argument list, the input and the timeout and returns a
+subprocess.CompletedProcess. Tests replace it with a fake transport
+
+    pool = SSHPool(transport=lambda args, input=None, timeout=None: ...)
+
+The output of a long running command or of a large file is read in chunks
+with stream(), so it is never held in memory as a whole
+
+    for chunk in ssh.pool.stream("gregor", "red01", "cat job1/job1.out"):
+        f.write(chunk)
+
+The streamed commands are started with the popen function of the pool,
+which tests can replace just as the transport.
+
+The methods arun() and aoutput() are coroutines that execute the command
+with asyncio.create_subprocess_exec, so many commands on many hosts can be
+awaited together in one thread. They use the coroutine atransport and
+wait for a free session without blocking the event loop
+
+    results = await asyncio.gather(
+        *[ssh.pool.arun("gregor", host, "hostname") for host in hosts])
+"""
+import asyncio
+import os
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import asynccontextmanager
+from contextlib import contextmanager
+from contextlib import nullcontext
+
+from cloudmesh.common.util import is_local
+from cloudmesh.common.util import path_expand
+
+
+def subprocess_transport(args, input=None, timeout=None):
+    """
+    executes the argument list and returns the completed process with the
+    combined stdout and stderr as text
+
+    :param args: the argument list
+    :param input: the text send to stdin
+    :param timeout: the timeout in seconds
+    :return: subprocess.CompletedProcess
+    """
+    # the output is written to a file and not to a pipe as the master
+    # connection started in the background keeps stderr open. Bytes that
+    # are not valid utf-8, e.g. in the output of a job, are replaced.
+    with tempfile.TemporaryFile(mode="w+", errors="replace") as output:
+        r = subprocess.run(args,
+                           input=input,
+                           stdin=subprocess.DEVNULL if input is None else None,
+                           stdout=output,
+                           stderr=subprocess.STDOUT,
+                           timeout=timeout,
+                           text=True)
+        output.seek(0)
+        r.stdout = output.read()
+    return r
+
+
+async def subprocess_atransport(args, input=None, timeout=None):
+    """
+    executes the argument list with asyncio and returns the completed
+    process with the combined stdout and stderr as text
+
+    :param args: the argument list
+    :param input: the text send to stdin
+    :param timeout: the timeout in seconds
+    :return: subprocess.CompletedProcess
+    """
+    with tempfile.TemporaryFile(mode="w+", errors="replace") as output:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+            stdout=output,
+            stderr=subprocess.STDOUT)
+        if input is not None:
+            process.stdin.write(input.encode())
+            await process.stdin.drain()
+            process.stdin.close()
+        try:
+            returncode = await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise subprocess.TimeoutExpired(args, timeout)
+        output.seek(0)
+        return subprocess.CompletedProcess(args, returncode,
+                                           stdout=output.read())
+
+
+class SSHPool:
+
+    def __init__(self,
+                 max_sessions: int = 8,
+                 idle: int = 60,
+                 control_dir: str = "~/.cloudmesh/queue/ssh",
+                 options: list = None,
+                 transport=None,
+                 atransport=None,
+                 popen=None):
+        """
+        creates a pool of ssh master connections
+
+        :param max_sessions: the maximum number of concurrent commands per host
+        :param idle: the seconds after which an unused master connection is
+                     closed
+        :param control_dir: the directory of the control sockets
+        :param options: additional ssh options, e.g. ["-i", "~/.ssh/id_rsa"]
+        :param transport: the function executing an argument list
+        :param atransport: the coroutine executing an argument list
+        :param popen: the function starting an argument list for stream(),
+                      by default subprocess.Popen
+        """
+        self.max_sessions = max_sessions
+        self.idle = idle
+        self.control_dir = path_expand(control_dir)
+        self.options = options or []
+        self.transport = transport or subprocess_transport
+        self.atransport = atransport or subprocess_atransport
+        self.popen = popen or subprocess.Popen
+        self.lock = threading.Lock()
+        self.condition = threading.Condition(self.lock)
+        self.waiters = []
+        self.active = {}
+        self.closing = set()
+        self.used = {}
+
+    def ssh(self, user: str, host: str) -> list:
+        """
+        returns the ssh argument list that uses the master connection of the
+        host
+
+        :param user: the user name
+        :param host: the host name
+        :return: list
+        """
+        os.makedirs(self.control_dir, exist_ok=True)
+        return ["ssh",
+                "-o", "ControlMaster=auto",
+                "-o", f"ControlPath={self.control_dir}/%C",
+                "-o", f"ControlPersist={self.idle}"] + \
+            self.options + [f"{user}@{host}"]
+
+    def rsh(self, user: str, host: str) -> str:
+        """
+        returns the ssh command for rsync -e so rsync uses the master
+        connection of the host
+
+        :param user: the user name
+        :param host: the host name
+        :return: str
+        """
+        return " ".join(self.ssh(user, host)[:-1])
+
+    def _free(self, key) -> bool:
+        # called with the lock held
+        return key not in self.closing and \
+            self.active.get(key, 0) < self.max_sessions
+
+    def _acquire(self, key):
+        # called with the lock held
+        self.active[key] = self.active.get(key, 0) + 1
+
+    def _release(self, key):
+        with self.lock:
+            self.active[key] -= 1
+            self.used[key] = time.monotonic()
+            self.wakeup()
+
+    def wakeup(self):
+        """
+        wakes the threads and coroutines waiting for a session. Called with
+        the lock held.
+        """
+        self.condition.notify_all()
+        for loop, waiter in self.waiters:
+            if loop.is_closed():
+                continue
+            loop.call_soon_threadsafe(
+                lambda waiter=waiter: waiter.done() or waiter.set_result(None))
+        self.waiters = []
+
+    @contextmanager
+    def session(self, user: str, host: str):
+        """
+        waits until less than max_sessions commands are executed on the host
+        and its master connection is not closed by evict(), and holds a
+        session while the block is executed. The sessions of threads and of
+        coroutines count against the same limit.
+
+        :param user: the user name
+        :param host: the host name
+        """
+        key = (user, host)
+        with self.condition:
+            self.condition.wait_for(lambda: self._free(key))
+            self._acquire(key)
+        try:
+            yield
+        finally:
+            self._release(key)
+
+    @asynccontextmanager
+    async def asession(self, user: str, host: str):
+        """
+        waits without blocking the event loop until a session on the host is
+        free and holds it while the block is executed, see session()
+
+        :param user: the user name
+        :param host: the host name
+        """
+        key = (user, host)
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.lock:
+                if self._free(key):
+                    self._acquire(key)
+                    break
+                waiter = loop.create_future()
+                self.waiters.append((loop, waiter))
+            await waiter
+        try:
+            yield
+        finally:
+            self._release(key)
+
+    def run(self, user: str, host: str, command: str, input: str = None,
+            timeout: float = None) -> subprocess.CompletedProcess:
+        """
+        executes the command on the host
+
+        :param user: the user name
+        :param host: the host name
+        :param command: the command executed by the shell of the host
+        :param input: the text send to stdin of the command
+        :param timeout: the timeout in seconds
+        :return: subprocess.CompletedProcess
+        """
+        if is_local(host):
+            return self.transport(["sh", "-c", command],
+                                  input=input, timeout=timeout)
+        self.evict()
+        with self.session(user, host):
+            return self.transport(self.ssh(user, host) + [command],
+                                  input=input, timeout=timeout)
+
+    def output(self, user: str, host: str, command: str,
+               timeout: float = None) -> str:
+        """
+        executes the command on the host and returns the output. Just as
+        Shell.run a RuntimeError is raised if the command fails.
+
+        :param user: the user name
+        :param host: the host name
+        :param command: the command executed by the shell of the host
+        :param timeout: the timeout in seconds
+        :return: str
+        """
+        r = self.run(user, host, command, timeout=timeout)
+        if r.returncode != 0:
+            raise RuntimeError(f"{r.returncode} {r.stdout}")
+        return r.stdout
+
+    def rsync(self, user: str, host: str, arguments: list, input: str = None,
+              timeout: float = None) -> subprocess.CompletedProcess:
+        """
+        executes rsync with the master connection of the host
+
+        :param user: the user name
+        :param host: the host name
+        :param arguments: the arguments of rsync
+        :param input: the text send to stdin of rsync
+        :param timeout: the timeout in seconds
+        :return: subprocess.CompletedProcess
+        """
+        with self.session(user, host):
+            return self.transport(["rsync", "-e", self.rsh(user, host)] +
+                                  arguments, input=input, timeout=timeout)
+
+    def stream(self, user: str, host: str, command: str,
+               chunk_size: int = 65536):
+        """
+        executes the command on the host and yields its output in chunks of
+        at most chunk_size bytes as they are received. A RuntimeError is
+        raised after the last chunk if the command fails. If the generator
+        is closed early, the command is killed.
+
+        :param user: the user name
+        :param host: the host name
+        :param command: the command executed by the shell of the host
+        :param chunk_size: the maximum number of bytes of a chunk
+        :return: generator of bytes
+        """
+        if is_local(host):
+            args = ["sh", "-c", command]
+            session = nullcontext()
+        else:
+            self.evict()
+            args = self.ssh(user, host) + [command]
+            session = self.session(user, host)
+        with session:
+            # stderr is not read as the master connection keeps it open
+            process = self.popen(args,
+                                 stdin=subprocess.DEVNULL,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL)
+            try:
+                for chunk in iter(lambda: process.stdout.read(chunk_size),
+                                  b""):
+                    yield chunk
+                if process.wait() != 0:
+                    raise RuntimeError(f"{process.returncode} {command}")
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+
+    async def arun(self, user: str, host: str, command: str,
+                   input: str = None,
+                   timeout: float = None) -> subprocess.CompletedProcess:
+        """
+        executes the command on the host with asyncio
+
+        :param user: the user name
+        :param host: the host name
+        :param command: the command executed by the shell of the host
+        :param input: the text send to stdin of the command
+        :param timeout: the timeout in seconds
+        :return: subprocess.CompletedProcess
+        """
+        if is_local(host):
+            return await self.atransport(["sh", "-c", command],
+                                         input=input, timeout=timeout)
+        self.evict()
+        async with self.asession(user, host):
+            return await self.atransport(self.ssh(user, host) + [command],
+                                         input=input, timeout=timeout)
+
+    async def aoutput(self, user: str, host: str, command: str,
+                      timeout: float = None) -> str:
+        """
+        executes the command on the host with asyncio and returns the
+        output. A RuntimeError is raised if the command fails.
+
+        :param user: the user name
+        :param host: the host name
+        :param command: the command executed by the shell of the host
+        :param timeout: the timeout in seconds
+        :return: str
+        """
+        r = await self.arun(user, host, command, timeout=timeout)
+        if r.returncode != 0:
+            raise RuntimeError(f"{r.returncode} {r.stdout}")
+        return r.stdout
+
+    def evict(self, idle: int = None) -> list:
+        """
+        closes the master connections that have no active session and were
+        not used for idle seconds. New sessions on such a host wait until
+        its master connection is closed.
+
+        :param idle: the idle seconds, by default the idle of the pool
+        :return: the list of (user, host) that were closed
+        """
+        idle = self.idle if idle is None else idle
+        now = time.monotonic()
+        with self.lock:
+            evicted = [key for key, used in self.used.items()
+                       if self.active[key] == 0 and now - used >= idle]
+            for key in evicted:
+                del self.used[key]
+                self.closing.add(key)
+        try:
+            for user, host in evicted:
+                self.transport(self.ssh(user, host)[:-1] +
+                               ["-O", "exit", f"{user}@{host}"])
+        finally:
+            with self.lock:
+                self.closing.difference_update(evicted)
+                self.wakeup()
+        return evicted
+
+    def close(self) -> list:
+        """
+        closes all master connections that have no active session
+
+        :return: the list of (user, host) that were closed
+        """
+        return self.evict(idle=0)
+
+
+pool = SSHPool()
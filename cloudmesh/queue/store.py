@@ -0,0 +1,1013 @@
+"""
+Storage engines for Queue and Cluster.
+
+A store keeps the records of a queue (jobs) or a cluster (hosts) as a dict of
+dicts that is keyed by the job name or the host id. All stores share the same
+small interface so that Queue and Cluster do not need to know how the records
+are persisted:
+
+    store = get_store("experiment/a-queue.yaml", storage="journal")
+    store["job1"] = {"name": "job1", "status": "ready"}
+    store.get("job1")
+    store.delete("job1")
+    store.keys()
+
+Mutations inside a batch are persisted once when the outermost batch ends
+
+    with store.batch():
+        for i in range(1000):
+            store[f"job{i}"] = {"name": f"job{i}", "status": "ready"}
+
+In write-behind mode the changed records are kept as pending and persisted
+together at most every write_behind seconds or when flush() is called
+
+    store.write_behind = 10
+    store["job1"] = {"name": "job1", "status": "run"}
+    store.flush()
+
+Several processes, e.g. the REST server and a scheduler, may use the same
+store. Each write increments the generation of the store and records it as
+the version of the changed records. A writer holds a lock on the file
+<filename>.generation, merges the changes of other processes written since
+its last read and then persists only its own changed records on top of
+them. reload() returns the records other processes have changed and does
+not read the records if the generation has not changed
+
+    changes = store.reload()
+
+The following engines are available
+
+    yaml     the whole yaml file is rewritten with yamldb on each mutation.
+             This is the default and the format used by previous releases.
+
+    journal  each mutation appends a single json record to the file
+             <filename>.journal. Once the journal contains compact_every
+             records, a yaml snapshot is written to <filename> and the
+             journal is truncated. The snapshot has the same format as the
+             yaml engine, so a journaled queue can always be read as yaml
+             after calling compact().
+
+    sqlite   the records are stored in the sqlite database <prefix>.db
+             next to the yaml file, e.g. a-queue.db for a-queue.yaml. The
+             fields status, host and user are indexed so find() does not
+             need to read all records. sqlite also serializes concurrent
+             writers such as the REST server and a scheduler process.
+"""
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # no file locking on windows
+    fcntl = None
+
+import jmespath
+from yamldb.YamlDB import YamlDB
+
+
+class YamlStore:
+    """
+    Stores the records in a yaml file managed by yamldb. Each mutation
+    rewrites the entire file. The generation and the versions of the
+    records are kept in <filename>.generation.
+    """
+
+    kind = "yaml"
+
+    def __init__(self, filename: str, write_behind: float = None):
+        self.filename = filename
+        self.batching = 0
+        self.pending = {}
+        self.foreign = {}
+        self.locked = False
+        self.write_behind = write_behind
+        self.flushed = time.time()
+        self.load()
+
+    @property
+    def generation_file(self):
+        return f"{self.filename}.generation"
+
+    def load(self, filename=None):
+        """
+        Loads the records from the file
+
+        :param filename: the name of the file, defaults to self.filename
+        :return: None
+        """
+        self.filename = filename or self.filename
+        with self.lock():
+            self.generation, self.compacted, self.versions = \
+                self.read_generation(versions=True)
+            self.db = YamlDB(filename=self.filename)
+            if self.db.data is None:
+                self.db.data = {}
+
+    @contextmanager
+    def lock(self):
+        """
+        Holds an exclusive lock on the generation file while the records
+        are read or written, so other processes never see a partial write.
+        Readers also take the exclusive lock as yamldb serializes all
+        access to a file. Nested locks of the same store are taken once.
+        """
+        if self.locked:
+            yield
+            return
+        directory = os.path.dirname(self.generation_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+        with open(self.generation_file, "a+") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            self.locked = True
+            try:
+                yield
+            finally:
+                self.locked = False
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def read_generation(self, versions=False):
+        """
+        Reads the generation file. Its first line holds the generation and
+        the number of compactions, the second line the versions of the
+        records as json.
+
+        :param versions: if True the versions are read
+        :return: generation, compactions, dict of versions
+        """
+        try:
+            with open(self.generation_file) as f:
+                generation, compacted = [int(value) for value in
+                                         f.readline().split()]
+                records = json.loads(f.readline() or "{}") if versions else {}
+        except (OSError, ValueError):
+            return 0, 0, {}
+        return generation, compacted, records
+
+    def write_generation(self, versions=True):
+        """
+        Writes the generation file. The first line has a fixed width so it
+        can be updated without rewriting the versions.
+
+        :param versions: if True the versions are written as well
+        :return: None
+        """
+        header = f"{self.generation} {self.compacted}".ljust(40) + "\n"
+        if versions:
+            with open(self.generation_file, "w") as f:
+                f.write(header + json.dumps(self.versions) + "\n")
+        else:
+            with open(self.generation_file, "r+") as f:
+                f.write(header)
+
+    def stale(self) -> bool:
+        """
+        Returns True if another process has written the store since it was
+        read or written by this process
+
+        :return: bool
+        """
+        generation, compacted, versions = self.read_generation()
+        return (generation, compacted) != (self.generation, self.compacted)
+
+    def merge(self):
+        """
+        Reads the records written by other processes and keeps the changes
+        of this process that are not yet persisted on top of them. The
+        records changed by other processes are collected in self.foreign.
+
+        :return: None
+        """
+        data = dict(self.data)
+        versions = self.versions
+        self.load()
+        for key, value in self.data.items():
+            if key not in data or self.versions.get(key) != versions.get(key):
+                self.foreign[key] = value
+        for key in data:
+            if key not in self.data:
+                self.foreign[key] = None
+        self.reapply()
+
+    def reapply(self):
+        for key, value in self.pending.items():
+            self.foreign.pop(key, None)
+            if value is None:
+                self.data.pop(key, None)
+            else:
+                self.data[key] = value
+
+    def reload(self) -> dict:
+        """
+        Returns the records other processes have changed since the last
+        call. The records are only read if the generation has changed.
+
+        :return: dict of changed records, None marks a deletion
+        """
+        with self.lock():
+            if self.stale():
+                self.merge()
+        changes = self.foreign
+        self.foreign = {}
+        return changes
+
+    def version(self, key) -> int:
+        """
+        Returns the generation in which the record was last written
+
+        :param key: the name of the record
+        :return: int
+        """
+        return self.versions.get(key, 0)
+
+    @property
+    def data(self):
+        return self.db.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self):
+        return iter(self.data)
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def keys(self):
+        return list(self.data.keys())
+
+    def items(self):
+        return self.data.items()
+
+    def values(self):
+        return self.data.values()
+
+    def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    def set(self, key, value):
+        """
+        Sets the record with the given key and persists it
+
+        :param key: the name of the record
+        :param value: the record as dict
+        :return: None
+        """
+        self.data[key] = value
+        self.changed({key: value})
+
+    def add(self, key, value):
+        self.set(key, value)
+
+    def update(self, records: dict):
+        """
+        Sets multiple records and persists them with a single write
+
+        :param records: dict of records
+        :return: None
+        """
+        self.data.update(records)
+        self.changed(records)
+
+    def delete(self, key):
+        """
+        Deletes the record with the given key and persists the change
+
+        :param key: the name of the record
+        :return: None
+        """
+        del self.data[key]
+        self.changed({key: None})
+
+    def search(self, query):
+        return jmespath.search(query, self.data)
+
+    def find(self, **fields):
+        """
+        Returns the records whose fields have the given values, e.g.
+        find(status="ready", host="red")
+
+        :param fields: the field values to match
+        :return: dict of matching records
+        """
+        return {key: value for key, value in self.data.items()
+                if all(value.get(field) == v for field, v in fields.items())}
+
+    @contextmanager
+    def batch(self):
+        """
+        Collects all mutations and persists them once when the outermost
+        batch ends. Changes made before an exception are still persisted.
+        """
+        self.batching += 1
+        try:
+            yield self
+        finally:
+            self.batching -= 1
+            if self.batching == 0 and self.due():
+                self.flush()
+
+    def due(self) -> bool:
+        """
+        Returns True if the pending changes have to be persisted now. In
+        write-behind mode this is the case once write_behind seconds have
+        passed since the last flush.
+
+        :return: bool
+        """
+        return self.write_behind is None or \
+            time.time() - self.flushed >= self.write_behind
+
+    def changed(self, changes):
+        """
+        Persists the changes or keeps them until the batch ends or, in
+        write-behind mode, until the next flush
+
+        :param changes: dict of changed records, None marks a deletion
+        :return: None
+        """
+        self.pending.update(changes)
+        if not self.batching and self.due():
+            self.flush()
+
+    def flush(self):
+        """
+        Persists the pending changes
+
+        :return: None
+        """
+        if self.pending:
+            self.write(self.pending)
+            self.pending = {}
+        self.flushed = time.time()
+
+    def write(self, changes):
+        """
+        Persists the changes on top of the records written by other
+        processes. The yaml store writes all records.
+
+        :param changes: dict of changed records, None marks a deletion
+        :return: None
+        """
+        with self.lock():
+            if self.stale():
+                self.merge()
+            self.generation += 1
+            for key, value in changes.items():
+                if value is None:
+                    self.versions.pop(key, None)
+                else:
+                    self.versions[key] = self.generation
+            self.db.save(self.filename)
+            self.write_generation()
+
+    def save(self, filename=None):
+        """
+        Writes all records to the file
+
+        :param filename: the name of the file, defaults to self.filename
+        :return: None
+        """
+        if filename is not None and filename != self.filename:
+            self.db.save(filename)
+            return
+        with self.lock():
+            if self.stale():
+                self.merge()
+            self.db.save(self.filename)
+
+    def compact(self):
+        """
+        Nothing to compact for a yaml store
+
+        :return: None
+        """
+        pass
+
+    def remove(self):
+        """
+        Deletes the files of the store
+
+        :return: None
+        """
+        for filename in [self.filename, self.generation_file]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+
+class JournalStore(YamlStore):
+    """
+    Stores the records in a yaml snapshot and an append-only journal. Each
+    mutation appends one json line to the journal. Every compact_every
+    records the journal is folded into a new snapshot.
+    """
+
+    kind = "journal"
+
+    def __init__(self, filename: str, write_behind: float = None,
+                 compact_every: int = 1000):
+        self.journal = f"{filename}.journal"
+        self.compact_every = compact_every
+        self.records = 0
+        YamlStore.__init__(self, filename, write_behind=write_behind)
+
+    def load(self, filename=None):
+        """
+        Loads the snapshot and replays the journal on top of it
+
+        :param filename: the name of the snapshot, defaults to self.filename
+        :return: None
+        """
+        self.filename = filename or self.filename
+        self.journal = f"{self.filename}.journal"
+        with self.lock():
+            YamlStore.load(self)
+            self.records = 0
+            self.offset = 0
+            if not os.path.exists(self.journal):
+                open(self.journal, "a").close()
+            self.replay()
+
+    def replay(self) -> dict:
+        """
+        Applies the journal records appended since the last read. A
+        partially written last line is left for the next read.
+
+        :return: dict of the changed records, None marks a deletion
+        """
+        with open(self.journal, "rb") as f:
+            f.seek(self.offset)
+            content = f.read()
+        end = content.rfind(b"\n") + 1
+        changes = {}
+        for line in content[:end].splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # a partially written line from an interrupted write
+                continue
+            key = record["key"]
+            if record["op"] == "set":
+                self.data[key] = record["value"]
+                self.versions[key] = record.get("generation", 0)
+            elif record["op"] == "delete":
+                self.data.pop(key, None)
+                self.versions.pop(key, None)
+            changes[key] = self.data.get(key)
+            self.records += 1
+        self.offset += end
+        return changes
+
+    def merge(self):
+        """
+        Replays the journal records other processes have appended. The
+        snapshot is only read again if the journal has been compacted.
+
+        :return: None
+        """
+        generation, compacted, versions = self.read_generation()
+        if compacted == self.compacted and \
+                os.path.getsize(self.journal) >= self.offset:
+            self.foreign.update(self.replay())
+            self.generation = generation
+            self.reapply()
+        else:
+            YamlStore.merge(self)
+
+    def write(self, changes):
+        """
+        Appends one record per change to the journal and compacts the
+        journal if it has grown beyond compact_every records.
+
+        :param changes: dict of changed records, None marks a deletion
+        :return: None
+        """
+        with self.lock():
+            if self.stale():
+                self.merge()
+            self.generation += 1
+            lines = []
+            for key, value in changes.items():
+                if value is None:
+                    record = {"op": "delete", "key": key}
+                    self.versions.pop(key, None)
+                else:
+                    record = {"op": "set", "key": key, "value": value}
+                    self.versions[key] = self.generation
+                record["generation"] = self.generation
+                lines.append(json.dumps(record) + "\n")
+            if os.path.getsize(self.journal) > self.offset:
+                # terminate a partially written line
+                lines.insert(0, "\n")
+            with open(self.journal, "a") as f:
+                f.write("".join(lines))
+            self.offset = os.path.getsize(self.journal)
+            self.records += len(changes)
+            self.write_generation(versions=False)
+            if self.records >= self.compact_every:
+                self.compact()
+
+    def save(self, filename=None):
+        """
+        All changes are already in the journal. If a different filename
+        is given a snapshot is written to it.
+
+        :param filename: the name of the file, defaults to self.filename
+        :return: None
+        """
+        if filename is not None and filename != self.filename:
+            self.db.save(filename)
+
+    def compact(self):
+        """
+        Writes a snapshot of all records and truncates the journal. Replaying
+        a journal on top of a newer snapshot yields the same records, so an
+        interruption between the two steps does not lose data.
+
+        :return: None
+        """
+        with self.lock():
+            if self.stale():
+                self.merge()
+            tmp = f"{self.filename}.tmp"
+            self.db.save(tmp)
+            os.replace(tmp, self.filename)
+            open(self.journal, "w").close()
+            self.records = 0
+            self.offset = 0
+            self.compacted += 1
+            self.write_generation()
+
+    def remove(self):
+        """
+        Deletes the snapshot and the journal
+
+        :return: None
+        """
+        YamlStore.remove(self)
+        if os.path.exists(self.journal):
+            os.remove(self.journal)
+
+
+class SqliteStore:
+    """
+    Stores the records in a sqlite database. The status, host and user
+    fields of each record are kept in indexed columns, the record itself
+    is stored as json. Each record also keeps the generation in which it
+    was written and deletions are kept in the table deleted, so reload()
+    only reads the records changed since the last call. Changed records
+    are kept as pending until they are committed in one short transaction,
+    so other processes can write the database in between.
+    """
+
+    kind = "sqlite"
+
+    indexed = ["status", "host", "user"]
+
+    def __init__(self, filename: str, write_behind: float = None):
+        self.filename = filename
+        self.batching = 0
+        self.pending = {}
+        self.writing = None
+        self.write_behind = write_behind
+        self.flushed = time.time()
+        self.load()
+
+    def load(self, filename=None):
+        """
+        Opens the database that belongs to the file
+
+        :param filename: the name of the file, defaults to self.filename
+        :return: None
+        """
+        self.filename = filename or self.filename
+        self.database = database_name(self.filename)
+        directory = os.path.dirname(self.database)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(self.database,
+                                          timeout=30,
+                                          isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS records ("
+            "key TEXT PRIMARY KEY, "
+            "status TEXT, host TEXT, user TEXT, "
+            "value TEXT NOT NULL, "
+            "generation INTEGER NOT NULL DEFAULT 0)")
+        columns = [row[1] for row in self._rows("PRAGMA table_info(records)")]
+        if "generation" not in columns:
+            # databases created before records had a generation
+            self.connection.execute(
+                "ALTER TABLE records "
+                "ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+        for column in self.indexed + ["generation"]:
+            self.connection.execute(
+                f"CREATE INDEX IF NOT EXISTS records_{column} "
+                f"ON records ({column})")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS deleted ("
+            "key TEXT PRIMARY KEY, generation INTEGER NOT NULL)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS meta ("
+            "name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.connection.execute(
+            "INSERT OR IGNORE INTO meta (name, value) "
+            "VALUES ('generation', 0)")
+        self.generation = self.read_generation()
+
+    def read_generation(self) -> int:
+        return self._rows(
+            "SELECT value FROM meta WHERE name='generation'")[0][0]
+
+    def next_generation(self) -> int:
+        """
+        Returns the generation of the open transaction. The generation is
+        incremented once per transaction.
+
+        :return: int
+        """
+        if self.writing is None:
+            generation = self.read_generation()
+            self.writing = generation + 1
+            self.connection.execute(
+                "UPDATE meta SET value=? WHERE name='generation'",
+                (self.writing,))
+            if generation == self.generation:
+                # no other process has written since the last reload
+                self.generation = self.writing
+        return self.writing
+
+    def reload(self) -> dict:
+        """
+        Returns the records other processes have changed since the last
+        call. Only the records with a newer generation are read.
+
+        :return: dict of changed records, None marks a deletion
+        """
+        generation = self.read_generation()
+        if generation == self.generation:
+            return {}
+        changes = {}
+        for key, in self._rows("SELECT key FROM deleted WHERE generation>?",
+                               (self.generation,)):
+            changes[key] = None
+        for key, value in self._rows(
+                "SELECT key, value FROM records WHERE generation>? "
+                "ORDER BY rowid", (self.generation,)):
+            changes[key] = json.loads(value)
+        self.generation = generation
+        for key in self.pending:
+            # the changes of this process are written on top of them
+            changes.pop(key, None)
+        return changes
+
+    def version(self, key) -> int:
+        """
+        Returns the generation in which the record was last written
+
+        :param key: the name of the record
+        :return: int
+        """
+        rows = self._rows("SELECT generation FROM records WHERE key=?", (key,))
+        return rows[0][0] if rows else 0
+
+    def _rows(self, sql, parameters=()):
+        return self.connection.execute(sql, parameters).fetchall()
+
+    @property
+    def data(self):
+        return dict(self.items())
+
+    def __len__(self):
+        count = self._rows("SELECT COUNT(*) FROM records")[0][0]
+        if self.pending:
+            committed = self._rowids(list(self.pending))
+            for key, value in self.pending.items():
+                if value is None and key in committed:
+                    count -= 1
+                elif value is not None and key not in committed:
+                    count += 1
+        return count
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, key):
+        if key in self.pending:
+            return self.pending[key] is not None
+        return len(self._rows("SELECT 1 FROM records WHERE key=?",
+                              (key,))) > 0
+
+    def __getitem__(self, key):
+        if key in self.pending:
+            if self.pending[key] is None:
+                raise KeyError(key)
+            return self.pending[key]
+        rows = self._rows("SELECT value FROM records WHERE key=?", (key,))
+        if not rows:
+            raise KeyError(key)
+        return json.loads(rows[0][0])
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def keys(self):
+        return [key for key, value in self.items()]
+
+    def items(self):
+        """
+        Returns the committed records with the pending changes on top of
+        them. New records follow the committed ones.
+
+        :return: list of key and record
+        """
+        return self.overlay(self._rows(
+            "SELECT key, value, rowid FROM records ORDER BY rowid"))
+
+    def overlay(self, rows, **fields) -> list:
+        """
+        Applies the pending changes to the rows read from the database.
+        Only the pending records whose fields have the given values are
+        added.
+
+        :param rows: list of key, json value and rowid ordered by rowid
+        :param fields: the field values to match
+        :return: list of key and record
+        """
+        if not self.pending:
+            return [(key, json.loads(value)) for key, value, rowid in rows]
+        result = [(rowid, key, json.loads(value)) for key, value, rowid in rows
+                  if key not in self.pending]
+        matching = [key for key, value in self.pending.items()
+                    if value is not None and
+                    all(value.get(field) == v for field, v in fields.items())]
+        # committed records keep their place, new records follow them
+        rowids = self._rowids(matching)
+        last = float("inf")
+        result.extend((rowids.get(key, last), key, self.pending[key])
+                      for key in matching)
+        result.sort(key=lambda item: item[0])
+        return [(key, value) for rowid, key, value in result]
+
+    def _rowids(self, keys: list) -> dict:
+        rowids = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rowids.update(self._rows(
+                "SELECT key, rowid FROM records WHERE key IN "
+                f"({','.join('?' * len(chunk))})", chunk))
+        return rowids
+
+    def values(self):
+        return [value for key, value in self.items()]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def set(self, key, value):
+        self.update({key: value})
+
+    def add(self, key, value):
+        self.set(key, value)
+
+    def update(self, records: dict):
+        """
+        Sets multiple records. They are committed in a single transaction.
+
+        :param records: dict of records
+        :return: None
+        """
+        self.changed(records)
+
+    def delete(self, key):
+        """
+        Deletes the record with the given key
+
+        :param key: the name of the record
+        :return: None
+        """
+        if key not in self:
+            raise KeyError(key)
+        self.changed({key: None})
+
+    @contextmanager
+    def batch(self):
+        """
+        Collects all mutations and commits them in a single transaction
+        when the outermost batch ends. Changes made before an exception are
+        still committed.
+        """
+        self.batching += 1
+        try:
+            yield self
+        finally:
+            self.batching -= 1
+            if self.batching == 0 and self.due():
+                self.flush()
+
+    def due(self) -> bool:
+        return YamlStore.due(self)
+
+    def changed(self, changes):
+        """
+        Commits the changes or keeps them until the batch ends or, in
+        write-behind mode, until the next flush. Readers in this process
+        see the changes right away.
+
+        :param changes: dict of changed records, None marks a deletion
+        :return: None
+        """
+        self.pending.update(changes)
+        if not self.batching and self.due():
+            self.flush()
+
+    def flush(self):
+        """
+        Commits the pending changes in one transaction. The write lock of
+        the database is only held while they are written.
+
+        :return: None
+        """
+        if self.pending:
+            self.write(self.pending)
+            self.pending = {}
+        self.flushed = time.time()
+
+    def write(self, changes):
+        """
+        Writes the changes in a single transaction
+
+        :param changes: dict of changed records, None marks a deletion
+        :return: None
+        """
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            generation = self.next_generation()
+            self.connection.executemany(
+                "INSERT INTO records "
+                "(key, status, host, user, value, generation) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET "
+                "status=excluded.status, host=excluded.host, "
+                "user=excluded.user, value=excluded.value, "
+                "generation=excluded.generation",
+                [(key,
+                  value.get("status"), value.get("host"), value.get("user"),
+                  json.dumps(value), generation)
+                 for key, value in changes.items() if value is not None])
+            deleted = [(key, generation) for key, value in changes.items()
+                       if value is None]
+            self.connection.executemany("DELETE FROM records WHERE key=?",
+                                        [(key,) for key, _ in deleted])
+            self.connection.executemany(
+                "INSERT INTO deleted (key, generation) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET "
+                "generation=excluded.generation",
+                deleted)
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        finally:
+            self.writing = None
+
+    def search(self, query):
+        return jmespath.search(query, self.data)
+
+    def find(self, **fields):
+        """
+        Returns the records whose fields have the given values. The fields
+        status, host and user are looked up with an index.
+
+        :param fields: the field values to match
+        :return: dict of matching records
+        """
+        where = []
+        parameters = []
+        for field in self.indexed:
+            if field in fields:
+                if fields[field] is None:
+                    where.append(f"{field} IS NULL")
+                else:
+                    where.append(f"{field}=?")
+                    parameters.append(fields[field])
+        sql = "SELECT key, value, rowid FROM records"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY rowid"
+        result = {}
+        for key, value in self.overlay(self._rows(sql, parameters), **fields):
+            if all(value.get(field) == v for field, v in fields.items()):
+                result[key] = value
+        return result
+
+    def save(self, filename=None):
+        """
+        All changes are already committed. If a different filename is
+        given the records are exported to it as yaml.
+
+        :param filename: the name of the file, defaults to self.filename
+        :return: None
+        """
+        if filename is not None and filename != self.filename:
+            YamlDB(filename=filename, data=self.data).save(filename)
+
+    def compact(self):
+        """
+        Reclaims the space of deleted records
+
+        :return: None
+        """
+        self.flush()
+        self.connection.execute("VACUUM")
+
+    def remove(self):
+        """
+        Closes and deletes the database
+
+        :return: None
+        """
+        self.pending = {}
+        self.writing = None
+        self.connection.close()
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.exists(self.database + suffix):
+                os.remove(self.database + suffix)
+
+
+stores = {
+    "yaml": YamlStore,
+    "journal": JournalStore,
+    "sqlite": SqliteStore,
+}
+
+
+def database_name(filename: str) -> str:
+    """
+    Returns the name of the sqlite database for the given file, e.g.
+    experiment/a-queue.db for experiment/a-queue.yaml
+
+    :param filename: the name of the file
+    :return: the name of the database
+    """
+    return f"{os.path.splitext(filename)[0]}.db"
+
+
+def exists(filename: str) -> bool:
+    """
+    Checks if a queue or cluster has been stored in the file with any of the
+    storage engines
+
+    :param filename: the name of the file
+    :return: True if it exists
+    """
+    return os.path.exists(filename) or os.path.exists(database_name(filename))
+
+
+def detect_storage(filename: str) -> str:
+    """
+    Detects the storage engine used for the given file
+
+    :param filename: the name of the file
+    :return: the name of the storage engine
+    """
+    if os.path.exists(f"{filename}.journal"):
+        return "journal"
+    if not os.path.exists(filename) and os.path.exists(database_name(filename)):
+        return "sqlite"
+    return "yaml"
+
+
+def get_store(filename: str, storage: str = None, write_behind: float = None):
+    """
+    Returns a store for the given file. If no storage engine is specified
+    it is detected from the files present on disk.
+
+    :param filename: the name of the file
+    :param storage: the name of the storage engine
+    :param write_behind: if given, changes are persisted at most every
+                         write_behind seconds and on flush()
+    :return: the store
+    """
+    storage = storage or detect_storage(filename)
+    if storage not in stores:
+        raise ValueError(f"Unknown storage: {storage}. "
+                         f"Use one of {', '.join(stores)}")
+    return stores[storage](filename, write_behind=write_behind)
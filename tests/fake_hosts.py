@@ -0,0 +1,142 @@
+###############################################################
+# transports of the ssh pool used by the tests instead of ssh
+#
+#   ssh.pool = SSHPool(transport=LocalHosts(), control_dir=...)
+#   ssh.pool = SSHPool(transport=FakeHosts(), control_dir=...)
+#   ssh.pool = SSHPool(transport=FakeTransport({"hostname": "red\n"}), ...)
+#   ssh.pool = SSHPool(atransport=AsyncFakeHosts(), control_dir=...)
+###############################################################
+import asyncio
+import subprocess
+import threading
+import time
+
+from cloudmesh.queue.ssh import subprocess_transport
+
+
+class LocalHosts:
+    """
+    executes the commands for the remote hosts locally and records the
+    commands with their input
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    @property
+    def commands(self):
+        return [command for command, input in self.calls]
+
+    def __call__(self, args, input=None, timeout=None):
+        self.calls.append((args[-1], input))
+        return subprocess_transport(["sh", "-c", args[-1]], input=input,
+                                    timeout=timeout)
+
+
+class FakeTransport:
+    """
+    records the argument lists and returns the output of the first
+    response whose text is contained in the remote command
+    """
+
+    def __init__(self, responses=None, delay=0):
+        self.responses = responses or {}
+        self.delay = delay
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, args, input=None, timeout=None):
+        with self.lock:
+            self.calls.append(args)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        for text, stdout in self.responses.items():
+            if text in args[-1]:
+                return subprocess.CompletedProcess(args, 0, stdout=stdout)
+        return subprocess.CompletedProcess(args, 0, stdout="")
+
+
+def answer(args, input=None, present=""):
+    """
+    returns the output of a remote command as if the jobs on the host had
+    ended:
+
+    * rsync prints nothing
+    * hostname prints the name of the host
+    * the ls of Host.stage prints the directories and blobs in present
+    * cat of a pid file prints a pid
+    * the state command prints the state end for every log file
+    * the cleanup script prints the kill message of every job
+
+    :param args: the argument list of the transport
+    :param input: the text send to stdin
+    :param present: the directories and blobs already present on the host
+    :return: str
+    """
+    command = args[-1]
+    if args[0] == "rsync":
+        return ""
+    if command == "hostname":
+        return f"{args[-2].split('@')[1]}\n"
+    if command.startswith("mkdir"):
+        return present
+    if command.startswith("cat") and command.endswith(".pid"):
+        return "4711"
+    if input and "while read" in command:
+        return "".join(f"{line.split(' ', 1)[1]}:# cloudmesh state: end\n"
+                       for line in input.splitlines())
+    if input and "cloudmesh kill" in input:
+        return "".join(f"{line.split('echo ')[-1].strip(chr(39))}\n"
+                       for line in input.splitlines()
+                       if "cloudmesh kill" in line)
+    return ""
+
+
+class FakeHosts:
+    """
+    records the argument lists with their input and answers them, see
+    answer()
+    """
+
+    def __init__(self, present=""):
+        self.present = present
+        self.calls = []
+
+    def __call__(self, args, input=None, timeout=None):
+        self.calls.append((args, input))
+        return subprocess.CompletedProcess(
+            args, 0, stdout=answer(args, input, self.present))
+
+
+class AsyncFakeHosts:
+    """
+    records the argument lists with their input and answers them after a
+    delay, see answer(). max_active is the largest number of concurrent
+    commands on one host and max_total on all hosts.
+    """
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+        self.active = {}
+        self.max_active = 0
+        self.total = 0
+        self.max_total = 0
+
+    async def __call__(self, args, input=None, timeout=None):
+        name = args[-2].split("@")[1]
+        self.calls.append((args, input))
+        self.active[name] = self.active.get(name, 0) + 1
+        self.max_active = max(self.max_active, self.active[name])
+        self.total += 1
+        self.max_total = max(self.max_total, self.total)
+        await asyncio.sleep(self.delay)
+        self.active[name] -= 1
+        self.total -= 1
+        return subprocess.CompletedProcess(args, 0,
+                                           stdout=answer(args, input))
@@ -7,6 +7,7 @@
 # pytest -v --capture=no  tests/test_02_queue.py::TestSSHJob::<METHODNAME>
 ###############################################################
 import getpass
+import time
 from pprint import pprint
 
 import pytest
@@ -130,6 +131,11 @@ class TestQueue:
         job.run()
         job = jobs[1]
         job.run()
+        # wait for both jobs as refresh does not block on running jobs
+        for _ in range(50):
+            if jobs[0].state == 'end' and jobs[1].state == 'end':
+                break
+            time.sleep(0.1)
         queue.refresh()
         result = queue.info(banner="Queue", kind="jobs")
         print(result)
@@ -0,0 +1,177 @@
+###############################################################
+# pytest -v --capture=no tests/test_10_store.py
+# pytest -v  tests/test_10_store.py
+# pytest -v --capture=no  tests/test_10_store.py::TestStore::<METHODNAME>
+###############################################################
+import os
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+from cloudmesh.common.util import readfile
+
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.store import JournalStore
+from cloudmesh.queue.store import SqliteStore
+from cloudmesh.queue.store import YamlStore
+from cloudmesh.queue.store import detect_storage
+from cloudmesh.queue.store import exists
+
+Benchmark.debug()
+
+experiment = "./store_experiment"
+n = 100
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def record(i, status="ready"):
+    return {"name": f"job{i}", "status": status, "command": "uname"}
+
+
+@pytest.mark.incremental
+class TestStore:
+
+    def test_yaml(self):
+        HEADING()
+        filename = f"{experiment}/yaml-queue.yaml"
+        Benchmark.Start()
+        store = YamlStore(filename)
+        for i in range(n):
+            store.set(f"job{i}", record(i))
+        store.delete("job0")
+        Benchmark.Stop()
+        assert len(store) == n - 1
+        assert detect_storage(filename) == "yaml"
+        assert "job1:" in readfile(filename)
+        assert YamlStore(filename).keys() == store.keys()
+
+    def test_journal(self):
+        HEADING()
+        filename = f"{experiment}/journal-queue.yaml"
+        Benchmark.Start()
+        store = JournalStore(filename)
+        for i in range(n):
+            store.set(f"job{i}", record(i))
+        store.set("job1", record(1, status="end"))
+        store.delete("job0")
+        Benchmark.Stop()
+        assert detect_storage(filename) == "journal"
+        assert len(readfile(f"{filename}.journal").splitlines()) == n + 2
+
+        loaded = JournalStore(filename)
+        assert loaded.keys() == store.keys()
+        assert loaded.get("job1")["status"] == "end"
+        assert "job0" not in loaded
+
+    def test_journal_compact(self):
+        HEADING()
+        filename = f"{experiment}/compact-queue.yaml"
+        store = JournalStore(filename, compact_every=10)
+        for i in range(25):
+            store.set(f"job{i}", record(i))
+        assert store.records == 5
+        assert "job19:" in readfile(filename)
+        assert "job20:" not in readfile(filename)
+
+        store.compact()
+        assert readfile(f"{filename}.journal") == ""
+        assert JournalStore(filename).keys() == store.keys()
+
+    def test_sqlite(self):
+        HEADING()
+        filename = f"{experiment}/sqlite-queue.yaml"
+        Benchmark.Start()
+        store = SqliteStore(filename)
+        store.update({f"job{i}": record(i) for i in range(n)})
+        store.set("job1", record(1, status="end"))
+        store.delete("job0")
+        Benchmark.Stop()
+        assert not os.path.exists(filename)
+        assert exists(filename)
+        assert detect_storage(filename) == "sqlite"
+
+        loaded = SqliteStore(filename)
+        assert loaded.keys() == [f"job{i}" for i in range(1, n)]
+        assert loaded["job1"]["status"] == "end"
+        assert list(loaded.find(status="end")) == ["job1"]
+        assert len(loaded.find(status="ready")) == n - 2
+        assert loaded.find(status="ready", name="job2") == {"job2": record(2)}
+        with pytest.raises(KeyError):
+            loaded.delete("job0")
+
+        loaded.remove()
+        assert not exists(filename)
+
+    def test_batch(self):
+        HEADING()
+        filename = f"{experiment}/batch-queue.yaml"
+        store = YamlStore(filename)
+        Benchmark.Start()
+        with store.batch():
+            for i in range(n):
+                store.set(f"job{i}", record(i))
+            with store.batch():
+                store.delete("job0")
+            assert "job1:" not in readfile(filename)
+        Benchmark.Stop()
+        assert "job1:" in readfile(filename)
+        assert "job0:" not in readfile(filename)
+
+        filename = f"{experiment}/batch-journal-queue.yaml"
+        store = JournalStore(filename)
+        with store.batch():
+            for i in range(n):
+                store.set(f"job{i}", record(i))
+                store.set(f"job{i}", record(i, status="end"))
+        assert len(readfile(f"{filename}.journal").splitlines()) == n
+
+        filename = f"{experiment}/batch-sqlite-queue.yaml"
+        store = SqliteStore(filename)
+        with store.batch():
+            for i in range(n):
+                store.set(f"job{i}", record(i))
+        assert len(SqliteStore(filename)) == n
+
+    def test_queue(self):
+        HEADING()
+        jobs = [Job(name=f"job{i}", command="uname", experiment=experiment)
+                for i in range(10)]
+        queue = Queue(name="q", experiment=experiment, storage="journal",
+                      jobs=jobs)
+        assert queue.storage == "journal"
+        assert len(queue) == 10
+
+        queue = Queue(name="q", experiment=experiment)
+        assert queue.storage == "journal"
+        assert len(queue) == 10
+        queue.delete("job0")
+        assert len(Queue(name="q", experiment=experiment)) == 9
+
+    def test_queue_sqlite(self):
+        HEADING()
+        jobs = [Job(name=f"job{i}", command="uname", experiment=experiment)
+                for i in range(10)]
+        queue = Queue(name="s", experiment=experiment, storage="sqlite",
+                      jobs=jobs)
+        queue = Queue(name="s", experiment=experiment)
+        assert queue.storage == "sqlite"
+        assert len(queue) == 10
+        assert list(queue.find(name="job3")) == ["job3"]
+        assert "job9" in queue.to_dict()["jobs"]
+
+    def test_unknown(self):
+        HEADING()
+        with pytest.raises(ValueError):
+            Queue(name="u", experiment=experiment, storage="unknown")
+
+    def test_cleanup(self):
+        HEADING()
+        shutil.rmtree(experiment, ignore_errors=True)
+        assert not os.path.exists(experiment)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
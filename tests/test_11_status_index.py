@@ -0,0 +1,105 @@
+###############################################################
+# pytest -v --capture=no tests/test_11_status_index.py
+# pytest -v  tests/test_11_status_index.py
+# pytest -v --capture=no  tests/test_11_status_index.py::TestStatusIndex::<METHODNAME>
+###############################################################
+import getpass
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import SchedulerFIFO
+from cloudmesh.queue.jobqueue import SchedulerFIFOMultiHost
+from cloudmesh.queue.jobqueue import Host
+from cloudmesh.queue.jobqueue import StatusIndex
+
+Benchmark.debug()
+
+host = "localhost"
+user = getpass.getuser()
+experiment = "./index_experiment"
+n = 1000
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+@pytest.mark.incremental
+class TestStatusIndex:
+
+    def test_index(self):
+        HEADING()
+        Benchmark.Start()
+        index = StatusIndex((f"job{i}", {"status": "ready"}) for i in range(n))
+        for i in range(0, n, 2):
+            index.set(f"job{i}", "run")
+        Benchmark.Stop()
+        assert index.first("ready") == "job1"
+        assert index.count("ready") == n // 2
+        assert index.names("run")[:2] == ["job0", "job2"]
+
+        index.set("job0", "ready")
+        assert index.first("ready") == "job1"
+        assert index.names("ready")[-1] == "job0"
+
+        index.delete("job1")
+        assert "job1" not in index
+        assert index.first("ready") == "job3"
+        assert index.first("undefined") is None
+
+    def test_first_in_queue_order(self):
+        HEADING()
+        index = StatusIndex([("a", {"status": "ready"}),
+                             ("b", {"status": "undefined"}),
+                             ("c", {"status": "ready"})])
+        assert index.first("undefined", "ready") == "a"
+        index.set("a", "run")
+        assert index.first("undefined", "ready") == "b"
+
+    def test_order_after_delete(self):
+        HEADING()
+        index = StatusIndex([("a", {"status": "ready"}),
+                             ("b", {"status": "run"}),
+                             ("c", {"status": "ready"})])
+        index.delete("a")
+        index.set("d", "run")
+        assert index.firsts(3, "run", "ready") == ["b", "c", "d"]
+        index.set("b", "end")
+        assert index.first("run", "ready") == "c"
+
+    def test_fifo_next(self):
+        HEADING()
+        jobs = [Job(name=f"job{i}", command="uname", user=user, host=host,
+                    experiment=experiment) for i in range(5)]
+        jobs[0].status = "end"
+        scheduler = SchedulerFIFO(name="a", experiment=experiment, jobs=jobs)
+        assert scheduler.index.count("ready") == 4
+
+        job = Job(**scheduler.__next__())
+        assert job.name == "job1"
+        job.status = "run"
+        scheduler.set(job)
+        assert scheduler.__next__()["name"] == "job2"
+        assert scheduler.index.names("run") == ["job1"]
+
+        scheduler.delete("job2")
+        assert scheduler.__next__()["name"] == "job3"
+
+    def test_fifo_multi_next(self):
+        HEADING()
+        jobs = [Job(name=f"job{i}", command="uname", experiment=experiment)
+                for i in range(3)]
+        scheduler = SchedulerFIFOMultiHost(name="b", experiment=experiment,
+                                           jobs=jobs,
+                                           hosts=[Host(name=host, user=user)])
+        assert scheduler.__next__()["name"] == "job0"
+
+    def test_cleanup(self):
+        HEADING()
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
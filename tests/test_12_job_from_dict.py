@@ -0,0 +1,78 @@
+###############################################################
+# pytest -v --capture=no tests/test_12_job_from_dict.py
+# pytest -v  tests/test_12_job_from_dict.py
+# pytest -v --capture=no  tests/test_12_job_from_dict.py::TestJobFromDict::<METHODNAME>
+###############################################################
+import getpass
+import os
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+
+Benchmark.debug()
+
+host = "localhost"
+user = getpass.getuser()
+experiment = "./record_experiment"
+n = 1000
+
+shutil.rmtree(experiment, ignore_errors=True)
+queue = Queue(name="a", experiment=experiment)
+
+
+@pytest.mark.incremental
+class TestJobFromDict:
+
+    def test_from_dict(self):
+        HEADING()
+        Benchmark.Start()
+        with queue.batch():
+            for i in range(n):
+                queue.add(Job.from_dict({"name": f"job{i}",
+                                         "command": "uname",
+                                         "user": user,
+                                         "host": host,
+                                         "experiment": experiment}))
+        Benchmark.Stop()
+        assert len(queue) == n
+        assert not os.path.exists(f"{experiment}/job0")
+
+        job = queue.get_job("job0")
+        assert job.status == "ready"
+        assert job.executable == "uname"
+        assert job.output == "job0.out"
+        assert not os.path.exists(job.scriptname)
+
+    def test_refresh(self):
+        HEADING()
+        Benchmark.Start()
+        queue.refresh()
+        Benchmark.Stop()
+        assert not os.path.exists(f"{experiment}/job1")
+
+    def test_materialize(self):
+        HEADING()
+        job = queue.get_job("job0")
+        job.materialize()
+        assert os.path.exists(job.scriptname)
+        os.remove(job.scriptname)
+        job.materialize()
+        assert not os.path.exists(job.scriptname)
+
+    def test_constructor(self):
+        HEADING()
+        job = Job(name="constructed", command="uname", experiment=experiment)
+        assert os.path.exists(job.scriptname)
+
+    def test_cleanup(self):
+        HEADING()
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
@@ -0,0 +1,98 @@
+###############################################################
+# pytest -v --capture=no tests/test_13_job_table.py
+# pytest -v  tests/test_13_job_table.py
+# pytest -v --capture=no  tests/test_13_job_table.py::TestJobTable::<METHODNAME>
+###############################################################
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import JobTable
+from cloudmesh.queue.jobqueue import Queue
+
+Benchmark.debug()
+
+experiment = "./table_experiment"
+n = 10000
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def record(i):
+    return {"name": f"job{i}",
+            "status": "ready" if i % 2 else "end",
+            "host": f"host{i % 4}",
+            "user": "pi",
+            "command": "sleep 10",
+            "output": f"job{i}.out",
+            "log": f"job{i}.log",
+            "experiment": "experiment"}
+
+
+@pytest.mark.incremental
+class TestJobTable:
+
+    def test_table(self):
+        HEADING()
+        Benchmark.Start()
+        table = JobTable((f"job{i}", record(i)) for i in range(n))
+        Benchmark.Stop()
+        assert len(table) == n
+        assert table.values["status"] == ["end", "ready"]
+        assert len(table.values["host"]) == 4
+        assert table.get("job1", "host") == "host1"
+        assert len(table.select(status="ready", host="host1")) == n // 4
+        assert table.select(status="unknown") == []
+        assert table.distinct("user", "host") == [("pi", f"host{i}")
+                                                  for i in range(4)]
+        assert table.index.first("ready") == "job1"
+
+    def test_update_and_delete(self):
+        HEADING()
+        table = JobTable((f"job{i}", record(i)) for i in range(10))
+        table.set("job1", dict(record(1), status="run"))
+        assert table.get("job1", "status") == "run"
+        assert table.index.first("ready") == "job3"
+
+        for i in range(6):
+            table.delete(f"job{i}")
+        assert len(table) == 4
+        assert len(table.names) == 4
+        # the vocabularies only keep the values of the remaining rows
+        assert table.values["host"] == ["host2", "host3", "host0", "host1"]
+        assert table.get("job9", "host") == "host1"
+        assert [name for name, row in table.rows(["name"])] == \
+            ["job6", "job7", "job8", "job9"]
+
+    def test_rows(self):
+        HEADING()
+        records = {f"job{i}": record(i) for i in range(3)}
+        table = JobTable(records.items())
+        assert "log" not in table.columns
+        assert list(table.rows(["name", "status", "log"], records=records)) \
+            == [(f"job{i}", (f"job{i}", record(i)["status"], f"job{i}.log"))
+                for i in range(3)]
+        with pytest.raises(ValueError):
+            list(table.rows(["log"]))
+
+    def test_queue(self):
+        HEADING()
+        jobs = [Job.from_dict({"name": f"job{i}", "command": "uname",
+                               "experiment": experiment})
+                for i in range(5)]
+        queue = Queue(name="a", experiment=experiment, jobs=jobs)
+        assert "job4 | undefined | uname" in queue.info()
+        assert queue.to_dict(fields=["status"])["jobs"]["job0"] == \
+            {"status": "undefined"}
+        assert queue.get_hosts() == []
+
+    def test_cleanup(self):
+        HEADING()
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
@@ -0,0 +1,125 @@
+###############################################################
+# pytest -v --capture=no tests/test_14_job_array.py
+# pytest -v  tests/test_14_job_array.py
+# pytest -v --capture=no  tests/test_14_job_array.py::TestJobArray::<METHODNAME>
+###############################################################
+import getpass
+import os
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue.jobqueue import Host
+from cloudmesh.queue.jobqueue import JobArray
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.jobqueue import SchedulerFIFO
+from cloudmesh.queue.jobqueue import SchedulerFIFOMultiHost
+
+Benchmark.debug()
+
+host = "localhost"
+user = getpass.getuser()
+experiment = "./array_experiment"
+n = 100000
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+@pytest.mark.incremental
+class TestJobArray:
+
+    def test_from_name(self):
+        HEADING()
+        array = JobArray.from_name("job[1-10]", {"command": "uname"})
+        assert len(array) == 10
+        assert array.key == "job[1-10]"
+        assert array.status == "undefined"
+        assert array.job_name(3) == "job3"
+
+        array = JobArray.from_name("run[01-10].a",
+                                   {"command": "uname", "host": host,
+                                    "user": user})
+        assert array.status == "ready"
+        assert array.job_name(2) == "run02.a"
+        assert array.key == "run[01-10].a"
+
+        assert JobArray.from_name("job1") is None
+        assert JobArray.from_name("job[1-2,5]") is None
+        assert JobArray.from_name(None) is None
+
+    def test_overrides(self):
+        HEADING()
+        array = JobArray.from_name("job[1-3]", {"command": "uname",
+                                                "experiment": experiment})
+        array.overrides["2"] = {"command": "hostname"}
+        assert array.job(1).command == "uname"
+        assert array.job(2).command == "hostname"
+        assert array.job(2).name == "job2"
+        assert not os.path.exists(f"{experiment}/job2")
+
+        assert [array.pop().name for i in range(3)] == ["job1", "job2", "job3"]
+        assert array.pop() is None
+
+    def test_add_array(self):
+        HEADING()
+        queue = Queue(name="a", experiment=experiment)
+        array = JobArray.from_name(f"job[1-{n}]",
+                                   {"command": "uname", "host": host,
+                                    "user": user, "experiment": experiment})
+        Benchmark.Start()
+        queue.add_array(array)
+        Benchmark.Stop()
+        assert len(queue) == 0
+        assert os.path.getsize(queue.arrays_filename) < 1000
+        assert f"job[1-{n}]" in queue.info()
+
+        queue = Queue(name="a", experiment=experiment)
+        assert queue.get_array(f"job[1-{n}]").remaining == n
+
+    def test_fifo_next(self):
+        HEADING()
+        scheduler = SchedulerFIFO(name="a", experiment=experiment)
+        job = scheduler.__next__()
+        assert job["name"] == "job1"
+        assert len(scheduler) == 1
+        # the expanded job is ready, so it is returned until it is started
+        assert scheduler.__next__()["name"] == "job1"
+
+        job["status"] = "run"
+        scheduler.jobs.set("job1", job)
+        scheduler.table.set("job1", job)
+        assert scheduler.__next__()["name"] == "job2"
+        assert scheduler.get_array(f"job[1-{n}]").next == 3
+
+    def test_delete_array(self):
+        HEADING()
+        queue = Queue(name="a", experiment=experiment)
+        queue.delete(f"job[1-{n}]")
+        assert len(queue) == 0
+        assert len(queue.arrays) == 0
+        assert queue.expand_array() is None
+
+    def test_fifo_multi_next(self):
+        HEADING()
+        queue = Queue(name="b", experiment=experiment)
+        queue.add_array(JobArray.from_name("job[1-2]",
+                                           {"command": "uname",
+                                            "experiment": experiment}))
+        scheduler = SchedulerFIFOMultiHost(name="b", experiment=experiment,
+                                           hosts=[Host(name=host, user=user)])
+        assert scheduler.__next__()["name"] == "job1"
+        assert SchedulerFIFO(name="b", experiment=experiment).__next__() is None
+
+        scheduler.expand_array()
+        assert len(scheduler.arrays) == 0
+        assert scheduler.keys() == ["job1", "job2"]
+
+    def test_cleanup(self):
+        HEADING()
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
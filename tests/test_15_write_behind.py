@@ -0,0 +1,148 @@
+###############################################################
+# pytest -v --capture=no tests/test_15_write_behind.py
+# pytest -v  tests/test_15_write_behind.py
+# pytest -v --capture=no  tests/test_15_write_behind.py::TestWriteBehind::<METHODNAME>
+###############################################################
+import shutil
+import subprocess
+import sys
+from textwrap import dedent
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+from cloudmesh.common.util import readfile
+
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.store import JournalStore
+from cloudmesh.queue.store import SqliteStore
+
+Benchmark.debug()
+
+experiment = "./write_behind_experiment"
+n = 100
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def record(i, status="ready"):
+    return {"name": f"job{i}", "status": status, "command": "uname"}
+
+
+@pytest.mark.incremental
+class TestWriteBehind:
+
+    def test_journal(self):
+        HEADING()
+        filename = f"{experiment}/journal-queue.yaml"
+        store = JournalStore(filename, write_behind=3600)
+        Benchmark.Start()
+        for i in range(n):
+            store.set(f"job{i}", record(i))
+            store.set(f"job{i}", record(i, status="run"))
+        Benchmark.Stop()
+        assert readfile(f"{filename}.journal") == ""
+        assert len(store.pending) == n
+        assert store.get("job1")["status"] == "run"
+
+        store.flush()
+        assert store.pending == {}
+        assert len(readfile(f"{filename}.journal").splitlines()) == n
+        assert JournalStore(filename).get("job1")["status"] == "run"
+
+    def test_interval(self):
+        HEADING()
+        filename = f"{experiment}/interval-queue.yaml"
+        store = JournalStore(filename, write_behind=0)
+        store.set("job1", record(1))
+        assert store.pending == {}
+        assert "job1" in JournalStore(filename)
+
+    def test_sqlite(self):
+        HEADING()
+        filename = f"{experiment}/sqlite-queue.yaml"
+        store = SqliteStore(filename, write_behind=3600)
+        store.update({f"job{i}": record(i) for i in range(n)})
+        store.delete("job0")
+        assert len(store) == n - 1
+        assert len(store.pending) == n
+        store.flush()
+        assert len(SqliteStore(filename)) == n - 1
+
+    def test_sqlite_concurrent(self):
+        HEADING()
+        filename = f"{experiment}/concurrent-queue.yaml"
+        a = SqliteStore(filename, write_behind=10)
+        b = SqliteStore(filename)
+        # fails right away instead of waiting if the database is locked
+        b.connection.execute("PRAGMA busy_timeout=100")
+        a.set("job1", record(1))
+        a.set("job2", record(2, status="run"))
+        assert a.find(status="run") == {"job2": record(2, status="run")}
+        b.set("job3", record(3))
+        assert a.reload() == {"job3": record(3)}
+        assert a.keys() == ["job3", "job1", "job2"]
+        assert len(a) == 3
+        a.delete("job3")
+        assert "job3" not in a and len(a) == 2
+        assert b.reload() == {}
+        a.flush()
+        assert b.reload() == {"job1": record(1), "job3": None,
+                              "job2": record(2, status="run")}
+
+    def test_queue(self):
+        HEADING()
+        queue = Queue(name="q", experiment=experiment, storage="journal",
+                      write_behind=3600)
+        journal = f"{queue.filename}.journal"
+        job = Job.from_dict({"name": "job1", "command": "uname",
+                             "experiment": experiment})
+        queue.set(job)
+        job.last_probe_check = "now"
+        queue.set(job)
+        assert queue.dirty == ["job1"]
+        assert readfile(journal) == ""
+
+        job.status = "end"
+        queue.set(job)
+        assert queue.dirty == []
+        assert Queue(name="q", experiment=experiment).get("job1")["status"] \
+            == "end"
+
+    def test_wait(self):
+        HEADING()
+        queue = Queue(name="w", experiment=experiment, storage="journal",
+                      write_behind=0.2)
+        queue.flush()
+        job = Job.from_dict({"name": "job1", "command": "uname",
+                             "experiment": experiment})
+        queue.set(job)
+        assert queue.dirty == ["job1"]
+        queue.wait(0.3)
+        assert queue.dirty == ["job1"]
+        # the next wait of an idle scheduler persists the changes
+        queue.wait(0)
+        assert queue.dirty == []
+        assert "job1" in Queue(name="w", experiment=experiment).keys()
+
+    def test_exit(self):
+        HEADING()
+        script = dedent(f"""
+            from cloudmesh.queue.jobqueue import Job
+            from cloudmesh.queue.jobqueue import Queue
+            queue = Queue(name="e", experiment="{experiment}",
+                          storage="journal", write_behind=3600)
+            queue.set(Job.from_dict({{"name": "job1", "command": "uname"}}))
+            assert queue.dirty == ["job1"]
+            """)
+        subprocess.run([sys.executable, "-c", script], check=True)
+        assert "job1" in Queue(name="e", experiment=experiment).keys()
+
+    def test_cleanup(self):
+        HEADING()
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
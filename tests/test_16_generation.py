@@ -0,0 +1,144 @@
+###############################################################
+# pytest -v --capture=no tests/test_16_generation.py
+# pytest -v  tests/test_16_generation.py
+# pytest -v --capture=no  tests/test_16_generation.py::TestGeneration::<METHODNAME>
+###############################################################
+import shutil
+import subprocess
+import sys
+from textwrap import dedent
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.store import JournalStore
+from cloudmesh.queue.store import SqliteStore
+from cloudmesh.queue.store import YamlStore
+
+Benchmark.debug()
+
+experiment = "./generation_experiment"
+processes = 4
+n = 25
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def record(i, status="ready"):
+    return {"name": f"job{i}", "status": status, "command": "uname"}
+
+
+@pytest.mark.incremental
+class TestGeneration:
+
+    def test_yaml(self):
+        HEADING()
+        filename = f"{experiment}/yaml-queue.yaml"
+        a = YamlStore(filename)
+        b = YamlStore(filename)
+        a.set("job1", record(1))
+        b.set("job2", record(2))
+        assert YamlStore(filename).keys() == ["job1", "job2"]
+        assert b.version("job2") == 2
+
+        # the write of b merged job1 written by a
+        assert b.reload() == {"job1": record(1)}
+        db = b.db
+        assert b.reload() == {}
+        assert b.db is db
+        assert a.reload() == {"job2": record(2)}
+
+        b.delete("job1")
+        assert a.reload() == {"job1": None}
+        assert a.keys() == ["job2"]
+
+    def test_journal(self):
+        HEADING()
+        filename = f"{experiment}/journal-queue.yaml"
+        a = JournalStore(filename, compact_every=10)
+        b = JournalStore(filename, compact_every=10)
+        a.set("job1", record(1))
+        b.set("job2", record(2))
+        assert JournalStore(filename).keys() == ["job1", "job2"]
+
+        db = a.db
+        assert a.reload() == {"job2": record(2)}
+        # new journal records are replayed without reading the snapshot
+        assert a.db is db
+
+        for i in range(3, 13):
+            b.set(f"job{i}", record(i))
+        assert b.records == 2
+        changes = a.reload()
+        assert len(changes) == 10
+        assert len(a) == 12
+
+        a.set("job1", record(1, status="end"))
+        b.reload()
+        assert b.get("job1")["status"] == "end"
+
+    def test_sqlite(self):
+        HEADING()
+        filename = f"{experiment}/sqlite-queue.yaml"
+        a = SqliteStore(filename)
+        b = SqliteStore(filename)
+        a.update({f"job{i}": record(i) for i in range(3)})
+        assert a.reload() == {}
+        assert b.reload() == {f"job{i}": record(i) for i in range(3)}
+        assert b.reload() == {}
+
+        a.delete("job0")
+        a.set("job1", record(1, status="end"))
+        assert b.reload() == {"job0": None, "job1": record(1, status="end")}
+        assert a.version("job1") == 3
+
+    def test_queue(self):
+        HEADING()
+        a = Queue(name="q", experiment=experiment)
+        b = Queue(name="q", experiment=experiment)
+        a.add(Job.from_dict({"name": "job1", "command": "uname",
+                             "experiment": experiment}))
+        assert b.reload() == ["job1"]
+        assert b.index.first("undefined") == "job1"
+
+        a.add(Job.from_dict({"name": "job2", "command": "uname",
+                             "experiment": experiment}))
+        job = b.get_job("job1")
+        job.status = "end"
+        b.set(job)
+        # the write of b merged the job added by a
+        assert b.get("job2")["name"] == "job2"
+        assert a.reload() == ["job1"]
+        assert a.table.get("job1", "status") == "end"
+
+    def test_processes(self):
+        HEADING()
+        script = dedent("""
+            import sys
+            from cloudmesh.queue.jobqueue import Job
+            from cloudmesh.queue.jobqueue import Queue
+            queue = Queue(name="p", experiment="{experiment}",
+                          storage="journal")
+            for i in range({n}):
+                queue.add(Job.from_dict({{"name": f"job{{sys.argv[1]}}-{{i}}",
+                                          "command": "uname"}}))
+            """).format(experiment=experiment, n=n)
+        Queue(name="p", experiment=experiment, storage="journal")
+        Benchmark.Start()
+        running = [subprocess.Popen([sys.executable, "-c", script, str(p)])
+                   for p in range(processes)]
+        for process in running:
+            assert process.wait() == 0
+        Benchmark.Stop()
+        assert len(Queue(name="p", experiment=experiment)) == processes * n
+
+    def test_cleanup(self):
+        HEADING()
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
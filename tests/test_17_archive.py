@@ -0,0 +1,90 @@
+###############################################################
+# pytest -v --capture=no tests/test_17_archive.py
+# pytest -v  tests/test_17_archive.py
+# pytest -v --capture=no  tests/test_17_archive.py::TestArchive::<METHODNAME>
+###############################################################
+import os
+import shutil
+from datetime import datetime
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+
+Benchmark.debug()
+
+experiment = "./archive_experiment"
+n = 100
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def add_jobs(queue):
+    statuses = ["end", "kill", "crash", "ready"]
+    with queue.batch():
+        for i in range(n):
+            queue.add(Job.from_dict({"name": f"job{i}", "command": "uname",
+                                     "status": statuses[i % 4],
+                                     "experiment": experiment}))
+
+
+@pytest.mark.incremental
+class TestArchive:
+
+    def test_archive(self):
+        HEADING()
+        queue = Queue(name="a", experiment=experiment)
+        add_jobs(queue)
+        Benchmark.Start()
+        archived = queue.archive()
+        Benchmark.Stop()
+        assert len(archived) == 3 * n // 4
+        assert len(queue) == n // 4
+        assert queue.keys()[0] == "job3"
+        assert queue.index.count("end") == 0
+
+        segment = datetime.now().strftime("%Y-%m-%d")
+        assert os.path.exists(f"{queue.archive_directory}/{segment}.yaml")
+        assert queue.archive() == []
+
+    def test_get(self):
+        HEADING()
+        queue = Queue(name="a", experiment=experiment)
+        assert len(queue) == n // 4
+        Benchmark.Start()
+        assert queue.get("job0")["status"] == "end"
+        Benchmark.Stop()
+        assert queue.get("job3")["status"] == "ready"
+        assert queue.get_job("job1").status == "kill"
+        with pytest.raises(KeyError):
+            queue.get("job1000")
+
+    def test_window(self):
+        HEADING()
+        queue = Queue(name="b", experiment=experiment, storage="journal")
+        add_jobs(queue)
+        archived = queue.archive(statuses=["crash"], window="%Y-%m")
+        assert len(archived) == n // 4
+        assert len(queue) == 3 * n // 4
+        segment = datetime.now().strftime("%Y-%m")
+        assert os.path.exists(f"{queue.archive_directory}/{segment}.yaml")
+        assert Queue(name="b", experiment=experiment).get("job2")["status"] \
+            == "crash"
+
+    def test_remove(self):
+        HEADING()
+        queue = Queue(name="a", experiment=experiment)
+        queue.remove()
+        assert not os.path.exists(queue.filename)
+        assert not os.path.exists(queue.archive_directory)
+
+    def test_cleanup(self):
+        HEADING()
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
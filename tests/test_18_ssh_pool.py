@@ -0,0 +1,164 @@
+###############################################################
+# pytest -v --capture=no tests/test_18_ssh_pool.py
+# pytest -v  tests/test_18_ssh_pool.py
+# pytest -v --capture=no  tests/test_18_ssh_pool.py::TestSSHPool::<METHODNAME>
+###############################################################
+import asyncio
+import shutil
+import subprocess
+import threading
+import time
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Host
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import FakeTransport
+
+Benchmark.debug()
+
+experiment = "./ssh_experiment"
+host = "red"
+user = "gregor"
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+@pytest.mark.incremental
+class TestSSHPool:
+
+    def test_run(self):
+        HEADING()
+        transport = FakeTransport({"hostname": "red\n"})
+        pool = SSHPool(transport=transport, control_dir=f"{experiment}/ssh")
+        Benchmark.Start()
+        assert pool.output(user, host, "hostname") == "red\n"
+        Benchmark.Stop()
+        args = transport.calls[0]
+        assert args[0] == "ssh"
+        assert "ControlMaster=auto" in args
+        assert args[-2:] == [f"{user}@{host}", "hostname"]
+
+        pool.run(user, "localhost", "hostname")
+        assert transport.calls[1] == ["sh", "-c", "hostname"]
+
+    def test_output_error(self):
+        HEADING()
+        pool = SSHPool(transport=lambda args, input=None, timeout=None:
+                       subprocess.CompletedProcess(args, 255, stdout="down"))
+        with pytest.raises(RuntimeError):
+            pool.output(user, host, "hostname")
+
+    def test_max_sessions(self):
+        HEADING()
+        transport = FakeTransport(delay=0.05)
+        pool = SSHPool(max_sessions=2, transport=transport,
+                       control_dir=f"{experiment}/ssh")
+        threads = [threading.Thread(target=pool.run,
+                                    args=(user, host, "hostname"))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(transport.calls) == 8
+        assert transport.max_active == 2
+
+    def test_evict(self):
+        HEADING()
+        transport = FakeTransport()
+        pool = SSHPool(idle=3600, transport=transport,
+                       control_dir=f"{experiment}/ssh")
+        pool.run(user, host, "hostname")
+        assert pool.evict() == []
+        assert pool.close() == [(user, host)]
+        assert transport.calls[-1][-3:] == ["-O", "exit", f"{user}@{host}"]
+        assert pool.close() == []
+
+    def test_shared_limit(self):
+        HEADING()
+        transport = FakeTransport(delay=0.05)
+
+        async def atransport(args, input=None, timeout=None):
+            return await asyncio.to_thread(transport, args)
+
+        pool = SSHPool(max_sessions=2, transport=transport,
+                       atransport=atransport, control_dir=f"{experiment}/ssh")
+
+        async def run():
+            return await asyncio.gather(
+                *[pool.arun(user, host, "hostname") for i in range(4)])
+
+        threads = [threading.Thread(target=pool.run,
+                                    args=(user, host, "hostname"))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        asyncio.run(run())
+        for thread in threads:
+            thread.join()
+        assert len(transport.calls) == 8
+        assert transport.max_active == 2
+
+    def test_evict_waits(self):
+        HEADING()
+        calls = []
+
+        def transport(args, input=None, timeout=None):
+            calls.append(f"start {args[-1]}")
+            time.sleep(0.2 if "exit" in args else 0)
+            calls.append(f"end {args[-1]}")
+            return subprocess.CompletedProcess(args, 0, stdout="")
+
+        pool = SSHPool(idle=3600, transport=transport,
+                       control_dir=f"{experiment}/ssh")
+        pool.run(user, host, "first")
+        closing = threading.Thread(target=pool.close)
+        closing.start()
+        time.sleep(0.05)
+        # a new session waits until the master connection is closed
+        with pool.session(user, host):
+            transport(["second"])
+        closing.join()
+        assert calls[2:] == [f"start {user}@{host}", f"end {user}@{host}",
+                             "start second", "end second"]
+
+    def test_job(self):
+        HEADING()
+        transport = FakeTransport({"cat": "4711\n", "ls": "",
+                                   "ps": "PID\n4711 gregor 1 0 ? 0.0 0.0 sh\n"})
+        ssh.pool = SSHPool(transport=transport,
+                           control_dir=f"{experiment}/ssh")
+        job = Job(name="job1", command="uname", host=host, user=user,
+                  experiment=experiment)
+        assert job.run() == "4711"
+        assert transport.calls[0][-1] == job.remote_command
+        assert job.check_running()
+        job.kill()
+        assert job.status == "kill"
+        assert job.remove_dir() == ""
+        job.warn_if_job_dir_present()
+        assert all(args[0] == "ssh" for args in transport.calls)
+
+    def test_probe(self):
+        HEADING()
+        ssh.pool.transport = FakeTransport({"hostname": "red\n"})
+        status, probe_time = Host(name=host, user=user).probe()
+        assert status
+        ssh.pool.transport = FakeTransport({"hostname": "blue\n"})
+        status, probe_time = Host(name=host, user=user).probe()
+        assert not status
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
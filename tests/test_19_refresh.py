@@ -0,0 +1,103 @@
+###############################################################
+# pytest -v --capture=no tests/test_19_refresh.py
+# pytest -v  tests/test_19_refresh.py
+# pytest -v --capture=no  tests/test_19_refresh.py::TestRefresh::<METHODNAME>
+###############################################################
+import getpass
+import os
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+from cloudmesh.common.util import writefile
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import FakeHosts
+
+Benchmark.debug()
+
+user = getpass.getuser()
+experiment = "./refresh_experiment"
+hosts = 20
+n = 2000
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+@pytest.mark.incremental
+class TestRefresh:
+
+    def test_local(self):
+        HEADING()
+        queue = Queue(name="local", experiment=experiment)
+        with queue.batch():
+            for i in range(3):
+                queue.add(Job.from_dict({"name": f"job{i}", "command": "uname",
+                                         "host": "localhost", "user": user,
+                                         "status": "run",
+                                         "experiment": experiment}))
+        os.makedirs(f"{experiment}/job0", exist_ok=True)
+        writefile(f"{experiment}/job0/job0.log",
+                  "# cloudmesh state: start\n# cloudmesh state: end\n")
+        os.makedirs(f"{experiment}/job1", exist_ok=True)
+        writefile(f"{experiment}/job1/job1.log", "# cloudmesh state: run\n")
+
+        result = queue.refresh()
+        assert "job0" in result
+        assert "job1" not in result
+        assert queue.get("job0")["status"] == "end"
+        assert queue.get("job1")["status"] == "run"
+        assert queue.get("job2")["status"] == "run"
+        assert queue.refresh() == "No job status changes."
+
+    def test_partial_line(self):
+        HEADING()
+        queue = Queue(name="local", experiment=experiment)
+        log = f"{experiment}/job1/job1.log"
+        with open(log, "a") as f:
+            f.write("# cloudmesh state: e")
+        assert queue.refresh() == "No job status changes."
+        assert queue.get("job1")["status"] == "run"
+        # the rest of the line is read with the start of the line
+        with open(log, "a") as f:
+            f.write("nd\n")
+        assert "job1" in queue.refresh()
+        assert queue.get("job1")["status"] == "end"
+
+    def test_hosts(self):
+        HEADING()
+        transport = FakeHosts()
+        ssh.pool = SSHPool(transport=transport,
+                           control_dir=f"{experiment}/ssh")
+        queue = Queue(name="hosts", experiment=experiment, storage="journal",
+                      write_behind=3600)
+        with queue.batch():
+            for i in range(n):
+                queue.add(Job.from_dict({"name": f"job{i}", "command": "uname",
+                                         "host": f"red{i % hosts:02}",
+                                         "user": user, "status": "run",
+                                         "experiment": experiment}))
+        queue.flush()
+        Benchmark.Start()
+        queue.refresh()
+        Benchmark.Stop()
+        assert len(transport.calls) == hosts
+        assert queue.index.count("end") == n
+        assert queue.dirty == []
+
+        queue.refresh()
+        assert len(transport.calls) == hosts
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
@@ -0,0 +1,133 @@
+###############################################################
+# pytest -v --capture=no tests/test_20_agent.py
+# pytest -v  tests/test_20_agent.py
+# pytest -v --capture=no  tests/test_20_agent.py::TestAgent::<METHODNAME>
+###############################################################
+import getpass
+import os
+import shutil
+import threading
+import time
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+from cloudmesh.common.util import writefile
+
+from cloudmesh.queue.agent import Agent
+from cloudmesh.queue.agent import Log
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.jobqueue import SchedulerFIFO
+
+Benchmark.debug()
+
+host = "localhost"
+user = getpass.getuser()
+experiment = "./agent_experiment"
+n = 4
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def append(name, text):
+    os.makedirs(f"{experiment}/{name}", exist_ok=True)
+    with open(f"{experiment}/{name}/{name}.log", "a") as f:
+        f.write(text)
+
+
+@pytest.mark.incremental
+class TestAgent:
+
+    def test_log(self):
+        HEADING()
+        log = Log("job0", f"{experiment}/job0/job0.log")
+        assert not log.read()
+        append("job0", "# cloudmesh state: start\n# cloudmesh sta")
+        assert log.read()
+        assert log.state == "start"
+        append("job0", "te: end\n")
+        append("job0", "# cloudmesh exit: 3\n")
+        assert log.read()
+        assert log.event() == {"name": "job0", "state": "end", "exit": 3}
+
+        writefile(f"{experiment}/job0/job0.log", "# cloudmesh state: start\n")
+        assert log.read()
+        assert log.event() == {"name": "job0", "state": "start", "exit": None}
+
+        # the pid file does not exist, so the process is gone
+        assert log.crashed()
+        assert log.state == "crash"
+
+    def test_events(self):
+        HEADING()
+        agent = Agent(user, host, [experiment], interval=0.01)
+        agent.start()
+        assert agent.ready.wait(timeout=30)
+        assert agent.events.get(timeout=5)["state"] == "crash"
+
+        Benchmark.Start()
+        start = time.time()
+        append("job1", "# cloudmesh state: end\n")
+        event = agent.events.get(timeout=5)
+        Benchmark.Stop()
+        assert time.time() - start < 1
+        assert event == {"name": "job1", "state": "end", "exit": None,
+                         "user": user, "host": host}
+        agent.stop()
+        assert not agent.alive
+
+    def test_refresh(self):
+        HEADING()
+        queue = Queue(name="a", experiment=experiment)
+        with queue.batch():
+            for name in ["job1", "job2"]:
+                queue.add(Job.from_dict({"name": name, "command": "uname",
+                                         "host": host, "user": user,
+                                         "status": "run",
+                                         "experiment": experiment}))
+        queue.watch(interval=0.01)
+        append("job2", "# cloudmesh exit: 0\n# cloudmesh state: end\n")
+        queue.refresh()
+        assert queue.get("job1")["status"] == "end"
+        assert queue.get("job2")["status"] == "end"
+        assert queue.get("job2")["exit_code"] == 0
+        assert len(queue.agents) == 1
+        queue.unwatch()
+        assert queue.agents is None
+
+    def test_empty_pid(self):
+        HEADING()
+        job = Job.from_dict({"name": "pid", "command": "uname",
+                             "host": host, "user": user,
+                             "experiment": experiment})
+        # the script created the pid file but did not yet write the pid
+        writefile(f"{experiment}/pid/pid.pid", "")
+        threading.Timer(0.3, writefile,
+                        [f"{experiment}/pid/pid.pid", "4711\n"]).start()
+        assert job.rpid == "4711"
+
+    def test_scheduler(self):
+        HEADING()
+        scheduler = SchedulerFIFO(name="b", experiment=experiment,
+                                  max_parallel=2, agent=True)
+        with scheduler.batch():
+            for i in range(n):
+                scheduler.add(Job(name=f"run{i}", command="sleep 0.5",
+                                  host=host, user=user,
+                                  experiment=experiment))
+        Benchmark.Start()
+        assert len(scheduler.run()) == n
+        assert len(scheduler.wait_on_running()) == n
+        Benchmark.Stop()
+        assert scheduler.index.count("end") == n
+        assert scheduler.get("run0")["exit_code"] == 0
+        assert scheduler.agents is None
+
+    def test_cleanup(self):
+        HEADING()
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
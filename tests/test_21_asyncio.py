@@ -0,0 +1,113 @@
+###############################################################
+# pytest -v --capture=no tests/test_21_asyncio.py
+# pytest -v  tests/test_21_asyncio.py
+# pytest -v --capture=no  tests/test_21_asyncio.py::TestAsyncio::<METHODNAME>
+###############################################################
+import asyncio
+import getpass
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Host
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import AsyncFakeHosts
+
+Benchmark.debug()
+
+host = "localhost"
+user = getpass.getuser()
+experiment = "./asyncio_experiment"
+hosts = 20
+n = 200
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+@pytest.mark.incremental
+class TestAsyncio:
+
+    def test_arun(self):
+        HEADING()
+        fake = AsyncFakeHosts()
+        pool = SSHPool(max_sessions=2, atransport=fake,
+                       control_dir=f"{experiment}/ssh")
+
+        async def run():
+            return await asyncio.gather(
+                *[pool.arun(user, f"red{i % 2}", "hostname")
+                  for i in range(8)])
+
+        Benchmark.Start()
+        results = asyncio.run(run())
+        Benchmark.Stop()
+        assert [r.stdout for r in results[:2]] == ["red0\n", "red1\n"]
+        assert fake.max_active == 2
+
+    def test_local(self):
+        HEADING()
+        r = asyncio.run(ssh.pool.arun(user, host, "cat; exit 3", input="hi"))
+        assert r.returncode == 3
+        assert r.stdout == "hi"
+        with pytest.raises(RuntimeError):
+            asyncio.run(ssh.pool.aoutput(user, host, "exit 1"))
+
+    def test_aprobe(self):
+        HEADING()
+        ssh.pool = SSHPool(atransport=AsyncFakeHosts(),
+                           control_dir=f"{experiment}/ssh")
+
+        async def probe():
+            return await asyncio.gather(
+                *[Host(name=f"red{i}", user=user).aprobe()
+                  for i in range(hosts)])
+
+        results = asyncio.run(probe())
+        assert all(status for status, probe_time in results)
+
+    def test_arefresh(self):
+        HEADING()
+        fake = AsyncFakeHosts()
+        ssh.pool.atransport = fake
+        queue = Queue(name="a", experiment=experiment)
+        with queue.batch():
+            for i in range(n):
+                queue.add(Job.from_dict({"name": f"job{i}", "command": "uname",
+                                         "host": f"red{i % hosts}",
+                                         "user": user, "status": "run",
+                                         "experiment": experiment}))
+        Benchmark.Start()
+        asyncio.run(queue.arefresh())
+        Benchmark.Stop()
+        assert len(fake.calls) == hosts
+        assert queue.index.count("end") == n
+
+    def test_job(self):
+        HEADING()
+        ssh.pool = default
+        job = Job(name="run1", command="uname", host=host, user=user,
+                  experiment=experiment)
+
+        async def run():
+            pid = await job.arun()
+            while await job.astate() != "end":
+                await asyncio.sleep(0.1)
+            return pid
+
+        assert asyncio.run(run()) is not None
+        assert job.status == "end"
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
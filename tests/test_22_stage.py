@@ -0,0 +1,137 @@
+###############################################################
+# pytest -v --capture=no tests/test_22_stage.py
+# pytest -v  tests/test_22_stage.py
+# pytest -v --capture=no  tests/test_22_stage.py::TestStage::<METHODNAME>
+###############################################################
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Host
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.jobqueue import SchedulerFIFO
+from cloudmesh.queue.jobqueue import SchedulerFIFOMultiHost
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import FakeHosts
+
+Benchmark.debug()
+
+user = "gregor"
+experiment = "./stage_experiment"
+hosts = 3
+n = 15
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def commands(fake, program):
+    return [(args, input) for args, input in fake.calls if args[0] == program]
+
+
+@pytest.mark.incremental
+class TestStage:
+
+    def test_host(self):
+        HEADING()
+        fake = FakeHosts(present="job1\nother\n")
+        ssh.pool = SSHPool(transport=fake, control_dir=f"{experiment}/ssh")
+        copied = Host.stage(user, "red", experiment,
+                            ["job1", "job2", "job3"])
+        assert copied == ["job2", "job3"]
+        rsyncs = commands(fake, "rsync")
+        assert len(rsyncs) == 1
+        args, input = rsyncs[0]
+        assert "--files-from=-" in args
+        assert args[-1] == f"{user}@red:{experiment}/"
+        assert input == "job2\njob3"
+
+    def test_queue(self):
+        HEADING()
+        fake = FakeHosts()
+        ssh.pool.transport = fake
+        queue = Queue(name="a", experiment=experiment)
+        jobs = [Job.from_dict({"name": f"job{i}", "command": "uname",
+                               "host": f"red{i % hosts}", "user": user,
+                               "experiment": experiment})
+                for i in range(n)]
+        Benchmark.Start()
+        queue.stage(jobs)
+        Benchmark.Stop()
+        assert len(commands(fake, "rsync")) == hosts
+        assert len(commands(fake, "ssh")) == hosts
+        assert all(job.staged for job in jobs)
+
+    def test_fifo(self):
+        HEADING()
+        fake = FakeHosts()
+        ssh.pool.transport = fake
+        scheduler = SchedulerFIFO(name="b", experiment=experiment,
+                                  max_parallel=4)
+        with scheduler.batch():
+            for i in range(4):
+                scheduler.add(Job.from_dict({"name": f"run{i}",
+                                             "command": "uname",
+                                             "host": "red", "user": user,
+                                             "experiment": experiment}))
+        assert len(scheduler.run()) == 4
+        rsyncs = commands(fake, "rsync")
+        assert len(rsyncs) == 1
+        assert rsyncs[0][1] == "run0\nrun1\nrun2\nrun3"
+        assert all(scheduler.get(f"run{i}")["staged"] for i in range(4))
+
+    def test_fifo_multi(self):
+        HEADING()
+        fake = FakeHosts()
+        ssh.pool.transport = fake
+        queue = Queue(name="c", experiment=experiment)
+        with queue.batch():
+            for i in range(4):
+                queue.add(Job.from_dict({"name": f"multi{i}",
+                                         "command": "uname",
+                                         "experiment": experiment}))
+        scheduler = SchedulerFIFOMultiHost(
+            name="c", experiment=experiment,
+            hosts=[Host(name=f"red{i}", user=user, max_jobs_allowed=2)
+                   for i in range(2)])
+        assert scheduler.free_slots() == 4
+        assert len(scheduler.run()) == 4
+        assert len(commands(fake, "rsync")) == 2
+        assert scheduler.get("multi3")["host"] == "red1"
+
+    def test_reset_staged(self):
+        HEADING()
+        fake = FakeHosts()
+        ssh.pool.transport = fake
+        queue = Queue(name="d", experiment=experiment)
+        queue.add(Job.from_dict({"name": "staged", "command": "uname",
+                                 "host": "red", "user": user,
+                                 "experiment": experiment}))
+        queue.stage([queue.get_job("staged")])
+        # a reset in another process, e.g. the service, knows it was staged
+        other = Queue(name="d", experiment=experiment)
+        fake.calls = []
+
+        async def atransport(args, input=None, timeout=None):
+            return fake(args, input=input, timeout=timeout)
+
+        ssh.pool.atransport = atransport
+        other.reset()
+        cleaned = [input for args, input in commands(fake, "ssh")
+                   if args[-1] == "sh"]
+        assert len(cleaned) == 1
+        assert cleaned[0].startswith("rm -rf") and "/staged ||" in cleaned[0]
+        assert other.get("staged")["staged"] is False
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
@@ -0,0 +1,139 @@
+###############################################################
+# pytest -v --capture=no tests/test_23_inputs.py
+# pytest -v  tests/test_23_inputs.py
+# pytest -v --capture=no  tests/test_23_inputs.py::TestInputs::<METHODNAME>
+###############################################################
+import getpass
+import os
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+from cloudmesh.common.util import readfile
+from cloudmesh.common.util import writefile
+
+from cloudmesh.queue import cache
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Host
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.jobqueue import SchedulerFIFO
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import FakeHosts
+
+Benchmark.debug()
+
+host = "localhost"
+user = getpass.getuser()
+experiment = "./inputs_experiment"
+data = "./inputs_data"
+hosts = 3
+n = 30
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+shutil.rmtree(data, ignore_errors=True)
+
+
+def rsyncs(fake):
+    return [input.splitlines() for args, input in fake.calls
+            if args[0] == "rsync"]
+
+
+def jobs(prefix, host=None):
+    return [Job.from_dict({"name": f"{prefix}{i}",
+                           "command": "cat data.csv",
+                           "host": host or f"red{i % hosts}", "user": user,
+                           "inputs": [f"{data}/data.csv",
+                                      f"{data}/model{i % 2}.txt"],
+                           "experiment": experiment})
+            for i in range(n)]
+
+
+@pytest.mark.incremental
+class TestInputs:
+
+    def test_cache(self):
+        HEADING()
+        os.makedirs(data, exist_ok=True)
+        writefile(f"{data}/data.csv", "a,b\n1,2\n")
+        writefile(f"{data}/model0.txt", "model")
+        writefile(f"{data}/model1.txt", "model")
+        digest = cache.add(experiment, f"{data}/data.csv")
+        assert digest == cache.digest(f"{data}/data.csv")
+        assert cache.digest(f"{data}/model0.txt") == \
+            cache.digest(f"{data}/model1.txt")
+        assert readfile(f"{experiment}/{cache.blob(digest)}") == "a,b\n1,2\n"
+
+    def test_changed(self):
+        HEADING()
+        writefile(f"{data}/changed.csv", "old\n")
+        digest = cache.add(experiment, f"{data}/changed.csv")
+        # changing the input in place does not change the blob
+        with open(f"{data}/changed.csv", "w") as f:
+            f.write("changed\n")
+        assert readfile(f"{experiment}/{cache.blob(digest)}") == "old\n"
+        assert not os.path.islink(f"{experiment}/{cache.blob(digest)}")
+        assert cache.add(experiment, f"{data}/changed.csv") != digest
+
+    def test_link(self):
+        HEADING()
+        job = Job(name="job", command="cat data.csv", inputs=[f"{data}/data.csv"],
+                  experiment=experiment)
+        blobs = job.link_inputs()
+        assert len(blobs) == 1
+        assert os.readlink(f"{experiment}/job/data.csv") == f"../{blobs[0]}"
+        assert readfile(f"{experiment}/job/data.csv") == "a,b\n1,2\n"
+
+    def test_stage(self):
+        HEADING()
+        fake = FakeHosts()
+        ssh.pool = SSHPool(transport=fake, control_dir=f"{experiment}/ssh")
+        queue = Queue(name="a", experiment=experiment)
+        Benchmark.Start()
+        queue.stage(jobs("job"))
+        Benchmark.Stop()
+        copies = rsyncs(fake)
+        assert len(copies) == hosts
+        for copied in copies:
+            blobs = [name for name in copied if name.startswith(cache.directory)]
+            # data.csv and the two models with the same content
+            assert len(blobs) == 2
+            assert len(copied) == len(blobs) + n // hosts
+
+    def test_present(self):
+        HEADING()
+        blob = cache.blob(cache.digest(f"{data}/data.csv"))
+        fake = FakeHosts(present=f"{blob}\n")
+        ssh.pool.transport = fake
+        copied = Host.stage(user, "red", experiment, ["job1"],
+                            blobs=[blob, cache.blob(
+                                cache.digest(f"{data}/model0.txt"))])
+        assert blob not in copied
+        assert len(copied) == 2
+        args, input = fake.calls[-1]
+        assert "--copy-unsafe-links" in args
+
+    def test_run(self):
+        HEADING()
+        ssh.pool = default
+        scheduler = SchedulerFIFO(name="b", experiment=experiment,
+                                  max_parallel=2)
+        with scheduler.batch():
+            for job in jobs("run", host=host)[:2]:
+                scheduler.add(job)
+        assert len(scheduler.run()) == 2
+        assert len(scheduler.wait_on_running()) == 2
+        job = Job.from_dict(scheduler.get("run1"))
+        assert job.get_output() == "a,b\n1,2\n"
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+        shutil.rmtree(data, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
@@ -0,0 +1,135 @@
+###############################################################
+# pytest -v --capture=no tests/test_24_tail.py
+# pytest -v  tests/test_24_tail.py
+# pytest -v --capture=no  tests/test_24_tail.py::TestTail::<METHODNAME>
+###############################################################
+import getpass
+import os
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+from cloudmesh.common.util import writefile
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import LocalHosts
+
+Benchmark.debug()
+
+user = getpass.getuser()
+experiment = "./tail_experiment"
+n = 10
+lines = 100000
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def append(name, text):
+    os.makedirs(f"{experiment}/{name}", exist_ok=True)
+    with open(f"{experiment}/{name}/{name}.log", "a") as f:
+        f.write(text)
+
+
+@pytest.mark.incremental
+class TestTail:
+
+    def test_local(self):
+        HEADING()
+        job = Job.from_dict({"name": "local", "command": "uname",
+                             "host": "localhost", "user": user,
+                             "experiment": experiment})
+        append("local", "# cloudmesh state: start\n# cloudmesh sta")
+        assert job.state == "start"
+        append("local", "te: end\n")
+        assert job.state == "end"
+        assert job.get_log() == "# cloudmesh state: start\n" \
+                                "# cloudmesh state: end\n"
+
+    def test_remote(self):
+        HEADING()
+        fake = LocalHosts()
+        ssh.pool = SSHPool(transport=fake, control_dir=f"{experiment}/ssh")
+        job = Job.from_dict({"name": "remote", "command": "uname",
+                             "host": "red", "user": user,
+                             "experiment": experiment})
+        assert job.state == "ready"
+        append("remote", "# cloudmesh state: start\n")
+        assert job.state == "start"
+        append("remote", "output\n# cloudmesh state: end\n")
+        assert job.tail(job.log) == "output\n# cloudmesh state: end\n"
+        assert job.status == "end"
+        assert job.state == "end"
+        assert "offset=55" in fake.calls[-1][0]
+
+        writefile(f"{experiment}/remote/remote.log", "# cloudmesh state: run\n")
+        assert job.state == "run"
+        assert job.get_log() == "# cloudmesh state: run\n"
+
+    def test_no_newline(self):
+        HEADING()
+        for host in ["localhost", "red"]:
+            name = f"out_{host}"
+            job = Job.from_dict({"name": name, "command": "uname",
+                                 "host": host, "user": user,
+                                 "experiment": experiment})
+            os.makedirs(f"{experiment}/{name}", exist_ok=True)
+            with open(f"{experiment}/{name}/{job.output}", "wb") as f:
+                f.write(b"line1\n\xff\xfe\nno-newline")
+            assert job.get_output() == "line1\n\ufffd\ufffd\nno-newline"
+            # the offset counts the bytes of the file, not of the text
+            assert job._tails[job.output][0] == 9
+            with open(f"{experiment}/{name}/{job.output}", "ab") as f:
+                f.write(b" done\n")
+            assert job.get_output() == \
+                "line1\n\ufffd\ufffd\nno-newline done\n"
+
+    def test_refresh(self):
+        HEADING()
+        fake = LocalHosts()
+        ssh.pool.transport = fake
+        queue = Queue(name="a", experiment=experiment)
+        with queue.batch():
+            for i in range(n):
+                queue.add(Job.from_dict({"name": f"job{i}", "command": "uname",
+                                         "host": "red", "user": user,
+                                         "status": "run", "pid": "4711",
+                                         "experiment": experiment}))
+                append(f"job{i}", "# cloudmesh state: start\n" +
+                       "output\n" * lines)
+        queue.refresh()
+        assert queue.index.count("start") == n
+        size = os.path.getsize(f"{experiment}/job0/job0.log")
+        assert queue.offsets["job0"] == ("4711", size)
+
+        for i in range(n):
+            append(f"job{i}", "# cloudmesh exit: 0\n# cloudmesh state: end\n")
+        Benchmark.Start()
+        queue.refresh()
+        Benchmark.Stop()
+        command, input = fake.calls[-1]
+        assert f"{size} ./{experiment}/job0/job0.log" in input.splitlines()
+        assert queue.index.count("end") == n
+        assert queue.get("job0")["exit_code"] == 0
+
+    def test_restart(self):
+        HEADING()
+        queue = Queue(name="a", experiment=experiment)
+        queue.offsets["job0"] = ("4711", 1000)
+        job = Job.from_dict(queue.get("job0"))
+        job.pid = "4712"
+        assert Queue.poll_input([job], queue.offsets) == \
+            f"0 ./{experiment}/job0/job0.log\n"
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
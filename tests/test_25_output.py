@@ -0,0 +1,120 @@
+###############################################################
+# pytest -v --capture=no tests/test_25_output.py
+# pytest -v  tests/test_25_output.py
+# pytest -v --capture=no  tests/test_25_output.py::TestOutput::<METHODNAME>
+###############################################################
+import getpass
+import os
+import shutil
+import subprocess
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.ssh import SSHPool
+
+Benchmark.debug()
+
+user = getpass.getuser()
+experiment = "./output_experiment"
+size = 4 * 1024 * 1024
+chunk_size = 65536
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+class LocalPopen:
+    """
+    starts the commands for the remote hosts locally
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, args, **kwargs):
+        self.calls.append(args[-1])
+        return subprocess.Popen(["sh", "-c", args[-1]], **kwargs)
+
+
+def job(name, host):
+    os.makedirs(f"{experiment}/{name}", exist_ok=True)
+    with open(f"{experiment}/{name}/{name}.out", "wb") as f:
+        for i in range(size // 16):
+            f.write(f"{i:015}\n".encode())
+    return Job.from_dict({"name": name, "command": "uname", "host": host,
+                          "user": user, "experiment": experiment})
+
+
+def expected(name):
+    with open(f"{experiment}/{name}/{name}.out", "rb") as f:
+        return f.read()
+
+
+@pytest.mark.incremental
+class TestOutput:
+
+    def test_local(self):
+        HEADING()
+        local = job("local", "localhost")
+        chunks = list(local.iter_output(chunk_size=chunk_size))
+        assert max(len(chunk) for chunk in chunks) == chunk_size
+        assert b"".join(chunks) == expected("local")
+        assert b"".join(local.iter_output(compress=True)) == expected("local")
+
+    def test_remote(self):
+        HEADING()
+        popen = LocalPopen()
+        ssh.pool = SSHPool(popen=popen, control_dir=f"{experiment}/ssh")
+        remote = job("remote", "red")
+        Benchmark.Start()
+        chunks = list(remote.iter_output(chunk_size=chunk_size))
+        Benchmark.Stop()
+        assert max(len(chunk) for chunk in chunks) <= chunk_size
+        assert b"".join(chunks) == expected("remote")
+        assert popen.calls[-1].startswith("cat ")
+
+    def test_compress(self):
+        HEADING()
+        remote = job("remote", "red")
+        chunks = list(remote.iter_output(chunk_size=chunk_size, compress=True))
+        assert ssh.pool.popen.calls[-1].startswith("gzip -c ")
+        assert max(len(chunk) for chunk in chunks) <= chunk_size
+        assert b"".join(chunks) == expected("remote")
+        compressed = b"".join(remote.stream(remote.output, compress=True))
+        assert len(compressed) < size // 4
+
+    def test_download(self):
+        HEADING()
+        remote = job("remote", "red")
+        path = f"{experiment}/download.out"
+        assert remote.download_output(path, compress=True) == size
+        with open(path, "rb") as f:
+            assert f.read() == expected("remote")
+
+    def test_close(self):
+        HEADING()
+        remote = job("remote", "red")
+        chunks = remote.iter_output(chunk_size=16)
+        assert next(chunks) == b"000000000000000\n"
+        chunks.close()
+
+    def test_missing(self):
+        HEADING()
+        missing = Job.from_dict({"name": "missing", "command": "uname",
+                                 "host": "red", "user": user,
+                                 "experiment": experiment})
+        with pytest.raises(RuntimeError):
+            list(missing.iter_output())
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
@@ -0,0 +1,110 @@
+###############################################################
+# pytest -v --capture=no tests/test_26_launch.py
+# pytest -v  tests/test_26_launch.py
+# pytest -v --capture=no  tests/test_26_launch.py::TestLaunch::<METHODNAME>
+###############################################################
+import getpass
+import shutil
+import time
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+from cloudmesh.common.util import readfile
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Host
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import SchedulerFIFO
+from cloudmesh.queue.jobqueue import SchedulerFIFOMultiHost
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import LocalHosts
+
+Benchmark.debug()
+
+host = "localhost"
+user = getpass.getuser()
+experiment = "./launch_experiment"
+n = 4
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+@pytest.mark.incremental
+class TestLaunch:
+
+    def test_local(self):
+        HEADING()
+        job = Job(name="local", command="uname", host=host, user=user,
+                  experiment=experiment)
+        Benchmark.Start()
+        pid = job.launch()
+        Benchmark.Stop()
+        assert pid is not None
+        assert job.status == "run"
+        assert job.last_probe_check is not None
+        while job.state != "end":
+            time.sleep(0.1)
+        assert readfile(f"{experiment}/local/local.pid").strip() == pid
+
+    def test_remote(self):
+        HEADING()
+        fake = LocalHosts()
+        ssh.pool = SSHPool(transport=fake, control_dir=f"{experiment}/ssh")
+        job = Job.from_dict({"name": "remote", "command": "uname",
+                             "host": "red", "user": user,
+                             "experiment": experiment})
+        assert job.launch() is not None
+        assert len(fake.calls) == 1
+        while job.state != "end":
+            time.sleep(0.1)
+
+    def test_fifo(self):
+        HEADING()
+        fake = LocalHosts()
+        ssh.pool.transport = fake
+        scheduler = SchedulerFIFO(name="a", experiment=experiment,
+                                  max_parallel=n, launch=True)
+        with scheduler.batch():
+            for i in range(n):
+                scheduler.add(Job.from_dict({"name": f"fifo{i}",
+                                             "command": "sleep 0.2",
+                                             "host": "red", "user": user,
+                                             "experiment": experiment}))
+        assert len(scheduler.run()) == n
+        # one command per job and the refresh of the running jobs
+        assert len([call for call in fake.commands
+                    if "# cloudmesh pid" in call]) == n
+        assert len([call for call in fake.commands
+                    if "cloudmesh offset" not in call]) == n
+        assert len(scheduler.wait_on_running()) == n
+        assert scheduler.index.count("end") == n
+
+    def test_fifo_multi(self):
+        HEADING()
+        fake = LocalHosts()
+        ssh.pool.transport = fake
+        scheduler = SchedulerFIFOMultiHost(
+            name="b", experiment=experiment, launch=True,
+            hosts=[Host(name=f"red{i}", user=user, max_jobs_allowed=2)
+                   for i in range(2)])
+        with scheduler.batch():
+            for i in range(n):
+                scheduler.add(Job.from_dict({"name": f"multi{i}",
+                                             "command": "sleep 0.2",
+                                             "experiment": experiment}))
+        assert len(scheduler.run()) == n
+        assert len([call for call in fake.commands
+                    if "cloudmesh offset" not in call]) == n
+        assert scheduler.get("multi3")["host"] == "red1"
+        assert len(scheduler.wait_on_running()) == n
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
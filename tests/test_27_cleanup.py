@@ -0,0 +1,118 @@
+###############################################################
+# pytest -v --capture=no tests/test_27_cleanup.py
+# pytest -v  tests/test_27_cleanup.py
+# pytest -v --capture=no  tests/test_27_cleanup.py::TestCleanup::<METHODNAME>
+###############################################################
+import asyncio
+import getpass
+import os
+import shutil
+import time
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import AsyncFakeHosts
+
+Benchmark.debug()
+
+host = "localhost"
+user = getpass.getuser()
+experiment = "./cleanup_experiment"
+hosts = 10
+n = 200
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def add(queue, prefix, status):
+    with queue.batch():
+        for i in range(n):
+            queue.add(Job.from_dict({"name": f"{prefix}{i}", "command": "uname",
+                                     "host": f"red{i % hosts}", "user": user,
+                                     "status": status, "pid": "4711",
+                                     "experiment": experiment}))
+
+
+@pytest.mark.incremental
+class TestCleanup:
+
+    def test_reset(self):
+        HEADING()
+        fake = AsyncFakeHosts(delay=0.1)
+        ssh.pool = SSHPool(atransport=fake, control_dir=f"{experiment}/ssh")
+        queue = Queue(name="a", experiment=experiment)
+        add(queue, "run", "run")
+        add(queue, "ready", "ready")
+        Benchmark.Start()
+        result = queue.reset()
+        Benchmark.Stop()
+        assert len(fake.calls) == hosts
+        assert fake.max_total == hosts
+        args, input = fake.calls[0]
+        assert args[-1] == "sh"
+        assert input.count("kill -0 4711") == n // hosts
+        assert input.count("rm -rf") == n // hosts
+        assert "ready0" not in input
+        assert "old_status:run" in result
+        assert queue.index.count("ready") == 2 * n
+
+    def test_delete(self):
+        HEADING()
+        fake = AsyncFakeHosts(delay=0.1)
+        ssh.pool.atransport = fake
+        queue = Queue(name="b", experiment=experiment)
+        add(queue, "end", "end")
+        queue.get_job("end0").materialize()
+        assert os.path.exists(f"{experiment}/end0")
+        jobs = queue.delete_jobs([f"end{i}" for i in range(n)])
+        assert len(jobs) == n
+        assert len(queue) == 0
+        assert len(fake.calls) == hosts
+        assert "kill" not in fake.calls[0][1]
+        assert not os.path.exists(f"{experiment}/end0")
+
+    def test_running_loop(self):
+        HEADING()
+        fake = AsyncFakeHosts(delay=0.1)
+        ssh.pool.atransport = fake
+        queue = Queue(name="d", experiment=experiment)
+        add(queue, "run", "run")
+
+        async def endpoint():
+            # e.g. an async endpoint of the service
+            return queue.reset()
+
+        assert "old_status:run" in asyncio.run(endpoint())
+        assert len(fake.calls) == hosts
+        assert queue.index.count("ready") == n
+
+    def test_kill(self):
+        HEADING()
+        ssh.pool = default
+        queue = Queue(name="c", experiment=experiment)
+        job = Job(name="sleep", command="sleep 30", host=host, user=user,
+                  experiment=experiment)
+        job.launch()
+        queue.add(job)
+        job = queue.get_job("sleep")
+        while job.state != "start":
+            time.sleep(0.1)
+        assert queue.cleanup([job], remove=False) == ""
+        assert job.status == "kill"
+        assert os.path.exists(f"{experiment}/sleep")
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
@@ -0,0 +1,102 @@
+###############################################################
+# pytest -v --capture=no tests/test_28_backoff.py
+# pytest -v  tests/test_28_backoff.py
+# pytest -v --capture=no  tests/test_28_backoff.py::TestBackoff::<METHODNAME>
+###############################################################
+import getpass
+import shutil
+import time
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Host
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.jobqueue import SchedulerFIFO
+from cloudmesh.queue.jobqueue import SchedulerFIFOMultiHost
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import LocalHosts
+
+Benchmark.debug()
+
+user = getpass.getuser()
+experiment = "./backoff_experiment"
+n = 4
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def polls(fake):
+    return len([call for call in fake.commands if "cloudmesh offset" in call])
+
+
+@pytest.mark.incremental
+class TestBackoff:
+
+    def test_backoff(self):
+        HEADING()
+        queue = Queue(name="a", experiment=experiment)
+        queue.max_poll_interval = 0.4
+        assert queue.due(["job"]) == ["job"]
+        intervals = []
+        for i in range(4):
+            queue.backoff("job", changed=False)
+            intervals.append(queue.polls["job"][1])
+        assert intervals == [0.1, 0.2, 0.4, 0.4]
+        assert queue.due(["job"]) == []
+        assert 0.3 < queue.next_due(["job"]) <= 0.4
+        queue.backoff("job", changed=True)
+        assert queue.polls["job"][1] == 0.1
+        time.sleep(0.1)
+        assert queue.due(["job"]) == ["job"]
+
+    def test_fifo(self):
+        HEADING()
+        fake = LocalHosts()
+        ssh.pool = SSHPool(transport=fake, control_dir=f"{experiment}/ssh")
+        scheduler = SchedulerFIFO(name="b", experiment=experiment,
+                                  max_parallel=2, launch=True)
+        with scheduler.batch():
+            for i in range(n):
+                scheduler.add(Job.from_dict({"name": f"fifo{i}",
+                                             "command": "sleep 2",
+                                             "host": "red", "user": user,
+                                             "experiment": experiment}))
+        Benchmark.Start()
+        assert len(scheduler.run()) == n
+        assert len(scheduler.wait_on_running()) == n
+        Benchmark.Stop()
+        assert scheduler.index.count("end") == n
+        # about 4 seconds with the intervals 0.1, 0.2, 0.4, 0.8, 1.6, ...
+        assert polls(fake) < 30
+
+    def test_fifo_multi(self):
+        HEADING()
+        fake = LocalHosts()
+        ssh.pool.transport = fake
+        scheduler = SchedulerFIFOMultiHost(
+            name="c", experiment=experiment, launch=True,
+            hosts=[Host(name=f"red{i}", user=user, max_jobs_allowed=1)
+                   for i in range(2)])
+        with scheduler.batch():
+            for i in range(n):
+                scheduler.add(Job.from_dict({"name": f"multi{i}",
+                                             "command": "sleep 2",
+                                             "experiment": experiment}))
+        assert len(scheduler.run()) == n
+        assert len(scheduler.wait_on_running()) == n
+        assert scheduler.index.count("end") == n
+        assert polls(fake) < 30
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
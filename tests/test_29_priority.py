@@ -0,0 +1,98 @@
+###############################################################
+# pytest -v --capture=no tests/test_29_priority.py
+# pytest -v  tests/test_29_priority.py
+# pytest -v --capture=no  tests/test_29_priority.py::TestPriority::<METHODNAME>
+###############################################################
+import getpass
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import JobArray
+from cloudmesh.queue.jobqueue import Queue
+from cloudmesh.queue.jobqueue import SchedulerPriority
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import LocalHosts
+
+Benchmark.debug()
+
+user = getpass.getuser()
+experiment = "./priority_experiment"
+n = 1000
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def job(name, priority=0, command="uname"):
+    return Job.from_dict({"name": name, "command": command, "host": "red",
+                          "user": user, "priority": priority,
+                          "experiment": experiment})
+
+
+@pytest.mark.incremental
+class TestPriority:
+
+    def test_order(self):
+        HEADING()
+        scheduler = SchedulerPriority(name="a", experiment=experiment)
+        Benchmark.Start()
+        with scheduler.batch():
+            for i in range(n):
+                scheduler.add(job(f"job{i}", priority=i % 3))
+        Benchmark.Stop()
+        names = [job.name for job in scheduler.upcoming(6, 'ready')]
+        assert names == ["job2", "job5", "job8", "job11", "job14", "job17"]
+        assert scheduler.first() == "job2"
+        assert scheduler.__next__()["name"] == "job2"
+        scheduler.flush()
+
+    def test_changes(self):
+        HEADING()
+        scheduler = SchedulerPriority(name="a", experiment=experiment)
+        assert scheduler.first() == "job2"
+        urgent = job("job0", priority=10)
+        scheduler.set(urgent)
+        assert scheduler.first() == "job0"
+        urgent.status = "run"
+        scheduler.set(urgent)
+        assert scheduler.first() == "job2"
+        scheduler.delete_jobs(["job2"])
+        assert scheduler.first() == "job5"
+
+    def test_reload(self):
+        HEADING()
+        scheduler = SchedulerPriority(name="a", experiment=experiment)
+        other = Queue(name="a", experiment=experiment)
+        other.add(job("late", priority=5))
+        assert scheduler.__next__()["name"] == "late"
+
+    def test_run(self):
+        HEADING()
+        ssh.pool = SSHPool(transport=LocalHosts(),
+                           control_dir=f"{experiment}/ssh")
+        scheduler = SchedulerPriority(name="b", experiment=experiment,
+                                      max_parallel=1, launch=True)
+        with scheduler.batch():
+            for i in range(3):
+                scheduler.add(job(f"low{i}"))
+            scheduler.add(job("high", priority=1))
+        scheduler.add_array(JobArray.from_name(
+            "array[1-2]", {"command": "uname", "host": "red", "user": user,
+                           "priority": 2, "experiment": experiment}))
+        ran = scheduler.run()
+        assert ran == ["high", "low0", "low1", "low2", "array1", "array2"]
+        assert len(scheduler.wait_on_running()) == len(ran)
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
@@ -0,0 +1,119 @@
+###############################################################
+# pytest -v --capture=no tests/test_30_placement.py
+# pytest -v  tests/test_30_placement.py
+# pytest -v --capture=no  tests/test_30_placement.py::TestPlacement::<METHODNAME>
+###############################################################
+import getpass
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Host
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import SchedulerFIFOMultiHost
+from cloudmesh.queue.placement import Placement
+from cloudmesh.queue.placement import capacity
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import LocalHosts
+
+Benchmark.debug()
+
+user = getpass.getuser()
+experiment = "./placement_experiment"
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def hosts():
+    return [Host(name="small", user=user, cores=4, memory=8000,
+                 max_jobs_allowed=8),
+            Host(name="big", user=user, cores=8, threads=2, memory=64000,
+                 gpu="0,1,2,3", max_jobs_allowed=16)]
+
+
+def job(name, command="uname", **resources):
+    return Job.from_dict(dict(name=name, command=command, user=user,
+                              experiment=experiment, **resources))
+
+
+@pytest.mark.incremental
+class TestPlacement:
+
+    def test_capacity(self):
+        HEADING()
+        small, big = hosts()
+        assert capacity(small) == {"cpus": 4, "memory": 8000, "gpus": 0}
+        assert capacity(big) == {"cpus": 16, "memory": 64000, "gpus": 4}
+        assert capacity(Host(name="red"))["memory"] is None
+
+    def test_first_fit(self):
+        HEADING()
+        placement = Placement(hosts())
+        jobs = [job("tiny", cpus=1), job("gpu", cpus=2, gpus=2),
+                job("wide", cpus=12, memory=32000), job("mid", cpus=3)]
+        assert [j.name for j in placement.order(jobs)] == \
+            ["wide", "gpu", "mid", "tiny"]
+        placed = {}
+        for j in placement.order(jobs):
+            host = placement.candidates(j)[0]
+            placement.allocate(j, host)
+            placed[j.name] = host.name
+        assert placed == {"wide": "big", "gpu": "big", "mid": "small",
+                          "tiny": "small"}
+        assert placement.free[1] == {"cpus": 2, "memory": 32000, "gpus": 2}
+        assert placement.candidates(job("more", cpus=3)) == []
+        assert placement.release("mid").name == "small"
+        assert placement.candidates(job("more", cpus=3))[0].name == "small"
+
+    def test_best_fit(self):
+        HEADING()
+        placement = Placement(hosts(), policy="best_fit")
+        assert placement.candidates(job("tiny", cpus=1))[0].name == "small"
+        placement = Placement(hosts(), policy="first_fit")
+        placement.hosts[0].max_jobs_allowed = 0
+        assert placement.candidates(job("tiny", cpus=1))[0].name == "big"
+        assert not placement.possible(job("huge", cpus=32))
+        with pytest.raises(ValueError):
+            Placement(hosts(), policy="worst_fit")
+
+    def test_run(self):
+        HEADING()
+        ssh.pool = SSHPool(transport=LocalHosts(),
+                           control_dir=f"{experiment}/ssh")
+        scheduler = SchedulerFIFOMultiHost(
+            name="a", experiment=experiment, launch=True,
+            hosts=[Host(name="red0", user=user, cores=4, max_jobs_allowed=8),
+                   Host(name="red1", user=user, cores=2, max_jobs_allowed=8)])
+        peaks = []
+        allocate = scheduler.placement.allocate
+
+        def record(job, host):
+            allocate(job, host)
+            peaks.append(sum(host.job_counter for host in scheduler.hosts))
+
+        scheduler.placement.allocate = record
+        with scheduler.batch():
+            for i in range(6):
+                scheduler.add(job(f"job{i}", command="sleep 0.5", cpus=2))
+            scheduler.add(job("huge", cpus=32))
+        Benchmark.Start()
+        assert len(scheduler.run()) == 6
+        assert len(scheduler.wait_on_running()) == 6
+        Benchmark.Stop()
+        assert max(peaks) == 3
+        assert scheduler.get("huge")["status"] == "fail_start"
+        assert scheduler.index.count("end") == 6
+        assert all(host.job_counter == 0 for host in scheduler.hosts)
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
@@ -0,0 +1,121 @@
+###############################################################
+# pytest -v --capture=no tests/test_31_gpus.py
+# pytest -v  tests/test_31_gpus.py
+# pytest -v --capture=no  tests/test_31_gpus.py::TestGpus::<METHODNAME>
+###############################################################
+import getpass
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Host
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import SchedulerFIFOMultiHost
+from cloudmesh.queue.placement import Placement
+from cloudmesh.queue.placement import devices
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import LocalHosts
+
+Benchmark.debug()
+
+user = getpass.getuser()
+experiment = "./gpus_experiment"
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def job(name, gpus, command="uname"):
+    return Job.from_dict({"name": name, "command": command, "user": user,
+                          "gpus": gpus, "experiment": experiment})
+
+
+@pytest.mark.incremental
+class TestGpus:
+
+    def test_devices(self):
+        HEADING()
+        assert devices(Host(gpu="0, 1,2")) == ["0", "1", "2"]
+        assert devices(Host(gpu=0)) == ["0"]
+        assert devices(Host()) == []
+
+    def test_allocate(self):
+        HEADING()
+        host = Host(name="red", gpu="0,1,2,3", max_jobs_allowed=4)
+        placement = Placement([host])
+        assert placement.allocate(job("a", 1), host) == ["0"]
+        assert placement.allocate(job("b", 2), host) == ["1", "2"]
+        assert placement.allocate(job("c", 1), host) == ["3"]
+        assert placement.candidates(job("d", 1)) == []
+        placement.release("b")
+        assert placement.gpus("b") == []
+        assert placement.devices[0] == ["1", "2"]
+        assert placement.allocate(job("d", 1), host) == ["1"]
+        placement.release("a")
+        assert placement.devices[0] == ["0", "2"]
+        assert placement.free[0]["gpus"] == 2
+
+    def test_run(self):
+        HEADING()
+        ssh.pool = SSHPool(transport=LocalHosts(),
+                           control_dir=f"{experiment}/ssh")
+        scheduler = SchedulerFIFOMultiHost(
+            name="a", experiment=experiment, launch=True,
+            hosts=[Host(name="red", user=user, gpu="0,1", max_jobs_allowed=4)])
+        placement = scheduler.placement
+        allocate = placement.allocate
+
+        def disjoint(job, host):
+            held = [device for name in placement.allocations
+                    for device in placement.gpus(name)]
+            gpus = allocate(job, host)
+            assert not set(gpus) & set(held)
+            return gpus
+
+        placement.allocate = disjoint
+        with scheduler.batch():
+            for i in range(4):
+                scheduler.add(job(f"job{i}", 1,
+                                  command="sleep 0.3; echo $CUDA_VISIBLE_DEVICES"))
+            scheduler.add(job("both", 2, command="echo $CUDA_VISIBLE_DEVICES"))
+        Benchmark.Start()
+        assert len(scheduler.run()) == 5
+        assert len(scheduler.wait_on_running()) == 5
+        Benchmark.Stop()
+        outputs = {name: Job.from_dict(scheduler.get(name)).get_output().strip()
+                   for name in scheduler.keys()}
+        assert outputs["both"] == "0,1"
+        assert all(outputs[f"job{i}"] in ["0", "1"] for i in range(4))
+        assert placement.devices[0] == ["0", "1"]
+        assert placement.allocations == {}
+
+    def test_no_gpus(self):
+        HEADING()
+        host = Host(name="red", user=user, gpu="0,1", max_jobs_allowed=3)
+        scheduler = SchedulerFIFOMultiHost(name="b", experiment=experiment,
+                                           hosts=[host])
+        # a job without gpus sees all GPUs of an idle host as before
+        free = job("free", 0)
+        scheduler.assign_host(free, probe=False)
+        assert free.gpu == "0,1"
+        assert scheduler.placement.held(host) == []
+        gpu = job("gpu", 1)
+        scheduler.assign_host(gpu, probe=False)
+        assert gpu.gpu == "0"
+        assert scheduler.placement.held(host) == ["0"]
+        # next to a job holding a GPU it sees none
+        none = job("none", 0)
+        scheduler.assign_host(none, probe=False)
+        assert none.gpu == ""
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)
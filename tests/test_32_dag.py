@@ -0,0 +1,180 @@
+###############################################################
+# pytest -v --capture=no tests/test_32_dag.py
+# pytest -v  tests/test_32_dag.py
+# pytest -v --capture=no  tests/test_32_dag.py::TestDag::<METHODNAME>
+###############################################################
+import getpass
+import shutil
+
+import pytest
+from cloudmesh.common.Benchmark import Benchmark
+from cloudmesh.common.util import HEADING
+
+from cloudmesh.queue import ssh
+from cloudmesh.queue.jobqueue import Host
+from cloudmesh.queue.jobqueue import Job
+from cloudmesh.queue.jobqueue import SchedulerDAG
+from cloudmesh.queue.ssh import SSHPool
+from fake_hosts import LocalHosts
+
+Benchmark.debug()
+
+user = getpass.getuser()
+experiment = "./dag_experiment"
+n = 1000
+default = ssh.pool
+
+shutil.rmtree(experiment, ignore_errors=True)
+
+
+def job(name, depends_on=None, command="uname", **resources):
+    return Job.from_dict(dict(name=name, command=command, user=user,
+                              depends_on=depends_on, experiment=experiment,
+                              **resources))
+
+
+def hosts():
+    return [Host(name=f"red{i}", user=user, max_jobs_allowed=1)
+            for i in range(2)]
+
+
+@pytest.mark.incremental
+class TestDag:
+
+    def test_register(self):
+        HEADING()
+        scheduler = SchedulerDAG(name="a", experiment=experiment,
+                                 hosts=hosts())
+        with scheduler.batch():
+            scheduler.add(job("prepare"))
+            scheduler.add(job("train1", ["prepare"]))
+            scheduler.add(job("train2", ["prepare"]))
+            scheduler.add(job("evaluate", ["train1", "train2"]))
+        assert list(scheduler.released) == ["prepare"]
+        assert scheduler.waiting == {"train1": 1, "train2": 1, "evaluate": 2}
+        assert scheduler.children["prepare"] == ["train1", "train2"]
+        scheduler.finished("prepare", "end")
+        assert list(scheduler.released) == ["prepare", "train1", "train2"]
+        scheduler.finished("train1", "end")
+        assert scheduler.waiting == {"evaluate": 1}
+        scheduler.flush()
+
+    def test_reload(self):
+        HEADING()
+        scheduler = SchedulerDAG(name="a", experiment=experiment,
+                                 hosts=hosts())
+        assert scheduler.waiting == {"train1": 1, "train2": 1, "evaluate": 2}
+        assert scheduler.releases(4) == ["prepare"]
+
+    def test_run(self):
+        HEADING()
+        ssh.pool = SSHPool(transport=LocalHosts(),
+                           control_dir=f"{experiment}/ssh")
+        scheduler = SchedulerDAG(name="b", experiment=experiment,
+                                 launch=True, hosts=hosts())
+        peaks = []
+        allocate = scheduler.placement.allocate
+
+        def record(job, host):
+            # a job is only placed once all its parents ended
+            assert all(scheduler.index.status.get(parent) == "end"
+                       for parent in job.depends_on or [])
+            peaks.append(sum(host.job_counter for host in scheduler.hosts))
+            return allocate(job, host)
+
+        scheduler.placement.allocate = record
+        with scheduler.batch():
+            scheduler.add(job("prepare", command="sleep 0.5"))
+            scheduler.add(job("train", ["prepare"], command="sleep 0.5"))
+            scheduler.add(job("evaluate", ["train"]))
+            scheduler.add(job("report", command="sleep 1"))
+        Benchmark.Start()
+        ran = scheduler.run()
+        Benchmark.Stop()
+        assert ran[:2] == ["prepare", "report"]
+        assert ran.index("train") < ran.index("evaluate")
+        assert len(scheduler.wait_on_running()) == 4
+        # the independent branch ran next to the chain
+        assert max(peaks) == 1
+        assert scheduler.index.count("end") == 4
+        assert scheduler.waiting == {}
+        assert scheduler.children == {}
+
+    def test_fail_parent(self):
+        HEADING()
+        scheduler = SchedulerDAG(name="c", experiment=experiment,
+                                 launch=True, hosts=hosts())
+        with scheduler.batch():
+            scheduler.add(job("huge", cpus=999))
+            scheduler.add(job("child", ["huge"]))
+            scheduler.add(job("grandchild", ["child", "other"]))
+            scheduler.add(job("other"))
+            scheduler.add(job("crashed"))
+            scheduler.add(job("orphan", ["crashed"]))
+        crashed = Job.from_dict(scheduler.get("crashed"))
+        crashed.status = "crash"
+        scheduler.set(crashed)
+        assert scheduler.get("orphan")["status"] == "fail_parent"
+        assert scheduler.run() == ["other"]
+        assert len(scheduler.wait_on_running()) == 1
+        assert scheduler.get("huge")["status"] == "fail_start"
+        assert scheduler.get("child")["status"] == "fail_parent"
+        assert scheduler.get("grandchild")["status"] == "fail_parent"
+        assert scheduler.get("other")["status"] == "end"
+
+    def test_exit_code(self):
+        HEADING()
+        scheduler = SchedulerDAG(name="f", experiment=experiment,
+                                 launch=True, hosts=hosts())
+        with scheduler.batch():
+            scheduler.add(job("failing", command="false"))
+            scheduler.add(job("child", ["failing"]))
+        assert scheduler.run() == ["failing"]
+        assert scheduler.get("failing")["status"] == "end"
+        assert scheduler.get("failing")["exit_code"] == 1
+        assert scheduler.get("child")["status"] == "fail_parent"
+        # a job added later does not start after the failed parent either
+        scheduler.add(job("late", ["failing"]))
+        assert scheduler.get("late")["status"] == "fail_parent"
+
+    def test_never_run(self):
+        HEADING()
+        scheduler = SchedulerDAG(name="d", experiment=experiment,
+                                 launch=True, hosts=hosts())
+        with scheduler.batch():
+            scheduler.add(job("first", ["second"]))
+            scheduler.add(job("second", ["first"]))
+            scheduler.add(job("lost", ["missing"]))
+            scheduler.add(job("free"))
+        assert scheduler.run() == ["free"]
+        assert scheduler.index.count("fail_parent") == 3
+        assert scheduler.waiting == {}
+
+    def test_wide(self):
+        HEADING()
+        scheduler = SchedulerDAG(name="e", experiment=experiment,
+                                 hosts=hosts(), write_behind=None)
+        with scheduler.batch():
+            for i in range(n):
+                scheduler.add(job(f"job{i}"))
+            scheduler.add(job("last", [f"job{i}" for i in range(n)]))
+        assert scheduler.waiting == {"last": n}
+        Benchmark.Start()
+        with scheduler.batch():
+            for i in range(n):
+                started = Job.from_dict(scheduler.__next__())
+                assert started.name == f"job{i}"
+                started.status = "end"
+                scheduler.set(started)
+        Benchmark.Stop()
+        assert list(scheduler.released) == ["last"]
+        assert scheduler.releases(2) == ["last"]
+
+    def test_cleanup(self):
+        HEADING()
+        ssh.pool = default
+        shutil.rmtree(experiment, ignore_errors=True)
+
+    def test_benchmark(self):
+        HEADING()
+        Benchmark.print(csv=True)